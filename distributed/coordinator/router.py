@@ -293,16 +293,42 @@ async def get_group_name(group_id: int) -> Optional[str]:
 
 async def _get_group_member_ids(group_id: int) -> list[int]:
     """Obtiene IDs de miembros de un grupo."""
-    for node_url in SHARDS["groups"]:
+    data = await consistent_read("groups", f"/groups/{group_id}/members")
+    if isinstance(data, list):
+        return [int(x[0]) if isinstance(x, (list, tuple)) else int(x.get("user_id")) for x in data]
+    return []
+
+# =========================================================
+# 📖 Lecturas consistentes repartidas entre réplicas
+# =========================================================
+
+READ_ROTATION = {}
+
+def _replicas_for_read(shard: str) -> list[str]:
+    """Nodos del shard rotados en cada llamada para repartir las lecturas."""
+    nodes = list(SHARDS.get(shard, []))
+    if not nodes:
+        return []
+    start = READ_ROTATION.get(shard, 0) % len(nodes)
+    READ_ROTATION[shard] = start + 1
+    return nodes[start:] + nodes[:start]
+
+async def consistent_read(shard: str, path: str, params: Optional[dict] = None):
+    """GET linealizable a cualquier réplica: el nodo hace ReadIndex antes de responder.
+
+    Devuelve el JSON de la primera réplica que responda 200, o None.
+    """
+    query = dict(params or {})
+    query["consistent"] = "true"
+    for node_url in _replicas_for_read(shard):
         try:
-            async with httpx.AsyncClient(timeout=3.0) as client:
-                resp = await client.get(f"{node_url}/groups/{group_id}/members")
-                data = resp.json()
-                if isinstance(data, list):
-                    return [int(x[0]) if isinstance(x, (list, tuple)) else int(x.get("user_id")) for x in data]
+            async with httpx.AsyncClient(timeout=5.0) as client:
+                resp = await client.get(f"{node_url}{path}", params=query)
+            if resp.status_code == 200:
+                return resp.json()
         except Exception:
             continue
-    return []
+    return None
 
 # =========================================================
 # 🔧 Helpers para modificar shards en caliente
@@ -373,6 +399,16 @@ def get_shard_for_user(username: str) -> str:
     else:
         return "eventos_a_m"  # Por defecto
 
+def _raise_if_overloaded(resp):
+    """Propaga al cliente el rechazo por saturación del shard (429/503 con Retry-After)."""
+    if resp.status_code in (429, 503):
+        try:
+            detail = resp.json().get("error") or "Shard saturado"
+        except Exception:
+            detail = "Shard saturado"
+        raise HTTPException(status_code=resp.status_code, detail=detail,
+                            headers={"Retry-After": resp.headers.get("Retry-After", "1")})
+
 async def get_leader(shard_name: str) -> str:
     """Devuelve la URL del líder actual del shard"""
     shard_name = _canonical_shard(shard_name)
@@ -513,6 +549,7 @@ async def auth_register(user: AuthRegister):
         leader_url = await get_leader("users")
         async with httpx.AsyncClient(timeout=10.0) as client:
             resp = await client.post(f"{leader_url}/auth/register", json=user.dict())
+        _raise_if_overloaded(resp)
         data = resp.json()
         if data.get("error"):
             raise HTTPException(status_code=400, detail=data["error"])
@@ -525,6 +562,7 @@ async def auth_register(user: AuthRegister):
         new_leader = await get_leader("users")
         async with httpx.AsyncClient(timeout=10.0) as client:
             resp = await client.post(f"{new_leader}/auth/register", json=user.dict())
+        _raise_if_overloaded(resp)
         data = resp.json()
         if data.get("error"):
             raise HTTPException(status_code=400, detail=data["error"])
@@ -542,6 +580,7 @@ async def auth_login(user: AuthLogin):
         leader_url = await get_leader("users")
         async with httpx.AsyncClient(timeout=10.0) as client:
             resp = await client.post(f"{leader_url}/auth/login", json=user.dict())
+        _raise_if_overloaded(resp)
         data = resp.json()
         if data.get("error"):
             status_code = data.get("status_code", 401 if "credenciales" in data.get("error", "").lower() else 400)
@@ -555,6 +594,7 @@ async def auth_login(user: AuthLogin):
         new_leader = await get_leader("users")
         async with httpx.AsyncClient(timeout=10.0) as client:
             resp = await client.post(f"{new_leader}/auth/login", json=user.dict())
+        _raise_if_overloaded(resp)
         data = resp.json()
         if data.get("error"):
             status_code = data.get("status_code", 401 if "credenciales" in data.get("error", "").lower() else 400)
@@ -593,6 +633,7 @@ async def create_event(event: EventCreate, token: str):
         leader_url = await get_leader(shard_name)
         async with httpx.AsyncClient(timeout=10.0) as client:
             resp = await client.post(f"{leader_url}/events", json=payload)
+        _raise_if_overloaded(resp)
         data = resp.json()
         if data.get("error"):
             raise HTTPException(status_code=400, detail=data["error"])
@@ -616,6 +657,7 @@ async def create_event(event: EventCreate, token: str):
         new_leader = await get_leader(shard_name)
         async with httpx.AsyncClient(timeout=10.0) as client:
             resp = await client.post(f"{new_leader}/events", json=payload)
+        _raise_if_overloaded(resp)
         data = resp.json()
         if data.get("error"):
             raise HTTPException(status_code=400, detail=data["error"])
@@ -642,14 +684,18 @@ async def create_group(group: GroupCreate, token: str):
         leader_url = await get_leader("groups")
         async with httpx.AsyncClient(timeout=10.0) as client:
             resp = await client.post(f"{leader_url}/groups", json=payload)
-            return resp.json()
+        _raise_if_overloaded(resp)
+        return resp.json()
+    except HTTPException:
+        raise
     except Exception as e:
         logger.warning(f"⚠️ Error con líder actual, buscando nuevo líder: {e}")
         LEADER_CACHE.pop("groups", None)
         new_leader = await get_leader("groups")
         async with httpx.AsyncClient(timeout=10.0) as client:
             resp = await client.post(f"{new_leader}/groups", json=payload)
-            return resp.json()
+        _raise_if_overloaded(resp)
+        return resp.json()
 
 @app.post("/users")
 async def create_user(user: UserCreate):
@@ -658,16 +704,20 @@ async def create_user(user: UserCreate):
         leader_url = await get_leader("users")
         async with httpx.AsyncClient(timeout=10.0) as client:
             resp = await client.post(f"{leader_url}/auth/register", json=user.dict())
+        _raise_if_overloaded(resp)
         data = resp.json()
         if data.get("error"):
             raise HTTPException(status_code=400, detail=data["error"])
         return {"message": "Usuario registrado exitosamente"}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.warning(f"⚠️ Error con líder actual, buscando nuevo líder: {e}")
         LEADER_CACHE.pop("users", None)
         new_leader = await get_leader("users")
         async with httpx.AsyncClient(timeout=10.0) as client:
             resp = await client.post(f"{new_leader}/auth/register", json=user.dict())
+        _raise_if_overloaded(resp)
         data = resp.json()
         if data.get("error"):
             raise HTTPException(status_code=400, detail=data["error"])
@@ -684,16 +734,9 @@ async def list_events(token: str):
     
     events = []
     for shard in _iter_event_shards():
-        for node_url in SHARDS[shard]:
-            try:
-                async with httpx.AsyncClient(timeout=5.0) as client:
-                    resp = await client.get(f"{node_url}/events", params={"user_id": user_id})
-                    data = resp.json()
-                    if isinstance(data, list):
-                        events.extend(data)
-                        break
-            except Exception:
-                continue
+        data = await consistent_read(shard, "/events", {"user_id": user_id})
+        if isinstance(data, list):
+            events.extend(data)
     # Enriquecer con nombres de grupo si aplica
     enriched = []
     for ev in events:
@@ -704,17 +747,13 @@ async def list_events(token: str):
 
 @app.get("/groups")
 async def list_groups(token: str):
-    """Lista grupos - consulta cualquier nodo del shard (requiere sesión)."""
+    """Lista grupos - lectura consistente en cualquier nodo del shard (requiere sesión)."""
     user_data = await validate_token(token)
     user_id = user_data.get("user_id")
-    for node_url in SHARDS["groups"]:
-        try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                resp = await client.get(f"{node_url}/groups", params={"user_id": user_id})
-                return resp.json()
-        except Exception:
-            continue
-    
+    data = await consistent_read("groups", "/groups", {"user_id": user_id})
+    if data is not None:
+        return data
+
     raise HTTPException(status_code=503, detail="No hay nodos disponibles para consulta")
 
 @app.get("/users")
@@ -746,6 +785,7 @@ async def invite_user_to_group(group_id: int, invited_user_id: int, token: str):
         leader_url = await get_leader("groups")
         async with httpx.AsyncClient(timeout=10.0) as client:
             resp = await client.post(f"{leader_url}/groups/invite", json=payload)
+        _raise_if_overloaded(resp)
         data = resp.json()
         if data.get("error"):
             raise HTTPException(status_code=400, detail=data["error"])
@@ -758,6 +798,7 @@ async def invite_user_to_group(group_id: int, invited_user_id: int, token: str):
         new_leader = await get_leader("groups")
         async with httpx.AsyncClient(timeout=10.0) as client:
             resp = await client.post(f"{new_leader}/groups/invite", json=payload)
+        _raise_if_overloaded(resp)
         data = resp.json()
         if data.get("error"):
             raise HTTPException(status_code=400, detail=data["error"])
@@ -797,6 +838,7 @@ async def respond_group_invitation(invitation_id: int, response: str, token: str
         leader_url = await get_leader("groups")
         async with httpx.AsyncClient(timeout=10.0) as client:
             resp = await client.post(f"{leader_url}/groups/invitations/respond", json=payload)
+        _raise_if_overloaded(resp)
         data = resp.json()
         if data.get("error"):
             raise HTTPException(status_code=400, detail=data["error"])
@@ -815,6 +857,7 @@ async def respond_group_invitation(invitation_id: int, response: str, token: str
         new_leader = await get_leader("groups")
         async with httpx.AsyncClient(timeout=10.0) as client:
             resp = await client.post(f"{new_leader}/groups/invitations/respond", json=payload)
+        _raise_if_overloaded(resp)
         data = resp.json()
         if data.get("error"):
             raise HTTPException(status_code=400, detail=data["error"])
@@ -823,13 +866,9 @@ async def respond_group_invitation(invitation_id: int, response: str, token: str
 @app.get("/groups/{group_id}/members")
 async def list_group_members(group_id: int, token: str):
     await validate_token(token)
-    for node_url in SHARDS["groups"]:
-        try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                resp = await client.get(f"{node_url}/groups/{group_id}/members")
-                return resp.json()
-        except Exception:
-            continue
+    data = await consistent_read("groups", f"/groups/{group_id}/members")
+    if data is not None:
+        return data
     raise HTTPException(status_code=503, detail="No hay nodos disponibles para consulta")
 
 @app.get("/groups/{group_id}/info")
@@ -879,16 +918,9 @@ async def get_group_agendas(group_id: int, token: str, start_date: str, end_date
 
     # Obtener miembros con sus roles
     members_with_roles = []
-    for node_url in SHARDS["groups"]:
-        try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                resp = await client.get(f"{node_url}/groups/{group_id}/members")
-                members_data = resp.json()
-                if isinstance(members_data, list):
-                    members_with_roles = members_data
-                    break
-        except Exception:
-            continue
+    members_data = await consistent_read("groups", f"/groups/{group_id}/members")
+    if isinstance(members_data, list):
+        members_with_roles = members_data
 
     # Determinar miembros accesibles según jerarquía
     accessible_members = []
@@ -1099,6 +1131,7 @@ async def update_group(group_id: int, update: dict, token: str):
         leader_url = await get_leader("groups")
         async with httpx.AsyncClient(timeout=10.0) as client:
             resp = await client.put(f"{leader_url}/groups/{group_id}", json=update)
+        _raise_if_overloaded(resp)
         data = resp.json()
         if data.get("error"):
             raise HTTPException(status_code=400, detail=data["error"])
@@ -1111,6 +1144,7 @@ async def update_group(group_id: int, update: dict, token: str):
         new_leader = await get_leader("groups")
         async with httpx.AsyncClient(timeout=10.0) as client:
             resp = await client.put(f"{new_leader}/groups/{group_id}", json=update)
+        _raise_if_overloaded(resp)
         data = resp.json()
         if data.get("error"):
             raise HTTPException(status_code=400, detail=data["error"])
@@ -1124,6 +1158,7 @@ async def delete_group(group_id: int, token: str):
         leader_url = await get_leader("groups")
         async with httpx.AsyncClient(timeout=10.0) as client:
             resp = await client.delete(f"{leader_url}/groups/{group_id}", params={"user_id": user_id})
+        _raise_if_overloaded(resp)
         data = resp.json()
         if data.get("error"):
             raise HTTPException(status_code=400, detail=data["error"])
@@ -1136,6 +1171,7 @@ async def delete_group(group_id: int, token: str):
         new_leader = await get_leader("groups")
         async with httpx.AsyncClient(timeout=10.0) as client:
             resp = await client.delete(f"{new_leader}/groups/{group_id}", params={"user_id": user_id})
+        _raise_if_overloaded(resp)
         data = resp.json()
         if data.get("error"):
             raise HTTPException(status_code=400, detail=data["error"])
@@ -1152,6 +1188,7 @@ async def remove_group_member(group_id: int, member_id: int, token: str):
                 f"{leader_url}/groups/{group_id}/members/{member_id}",
                 params={"requester_id": requester_id}
             )
+        _raise_if_overloaded(resp)
         data = resp.json()
         if data.get("error"):
             raise HTTPException(status_code=400, detail=data["error"])
@@ -1167,6 +1204,7 @@ async def remove_group_member(group_id: int, member_id: int, token: str):
                 f"{new_leader}/groups/{group_id}/members/{member_id}",
                 params={"requester_id": requester_id}
             )
+        _raise_if_overloaded(resp)
         data = resp.json()
         if data.get("error"):
             raise HTTPException(status_code=400, detail=data["error"])
@@ -1260,11 +1298,17 @@ async def respond_event_invitation(event_id: int, accepted: bool, token: str):
     payload = {"event_id": event_id, "user_id": user_id, "accepted": bool(accepted)}
     # Intentar en ambos shards hasta que uno responda OK
     last_error = None
+    overloaded = None
     for shard in _iter_event_shards():
         try:
             leader_url = await get_leader(shard)
             async with httpx.AsyncClient(timeout=10.0) as client:
                 resp = await client.post(f"{leader_url}/events/invitations/respond", json=payload)
+            try:
+                _raise_if_overloaded(resp)
+            except HTTPException as he:
+                overloaded = he  # el evento puede estar en el otro shard: se prueba igual
+                continue
             data = resp.json()
             if data.get("error"):
                 last_error = data.get("error")
@@ -1285,6 +1329,8 @@ async def respond_event_invitation(event_id: int, accepted: bool, token: str):
             last_error = str(e)
             LEADER_CACHE.pop(shard, None)
             continue
+    if overloaded is not None:
+        raise overloaded  # backpressure: el cliente reintenta tras Retry-After
     raise HTTPException(status_code=400, detail=last_error or "No se pudo registrar respuesta")
 
 @app.put("/events/{event_id}")
@@ -1305,11 +1351,17 @@ async def update_event(event_id: int, update: dict, token: str):
             if invalid:
                 raise HTTPException(status_code=400, detail="Hay participantes que no pertenecen al grupo")
     last_error = None
+    overloaded = None
     for shard in _iter_event_shards():
         try:
             leader_url = await get_leader(shard)
             async with httpx.AsyncClient(timeout=10.0) as client:
                 resp = await client.put(f"{leader_url}/events/{event_id}", json=payload)
+            try:
+                _raise_if_overloaded(resp)
+            except HTTPException as he:
+                overloaded = he  # el evento puede estar en el otro shard: se prueba igual
+                continue
             data = resp.json()
             if data.get("error"):
                 last_error = data.get("error")
@@ -1328,6 +1380,8 @@ async def update_event(event_id: int, update: dict, token: str):
             last_error = str(e)
             LEADER_CACHE.pop(shard, None)
             continue
+    if overloaded is not None:
+        raise overloaded  # backpressure: el cliente reintenta tras Retry-After
     raise HTTPException(status_code=400, detail=last_error or "No se pudo actualizar evento")
 
 @app.delete("/events/{event_id}")
@@ -1335,11 +1389,17 @@ async def cancel_event(event_id: int, token: str):
     user_data = await validate_token(token)
     user_id = user_data.get("user_id")
     last_error = None
+    overloaded = None
     for shard in _iter_event_shards():
         try:
             leader_url = await get_leader(shard)
             async with httpx.AsyncClient(timeout=10.0) as client:
                 resp = await client.delete(f"{leader_url}/events/{event_id}", params={"user_id": user_id})
+            try:
+                _raise_if_overloaded(resp)
+            except HTTPException as he:
+                overloaded = he  # el evento puede estar en el otro shard: se prueba igual
+                continue
             data = resp.json()
             if data.get("error"):
                 last_error = data.get("error")
@@ -1354,6 +1414,8 @@ async def cancel_event(event_id: int, token: str):
             last_error = str(e)
             LEADER_CACHE.pop(shard, None)
             continue
+    if overloaded is not None:
+        raise overloaded  # backpressure: el cliente reintenta tras Retry-After
     raise HTTPException(status_code=400, detail=last_error or "No se pudo cancelar evento")
 
 @app.delete("/events/{event_id}/leave")
@@ -1361,11 +1423,17 @@ async def leave_event(event_id: int, token: str):
     user_data = await validate_token(token)
     user_id = user_data.get("user_id")
     last_error = None
+    overloaded = None
     for shard in _iter_event_shards():
         try:
             leader_url = await get_leader(shard)
             async with httpx.AsyncClient(timeout=10.0) as client:
                 resp = await client.delete(f"{leader_url}/events/{event_id}/leave", params={"user_id": user_id})
+            try:
+                _raise_if_overloaded(resp)
+            except HTTPException as he:
+                overloaded = he  # el evento puede estar en el otro shard: se prueba igual
+                continue
             data = resp.json()
             if data.get("error"):
                 last_error = data.get("error")
@@ -1375,6 +1443,8 @@ async def leave_event(event_id: int, token: str):
             last_error = str(e)
             LEADER_CACHE.pop(shard, None)
             continue
+    if overloaded is not None:
+        raise overloaded  # backpressure: el cliente reintenta tras Retry-After
     raise HTTPException(status_code=400, detail=last_error or "No se pudo salir del evento")
 
 @app.get("/events/{event_id}/details")
@@ -0,0 +1,102 @@
+"""Nodo Multi-RAFT: un proceso aloja varios shards, cada uno con su grupo RAFT.
+
+Cada shard de RAFT_SHARDS es una instancia de raft_node.py montada en
+`/shards/<shard>`; sus peers son los mismos procesos con ese sufijo. Los grupos
+comparten transporte (sesiones HTTP y un stream por proceso peer) y sus
+heartbeats ociosos viajan en lote a través de un RaftGroupHost.
+
+    RAFT_SHARDS=eventos_a_m,grupos NODE_ID=n1 PORT=8801 \\
+    PEERS=http://nodo2:8802,http://nodo3:8803 uvicorn distributed.nodes.multi_raft_node:app
+"""
+import importlib.util
+import logging
+import os
+
+from fastapi import FastAPI, Response
+
+from shared.raft_executors import loop_lag_monitor, shutdown_executors
+from shared.raft_metrics import PROMETHEUS_CONTENT_TYPE, render_prometheus
+from shared.raft_multi import RaftGroupHost
+from shared.raft_transport import PeerClientPool
+
+SHARDS = [s.strip().lower() for s in os.getenv("RAFT_SHARDS", "").split(",") if s.strip()]
+NODE_ID = os.getenv("NODE_ID", "node0")
+PORT = int(os.getenv("PORT", "8800"))
+NODE_URL = os.getenv("NODE_URL", f"http://localhost:{PORT}").rstrip("/")
+PEERS = [peer.strip().rstrip("/") for peer in os.getenv("PEERS", "").split(",") if peer.strip()]
+RAFT_STREAM_PORT_OFFSET = int(os.getenv("RAFT_STREAM_PORT_OFFSET", "1000"))
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(f"multi_raft_{NODE_ID}")
+
+app = FastAPI(title=f"Multi-RAFT {NODE_ID}")
+
+host = RaftGroupHost(
+    NODE_URL,
+    stream_port_offset=RAFT_STREAM_PORT_OFFSET or None,
+    http_pool=PeerClientPool(
+        limit_per_peer=int(os.getenv("RAFT_CONN_LIMIT", "8")),
+        connect_timeout=float(os.getenv("RAFT_CONNECT_TIMEOUT", "1.0")),
+        default_timeout=float(os.getenv("RAFT_RPC_TIMEOUT", "3.0")),
+    ),
+)
+
+
+def _load_shard(shard: str):
+    """Ejecuta una copia independiente de raft_node.py configurada para `shard`."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "raft_node.py")
+    spec = importlib.util.spec_from_file_location(f"raft_shard_{shard}", path)
+    module = importlib.util.module_from_spec(spec)
+    module.SHARD_CONFIG = {
+        "SHARD_NAME": shard,
+        "NODE_ID": f"{NODE_ID}_{shard}",
+        "NODE_URL": f"{NODE_URL}/shards/{shard}",
+        "PEERS": ",".join(f"{peer}/shards/{shard}" for peer in PEERS),
+    }
+    module.RAFT_GROUP_HOST = host
+    spec.loader.exec_module(module)
+    return module
+
+
+shards = {shard: _load_shard(shard) for shard in SHARDS}
+for shard, module in shards.items():
+    app.mount(f"/shards/{shard}", module.app)
+
+
+@app.on_event("startup")
+async def startup():
+    # Las apps montadas no reciben los eventos de arranque: los disparamos aquí
+    for module in shards.values():
+        await module.startup()
+    await host.start()
+    logger.info(f"🧩 {NODE_ID} aloja {len(shards)} grupos RAFT: {', '.join(shards)}")
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    for module in shards.values():
+        await module.shutdown()
+    await host.close()
+    shutdown_executors()
+
+
+@app.get("/shards")
+async def list_shards():
+    return {
+        shard: {"role": module.raft.role.value, "leader": module.raft.leader_id,
+                "term": module.raft.current_term, "commit_index": module.raft.commit_index}
+        for shard, module in shards.items()
+    }
+
+
+@app.get("/loop")
+async def loop_lag():
+    return loop_lag_monitor().stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    # Todos los grupos en una sola respuesta; se distinguen por la etiqueta `node`
+    registries = [module.raft.metrics for module in shards.values()]
+    return Response(render_prometheus(*registries, loop_lag_monitor().metrics),
+                    media_type=PROMETHEUS_CONTENT_TYPE)
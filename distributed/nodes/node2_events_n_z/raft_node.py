@@ -40,7 +40,7 @@ async def create_event(event: dict):
         return {"error": "No soy el líder", "leader": raft.leader_id}
 
     # Crear entrada de log
-    entry = raft.append_log(f"CREATE_EVENT:{event['title']}")
+    entry = await raft.append_log(f"CREATE_EVENT:{event['title']}")
 
     # Replicar a seguidores
     replicated = await raft.replicate_log(entry)
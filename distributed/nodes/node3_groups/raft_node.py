@@ -39,7 +39,7 @@ async def create_group(group: dict):
 
     cursor.execute("INSERT INTO groups (name, description) VALUES (?, ?)", (group["name"], group["description"]))
     conn.commit()
-    raft.append_log(f"CREATE_GROUP:{group['name']}")
+    await raft.append_log(f"CREATE_GROUP:{group['name']}")
     return {"status": "ok", "message": f"Grupo '{group['name']}' creado en {SHARD_NAME}"}
 
 @app.get("/groups")
@@ -39,7 +39,7 @@ async def create_user(user: dict):
 
     cursor.execute("INSERT INTO users (username, email) VALUES (?, ?)", (user["username"], user["email"]))
     conn.commit()
-    raft.append_log(f"CREATE_USER:{user['username']}")
+    await raft.append_log(f"CREATE_USER:{user['username']}")
     return {"status": "ok", "message": f"Usuario '{user['username']}' creado en {SHARD_NAME}"}
 
 @app.get("/users")
@@ -1,24 +1,54 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 import sqlite3
 import os
 import asyncio
 import logging
 import json
+import math
 import httpx
 import bcrypt
 import secrets
 from datetime import datetime
+from typing import Optional
 from shared.raft import RaftNode
-
-# Leer configuración básica
-SHARD_NAME = os.getenv("SHARD_NAME", "DEFAULT_SHARD").upper().strip()
-NODE_ID = os.getenv("NODE_ID", "node0")
-PORT = int(os.getenv("PORT", "8800"))
-PEERS = [peer.strip() for peer in os.getenv("PEERS", "").split(",") if peer.strip()]
-NODE_URL = os.getenv("NODE_URL", f"http://localhost:{PORT}")
-REPLICATION_FACTOR = int(os.getenv("REPLICATION_FACTOR", "0") or 0)
-COORD_URL = os.getenv("COORD_URL")
-COORD_URLS = os.getenv("COORD_URLS")
+from shared.raft_executors import loop_lag_monitor, run_cpu, run_in, serial_executor, shutdown_executors
+from shared.raft_metrics import PROMETHEUS_CONTENT_TYPE, StackSampler, render_prometheus
+from shared.raft_scheduler import Overloaded
+from shared.raft_transport import PeerClientPool
+from shared.raft_wire import BINARY_CONTENT_TYPE, SYNC_CONTENT_TYPE, WIRE_HEADER, decode_append_entries
+
+# Leer configuración básica. multi_raft_node.py carga este módulo una vez por shard
+# e inyecta SHARD_CONFIG (pisa las variables de entorno) y RAFT_GROUP_HOST
+_config = {**os.environ, **globals().get("SHARD_CONFIG", {})}
+RAFT_GROUP_HOST = globals().get("RAFT_GROUP_HOST")
+SHARD_NAME = _config.get("SHARD_NAME", "DEFAULT_SHARD").upper().strip()
+NODE_ID = _config.get("NODE_ID", "node0")
+PORT = int(_config.get("PORT", "8800"))
+PEERS = [peer.strip() for peer in _config.get("PEERS", "").split(",") if peer.strip()]
+NODE_URL = _config.get("NODE_URL", f"http://localhost:{PORT}")
+REPLICATION_FACTOR = int(_config.get("REPLICATION_FACTOR", "0") or 0)
+COORD_URL = _config.get("COORD_URL")
+COORD_URLS = _config.get("COORD_URLS")
+RAFT_BATCH_WINDOW_MS = float(_config.get("RAFT_BATCH_WINDOW_MS", "2"))
+RAFT_MAX_BATCH = int(_config.get("RAFT_MAX_BATCH", "128"))
+RAFT_MAX_INFLIGHT = int(_config.get("RAFT_MAX_INFLIGHT", "4"))
+SNAPSHOT_THRESHOLD = int(_config.get("SNAPSHOT_THRESHOLD", "1000"))
+RAFT_CONN_LIMIT = int(_config.get("RAFT_CONN_LIMIT", "8"))
+RAFT_CONNECT_TIMEOUT = float(_config.get("RAFT_CONNECT_TIMEOUT", "1.0"))
+RAFT_RPC_TIMEOUT = float(_config.get("RAFT_RPC_TIMEOUT", "3.0"))
+RAFT_REPLICATION_TIMEOUT = float(_config.get("RAFT_REPLICATION_TIMEOUT", "5.0"))
+RAFT_STREAM_PORT_OFFSET = int(_config.get("RAFT_STREAM_PORT_OFFSET", "1000"))
+RAFT_WIRE_FORMAT = _config.get("RAFT_WIRE_FORMAT", "binary").lower()
+RAFT_LEASE_READS = _config.get("RAFT_LEASE_READS", "false").lower() in ("1", "true", "yes")
+RAFT_LEARNER = _config.get("RAFT_LEARNER", "false").lower() in ("1", "true", "yes")
+# Usuarios con fsync por lote; los eventos toleran agrupar fsync a cambio de throughput
+RAFT_DURABILITY = _config.get("RAFT_DURABILITY", "group" if "EVENTOS" in SHARD_NAME else "strict").lower()
+RAFT_SYNC_INTERVAL_MS = float(_config.get("RAFT_SYNC_INTERVAL_MS", "50"))
+RAFT_MAX_PENDING = int(_config.get("RAFT_MAX_PENDING", "1024"))
+RAFT_MAX_QUEUED_APPENDS = int(_config.get("RAFT_MAX_QUEUED_APPENDS", "8"))
+# Profiler por muestreo de append/replicación/aplicación (0 = apagado)
+RAFT_PROFILE_INTERVAL_MS = float(_config.get("RAFT_PROFILE_INTERVAL_MS", "0"))
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(f"raft_{NODE_ID}")
@@ -141,8 +171,16 @@ elif "USUARIOS" in SHARD_NAME:
 else:
     raise ValueError(f"Shard desconocido: {SHARD_NAME}")
 
+# Las escrituras (aplicar el log, snapshots) usan su propia conexión en un hilo
+# dedicado; con WAL los endpoints leen por `conn` sin esperar a que termine un lote
+conn.execute("PRAGMA journal_mode=WAL")
+db_executor = serial_executor(f"sqlite-{NODE_ID}")
+apply_conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+apply_cursor = apply_conn.cursor()
 
-async def apply_log_entry(entry):
+
+def _execute_command(cursor, entry):
+    """Ejecuta el SQL de una entrada del log sin confirmar la transacción."""
     try:
         data = json.loads(entry.command)
     except Exception:
@@ -154,14 +192,12 @@ async def apply_log_entry(entry):
         try:
             cursor.execute("INSERT INTO users (username, password_hash, email) VALUES (?, ?, ?)",
                            (p.get("username"), p.get("password_hash"), p.get("email")))
-            conn.commit()
         except sqlite3.IntegrityError:
             pass
     elif t == "CREATE_SESSION" and "USUARIOS" in SHARD_NAME:
         try:
             cursor.execute("INSERT OR REPLACE INTO sessions (token, user_id, created_at) VALUES (?, ?, ?)",
                            (p.get("token"), p.get("user_id"), p.get("created_at") or datetime.utcnow().isoformat()))
-            conn.commit()
         except Exception:
             pass
     elif t == "CREATE_GROUP" and "GRUPOS" in SHARD_NAME:
@@ -191,13 +227,11 @@ async def apply_log_entry(entry):
                 """,
                 (gid, mid, "", p.get("creator_id")),
             )
-        conn.commit()
     elif t == "INVITE_USER" and "GRUPOS" in SHARD_NAME:
         cursor.execute("""
             INSERT OR REPLACE INTO group_invitations (group_id, invited_user_id, invited_username, inviter_id, status)
             VALUES (?, ?, ?, ?, 'pending')
         """, (p.get("group_id"), p.get("invited_user_id"), p.get("invited_username"), p.get("inviter_id")))
-        conn.commit()
     elif t == "RESPOND_INVITATION" and "GRUPOS" in SHARD_NAME:
         cursor.execute("UPDATE group_invitations SET status=? WHERE id=?", (p.get("response"), p.get("invitation_id")))
         if p.get("response") == "accepted":
@@ -209,7 +243,6 @@ async def apply_log_entry(entry):
                     "INSERT OR IGNORE INTO group_members (group_id, user_id, username, is_leader) VALUES (?, ?, ?, 0)",
                     (row[0], row[1], row[2])
                 )
-        conn.commit()
     elif t == "CREATE_EVENT" and "EVENTOS" in SHARD_NAME:
         cursor.execute("""
             INSERT INTO events (title, description, creator_id, creator_username, start_time, end_time, group_id, is_group_event, is_hierarchical_event)
@@ -233,13 +266,11 @@ async def apply_log_entry(entry):
                     1 if (p.get("is_hierarchical") or p.get("is_hierarchical_event")) else 0,
                 ),
             )
-        conn.commit()
     elif t == "RESPOND_EVENT_INVITATION" and "EVENTOS" in SHARD_NAME:
         cursor.execute(
             "UPDATE event_participants SET is_accepted=? WHERE event_id=? AND user_id=?",
             (1 if p.get("accepted") else 0, p.get("event_id"), p.get("user_id"))
         )
-        conn.commit()
     elif t == "UPDATE_GROUP" and "GRUPOS" in SHARD_NAME:
         # Actualizar nombre y/o descripción del grupo
         name = p.get("name")
@@ -251,20 +282,17 @@ async def apply_log_entry(entry):
             cursor.execute("UPDATE groups SET name=? WHERE id=?", (name, group_id))
         elif description is not None:
             cursor.execute("UPDATE groups SET description=? WHERE id=?", (description, group_id))
-        conn.commit()
     elif t == "DELETE_GROUP" and "GRUPOS" in SHARD_NAME:
         # Eliminar grupo y sus relaciones
         group_id = p.get("group_id")
         cursor.execute("DELETE FROM group_invitations WHERE group_id=?", (group_id,))
         cursor.execute("DELETE FROM group_members WHERE group_id=?", (group_id,))
         cursor.execute("DELETE FROM groups WHERE id=?", (group_id,))
-        conn.commit()
     elif t == "DELETE_MEMBER" and "GRUPOS" in SHARD_NAME:
         # Eliminar un miembro del grupo
         group_id = p.get("group_id")
         member_id = p.get("member_id")
         cursor.execute("DELETE FROM group_members WHERE group_id=? AND user_id=?", (group_id, member_id))
-        conn.commit()
     elif t == "UPDATE_EVENT" and "EVENTOS" in SHARD_NAME:
         # Actualizar un evento
         event_id = p.get("event_id")
@@ -307,7 +335,64 @@ async def apply_log_entry(entry):
                     (event_id, creator_id)
                 )
 
-        conn.commit()
+
+
+def _apply_entry(entry):
+    _execute_command(apply_cursor, entry)
+    apply_conn.commit()
+
+
+def _apply_batch(entries):
+    if not apply_conn.in_transaction:
+        apply_cursor.execute("BEGIN")
+    for entry in entries:
+        apply_cursor.execute("SAVEPOINT raft_entry")
+        try:
+            _execute_command(apply_cursor, entry)
+        except Exception as e:
+            apply_cursor.execute("ROLLBACK TO raft_entry")
+            logger.error(f"Error aplicando entrada {entry.index}: {e}")
+        apply_cursor.execute("RELEASE raft_entry")
+    apply_conn.commit()
+
+
+def _backup_to(path: str):
+    dest = sqlite3.connect(path)
+    try:
+        apply_conn.backup(dest)
+    finally:
+        dest.close()
+
+
+def _restore_from(path: str):
+    src = sqlite3.connect(path)
+    try:
+        src.backup(apply_conn)
+    finally:
+        src.close()
+
+
+async def apply_log_entry(entry):
+    await run_in(db_executor, _apply_entry, entry)
+
+
+async def apply_log_batch(entries):
+    """Aplica un lote de entradas comprometidas en una única transacción SQLite.
+
+    Cada entrada va en su propio SAVEPOINT: si una falla se deshace solo esa. Corre
+    en el hilo de escritura del shard, fuera del event loop.
+    """
+    await run_in(db_executor, _apply_batch, entries)
+
+
+async def snapshot_state(path: str):
+    """Copia consistente de la base SQLite del shard (snapshot de la máquina de estado)."""
+    await run_in(db_executor, _backup_to, path)
+
+
+async def restore_state(path: str):
+    """Reemplaza el contenido de la base local con un snapshot recibido."""
+    await run_in(db_executor, _restore_from, path)
 
 
 raft = RaftNode(
@@ -317,18 +402,59 @@ raft = RaftNode(
     heartbeat_interval=1.0,
     election_timeout_range=(2.0, 4.0),
     state_machine_callback=apply_log_entry,
+    apply_batch_callback=apply_log_batch,
     self_url=NODE_URL,
     replication_factor=REPLICATION_FACTOR or None,
+    snapshot_callback=snapshot_state,
+    restore_callback=restore_state,
+    snapshot_threshold=SNAPSHOT_THRESHOLD,
+    batch_window=RAFT_BATCH_WINDOW_MS / 1000.0,
+    max_batch_size=RAFT_MAX_BATCH,
+    max_inflight=RAFT_MAX_INFLIGHT,
+    replication_timeout=RAFT_REPLICATION_TIMEOUT,
+    lease_reads=RAFT_LEASE_READS,
+    wire_format=RAFT_WIRE_FORMAT,
+    stream_port_offset=RAFT_STREAM_PORT_OFFSET or None,
+    learner=RAFT_LEARNER,
+    durability=RAFT_DURABILITY,
+    sync_interval=RAFT_SYNC_INTERVAL_MS / 1000.0,
+    max_pending_proposals=RAFT_MAX_PENDING,
+    max_queued_appends=RAFT_MAX_QUEUED_APPENDS,
+    profiler=StackSampler(RAFT_PROFILE_INTERVAL_MS / 1000.0) if RAFT_PROFILE_INTERVAL_MS > 0 else None,
+    http_pool=RAFT_GROUP_HOST.http if RAFT_GROUP_HOST else PeerClientPool(
+        limit_per_peer=RAFT_CONN_LIMIT,
+        connect_timeout=RAFT_CONNECT_TIMEOUT,
+        default_timeout=RAFT_RPC_TIMEOUT,
+    ),
 )
+if RAFT_GROUP_HOST:
+    RAFT_GROUP_HOST.register(raft)
 
 
 @app.on_event("startup")
 async def startup():
+    loop_lag_monitor().start()
+    if "USUARIOS" in SHARD_NAME:
+        asyncio.create_task(run_cpu(bcrypt.gensalt))  # arranca el pool de bcrypt antes del primer login
     asyncio.create_task(raft.start())
     if COORD_URL:
         asyncio.create_task(register_in_coordinator())
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    await raft.close_log()  # fsync de lo pendiente (durabilidad group)
+    db_executor.shutdown(wait=True)
+    if raft.profiler is not None:
+        raft.profiler.stop()
+    if RAFT_GROUP_HOST:
+        return  # el transporte y los ejecutores compartidos los cierra el host
+    await raft.http.close()
+    if raft.stream is not None:
+        await raft.stream.close()
+    shutdown_executors()
+
+
 async def register_in_coordinator():
     urls = []
     if COORD_URLS:
@@ -356,14 +482,48 @@ async def register_in_coordinator():
         await asyncio.sleep(10)
 
 
+class ConsistentReadMiddleware:
+    """Con ?consistent=true una lectura espera ReadIndex antes de consultar SQLite local.
+
+    Middleware ASGI puro: el resto de requests (RPC de RAFT incluidos) pasan sin costo extra.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "GET" and \
+                b"consistent=" in scope.get("query_string", b""):
+            if Request(scope).query_params.get("consistent") in ("1", "true") and \
+                    not await raft.read_barrier():
+                response = JSONResponse({"error": "No se pudo confirmar una lectura consistente"}, status_code=503)
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(ConsistentReadMiddleware)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """Escrituras rechazadas por admisión: el cliente reintenta tras Retry-After."""
+    retry_after = max(1, math.ceil(exc.retry_after))
+    return JSONResponse({"error": str(exc), "retry_after": retry_after}, status_code=exc.status,
+                        headers={"Retry-After": str(retry_after)})
+
+
 # ========= Endpoints de aplicación según shard =========
 
 @app.post("/admin/peers/update")
 async def admin_update_peers(data: dict):
     peers = data.get("peers") or []
     repl = data.get("replication_factor")
-    await raft.update_peers(peers, replication_factor=repl)
-    return {"status": "ok", "peers": peers, "replication_factor": raft.replication_factor}
+    if not await raft.update_peers(peers, replication_factor=repl):
+        # La membresía ya está en el log: solo el líder la cambia
+        return JSONResponse({"error": "No soy líder", "leader": raft.leader_id}, status_code=503)
+    return {"status": "ok", "peers": peers, "learners": raft.learners,
+            "replication_factor": raft.replication_factor}
 
 if "USUARIOS" in SHARD_NAME:
     def _get_user(username: str):
@@ -382,15 +542,11 @@ if "USUARIOS" in SHARD_NAME:
         cursor.execute("SELECT 1 FROM users WHERE username=?", (username,))
         if cursor.fetchone():
             return {"error": "El nombre de usuario ya existe"}
-        password_hash = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+        password_hash = (await run_cpu(bcrypt.hashpw, password.encode("utf-8"), bcrypt.gensalt())).decode("utf-8")
         cmd = json.dumps({"type": "CREATE_USER", "payload": {"username": username, "password_hash": password_hash, "email": email}})
-        entry = raft.append_log(cmd)
-        replicated = await raft.replicate_log(entry)
-        if not replicated:
+        entry = await raft.propose(cmd)
+        if not entry:
             return {"error": "No se pudo replicar el usuario en la mayoría de nodos"}
-        await raft.apply_to_state_machine(entry)
-        raft.last_applied = max(raft.last_applied, entry.index)
-        raft.save_state()
         cursor.execute("SELECT id FROM users WHERE username=?", (username,))
         row = cursor.fetchone()
         return {"message": "Usuario registrado exitosamente", "user_id": row[0] if row else None}
@@ -408,7 +564,8 @@ if "USUARIOS" in SHARD_NAME:
             return {"error": "Credenciales inválidas", "status_code": 401}
         _, _, stored_hash = db_user
         try:
-            valid = bcrypt.checkpw(password.encode("utf-8"), stored_hash.encode("utf-8") if isinstance(stored_hash, str) else stored_hash)
+            valid = await run_cpu(bcrypt.checkpw, password.encode("utf-8"),
+                                  stored_hash.encode("utf-8") if isinstance(stored_hash, str) else stored_hash)
         except Exception:
             valid = False
         if not valid:
@@ -416,13 +573,9 @@ if "USUARIOS" in SHARD_NAME:
         user_id = db_user[0]
         token = secrets.token_hex(16)
         cmd = json.dumps({"type": "CREATE_SESSION", "payload": {"token": token, "user_id": user_id, "created_at": datetime.utcnow().isoformat()}})
-        entry = raft.append_log(cmd)
-        replicated = await raft.replicate_log(entry)
-        if not replicated:
+        entry = await raft.propose(cmd)
+        if not entry:
             return {"error": "No se pudo replicar la sesión en la mayoría de nodos"}
-        await raft.apply_to_state_machine(entry)
-        raft.last_applied = max(raft.last_applied, entry.index)
-        raft.save_state()
         return {"token": token, "user_id": user_id}
 
     @app.get("/auth/validate")
@@ -456,13 +609,9 @@ elif "GRUPOS" in SHARD_NAME:
         if not raft.is_leader():
             return {"error": "No soy el líder", "leader": raft.leader_id}
         cmd = json.dumps({"type": "CREATE_GROUP", "payload": group})
-        entry = raft.append_log(cmd)
-        replicated = await raft.replicate_log(entry)
-        if not replicated:
+        entry = await raft.propose(cmd)
+        if not entry:
             return {"error": "No se pudo replicar el grupo en la mayoría de nodos"}
-        await raft.apply_to_state_machine(entry)
-        raft.last_applied = max(raft.last_applied, entry.index)
-        raft.save_state()
         cursor.execute("SELECT id FROM groups WHERE name=? ORDER BY id DESC LIMIT 1", (group.get("name"),))
         row = cursor.fetchone()
         return {"status": "ok", "message": f"Grupo '{group.get('name')}' creado", "group_id": row[0] if row else None}
@@ -507,13 +656,9 @@ elif "GRUPOS" in SHARD_NAME:
         if not raft.is_leader():
             return {"error": "No soy el líder", "leader": raft.leader_id}
         cmd = json.dumps({"type": "INVITE_USER", "payload": invite})
-        entry = raft.append_log(cmd)
-        replicated = await raft.replicate_log(entry)
-        if not replicated:
+        entry = await raft.propose(cmd)
+        if not entry:
             return {"error": "No se pudo replicar la invitación en la mayoría de nodos"}
-        await raft.apply_to_state_machine(entry)
-        raft.last_applied = max(raft.last_applied, entry.index)
-        raft.save_state()
         return {"status": "ok", "message": "Invitación enviada"}
 
     @app.get("/groups/invitations")
@@ -537,13 +682,9 @@ elif "GRUPOS" in SHARD_NAME:
         if not raft.is_leader():
             return {"error": "No soy el líder", "leader": raft.leader_id}
         cmd = json.dumps({"type": "RESPOND_INVITATION", "payload": data})
-        entry = raft.append_log(cmd)
-        replicated = await raft.replicate_log(entry)
-        if not replicated:
+        entry = await raft.propose(cmd)
+        if not entry:
             return {"error": "No se pudo replicar la respuesta"}
-        await raft.apply_to_state_machine(entry)
-        raft.last_applied = max(raft.last_applied, entry.index)
-        raft.save_state()
         return {"status": "ok", "message": "Respuesta registrada"}
 
     @app.put("/groups/{group_id}")
@@ -576,13 +717,9 @@ elif "GRUPOS" in SHARD_NAME:
             payload["description"] = update["description"]
 
         cmd = json.dumps({"type": "UPDATE_GROUP", "payload": payload})
-        entry = raft.append_log(cmd)
-        replicated = await raft.replicate_log(entry)
-        if not replicated:
+        entry = await raft.propose(cmd)
+        if not entry:
             return {"error": "No se pudo replicar la actualización"}
-        await raft.apply_to_state_machine(entry)
-        raft.last_applied = max(raft.last_applied, entry.index)
-        raft.save_state()
         return {"status": "ok", "message": "Grupo actualizado exitosamente"}
 
     @app.delete("/groups/{group_id}")
@@ -603,13 +740,9 @@ elif "GRUPOS" in SHARD_NAME:
 
         payload = {"group_id": group_id}
         cmd = json.dumps({"type": "DELETE_GROUP", "payload": payload})
-        entry = raft.append_log(cmd)
-        replicated = await raft.replicate_log(entry)
-        if not replicated:
+        entry = await raft.propose(cmd)
+        if not entry:
             return {"error": "No se pudo replicar la eliminación"}
-        await raft.apply_to_state_machine(entry)
-        raft.last_applied = max(raft.last_applied, entry.index)
-        raft.save_state()
         return {"status": "ok", "message": "Grupo eliminado exitosamente"}
 
     @app.delete("/groups/{group_id}/members/{member_id}")
@@ -630,13 +763,9 @@ elif "GRUPOS" in SHARD_NAME:
 
         payload = {"group_id": group_id, "member_id": member_id}
         cmd = json.dumps({"type": "DELETE_MEMBER", "payload": payload})
-        entry = raft.append_log(cmd)
-        replicated = await raft.replicate_log(entry)
-        if not replicated:
+        entry = await raft.propose(cmd)
+        if not entry:
             return {"error": "No se pudo replicar la eliminación del miembro"}
-        await raft.apply_to_state_machine(entry)
-        raft.last_applied = max(raft.last_applied, entry.index)
-        raft.save_state()
         return {"status": "ok", "message": "Miembro eliminado exitosamente"}
 
 elif "EVENTOS" in SHARD_NAME:
@@ -645,13 +774,9 @@ elif "EVENTOS" in SHARD_NAME:
         if not raft.is_leader():
             return {"error": "No soy el líder", "leader": raft.leader_id}
         cmd = json.dumps({"type": "CREATE_EVENT", "payload": event})
-        entry = raft.append_log(cmd)
-        replicated = await raft.replicate_log(entry)
-        if not replicated:
+        entry = await raft.propose(cmd)
+        if not entry:
             return {"error": "No se pudo replicar el evento en la mayoría de nodos"}
-        await raft.apply_to_state_machine(entry)
-        raft.last_applied = max(raft.last_applied, entry.index)
-        raft.save_state()
         cursor.execute("SELECT id FROM events WHERE title=? AND creator_id=? ORDER BY id DESC LIMIT 1",
                        (event.get("title"), event.get("creator_id")))
         row = cursor.fetchone()
@@ -715,13 +840,9 @@ elif "EVENTOS" in SHARD_NAME:
         if not raft.is_leader():
             return {"error": "No soy el líder", "leader": raft.leader_id}
         cmd = json.dumps({"type": "RESPOND_EVENT_INVITATION", "payload": data})
-        entry = raft.append_log(cmd)
-        replicated = await raft.replicate_log(entry)
-        if not replicated:
+        entry = await raft.propose(cmd)
+        if not entry:
             return {"error": "No se pudo replicar la respuesta"}
-        await raft.apply_to_state_machine(entry)
-        raft.last_applied = max(raft.last_applied, entry.index)
-        raft.save_state()
         return {"status": "ok", "message": "Respuesta registrada"}
 
     @app.get("/events/{event_id}/details")
@@ -786,13 +907,9 @@ elif "EVENTOS" in SHARD_NAME:
         payload["time_changed"] = time_changed
 
         cmd = json.dumps({"type": "UPDATE_EVENT", "payload": payload})
-        entry = raft.append_log(cmd)
-        replicated = await raft.replicate_log(entry)
-        if not replicated:
+        entry = await raft.propose(cmd)
+        if not entry:
             return {"error": "No se pudo replicar la actualización"}
-        await raft.apply_to_state_machine(entry)
-        raft.last_applied = max(raft.last_applied, entry.index)
-        raft.save_state()
         return {"status": "ok", "message": "Evento actualizado exitosamente"}
 
     @app.get("/events/conflicts")
@@ -816,9 +933,28 @@ def state():
         "term": raft.current_term,
         "leader": raft.leader_id,
         "node_id": NODE_ID,
-        "shard": SHARD_NAME
+        "shard": SHARD_NAME,
+        "learner": raft.is_learner,
     }
 
+@app.get("/raft/loop")
+async def loop_lag():
+    """Atraso del event loop del proceso: si crece, los heartbeats salen tarde."""
+    return {"node_id": NODE_ID, **loop_lag_monitor().stats()}
+
+@app.get("/metrics")
+async def metrics():
+    """Métricas del nodo y del proceso en formato de texto de Prometheus."""
+    return Response(render_prometheus(raft.metrics, loop_lag_monitor().metrics),
+                    media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/metrics/profile")
+async def metrics_profile(section: Optional[str] = None, limit: int = 200):
+    """Pilas muestreadas (formato collapsed) de append_log, replicate_log o apply."""
+    if raft.profiler is None:
+        return JSONResponse({"error": "Profiler apagado (RAFT_PROFILE_INTERVAL_MS=0)"}, status_code=404)
+    return Response(raft.profiler.collapsed(section, limit), media_type="text/plain")
+
 @app.post("/raft/request_vote")
 async def request_vote(req: Request):
     data = await req.json()
@@ -829,10 +965,49 @@ async def request_vote(req: Request):
         data.get("last_log_term", 0)
     )
 
+@app.post("/raft/bully/challenge")
+async def bully_challenge(req: Request):
+    data = await req.json()
+    return await raft.handle_bully_challenge(data.get("candidate_id"), data.get("candidate_url"),
+                                             data.get("priority", 0))
+
+@app.post("/raft/bully/victory")
+async def bully_victory(req: Request):
+    data = await req.json()
+    return await raft.handle_bully_victory(data.get("leader_id"), data.get("leader_url"),
+                                           data.get("priority", 0), data.get("term", 0))
+
+@app.post("/raft/pre_vote")
+async def pre_vote(req: Request):
+    data = await req.json()
+    return await raft.handle_pre_vote(data.get("candidate_id"), data.get("term", 0),
+                                      data.get("last_log_index", 0), data.get("last_log_term", 0))
+
+@app.post("/raft/timeout_now")
+async def timeout_now(req: Request):
+    data = await req.json()
+    return await raft.handle_timeout_now(data.get("term", 0), data.get("leader_id"))
+
+@app.post("/raft/transfer_leadership")
+async def transfer_leadership(req: Request):
+    """Cede el liderazgo (p.ej. antes de un reinicio planificado); `target` opcional."""
+    body = await req.body()
+    data = json.loads(body) if body else {}
+    result = await raft.handle_transfer_leadership(data.get("target"))
+    return JSONResponse(result, status_code=200 if result.get("success") else 409)
+
 @app.post("/raft/append_entries")
 async def append_entries(req: Request):
-    data = await req.json()
-    return await raft.receive_append_entries(
+    # Toda respuesta lleva WIRE_HEADER: el líder distingue un error nuestro de un nodo viejo
+    wire = {WIRE_HEADER: "binary"}
+    try:
+        if req.headers.get("content-type") == BINARY_CONTENT_TYPE:
+            data = decode_append_entries(await req.body())
+        else:
+            data = await req.json()
+    except Exception as e:
+        return JSONResponse({"error": f"AppendEntries inválido: {e}"}, status_code=400, headers=wire)
+    result = await raft.receive_append_entries(
         data["term"],
         data["leader_id"],
         data.get("entries", []),
@@ -840,6 +1015,7 @@ async def append_entries(req: Request):
         data.get("prev_log_term", 0),
         data.get("leader_commit", 0)
     )
+    return JSONResponse(result, headers=wire)
 
 @app.post("/raft/heartbeat")
 async def heartbeat(req: Request):
@@ -847,26 +1023,83 @@ async def heartbeat(req: Request):
     await raft.receive_heartbeat(data["term"], data["leader_id"])
     return {"status": "ok"}
 
+@app.post("/raft/install_snapshot")
+async def install_snapshot(req: Request):
+    """Recibe un trozo de snapshot: metadatos en query string, datos crudos en el cuerpo."""
+    q = req.query_params
+    data = await req.body()
+    return await raft.handle_install_snapshot(
+        int(q["term"]),
+        q.get("leader_id"),
+        int(q["last_included_index"]),
+        int(q["last_included_term"]),
+        int(q.get("offset", 0)),
+        data,
+        q.get("done") == "true",
+        json.loads(q["config"]) if q.get("config") else None,
+    )
+
+@app.get("/raft/read_index")
+async def read_index():
+    """ReadIndex para seguidores: commit_index del líder tras confirmar su liderazgo."""
+    if not raft.is_leader():
+        return JSONResponse({"error": "No soy líder", "leader": raft.leader_id}, status_code=503)
+    index = await raft.read_index()
+    if index is None:
+        return JSONResponse({"error": "No se pudo confirmar el liderazgo"}, status_code=503)
+    return {"read_index": index}
+
+@app.get("/raft/snapshot")
+def snapshot_chunk(offset: int = 0):
+    """Sirve el snapshot actual por trozos para nodos que se recuperan."""
+    data, done, index, term = raft.read_snapshot_chunk(offset)
+    return Response(content=data, media_type="application/octet-stream", headers={
+        "X-Snapshot-Index": str(index),
+        "X-Snapshot-Term": str(term),
+        "X-Snapshot-Done": "true" if done else "false",
+    })
+
+# Las rutas que leen el log son async: el SegmentedLogStore (fds de lectura cacheados,
+# lista de segmentos) solo se toca desde el event loop, nunca desde el threadpool
 @app.get("/raft/sync")
-def sync_log(follower: str):
-    return {"missing_entries": [e.to_dict() for e in raft.log]}
+async def sync_log(follower: str = "", from_index: Optional[int] = None):
+    """Con from_index, el log desde ese índice en stream binario (reanudable);
+    sin él, el log entero en JSON como esperan los nodos anteriores."""
+    if from_index is not None:
+        return StreamingResponse(raft.sync_stream(from_index), media_type=SYNC_CONTENT_TYPE)
+    return {
+        "missing_entries": [e.to_dict() for e in raft.log],
+        "snapshot_index": raft.snapshot_index,
+        "snapshot_term": raft.snapshot_term,
+    }
 
 @app.get("/raft/log/summary")
-def log_summary():
-    last_index = len(raft.log)
-    last_term = raft.log[-1].term if raft.log else 0
-    return {
-        "last_index": last_index,
-        "last_term": last_term,
-        "commit_index": raft.commit_index,
+async def log_summary():
+    summary = raft.log_summary()
+    summary.update({
         "node_id": NODE_ID,
         "role": raft.role.value if hasattr(raft.role, 'value') else str(raft.role)
-    }
+    })
+    return summary
+
+@app.get("/raft/log/digest")
+async def log_digest(start: int = 1, end: int = 0, buckets: int = 16):
+    """Digests por rangos de índices para la anti-entropía del líder."""
+    return raft.log_digest(start, end, buckets)
+
+@app.get("/raft/log/range")
+async def log_range(start: int, end: int):
+    return {"entries": [e.to_dict() for e in raft.log_range(start, end)]}
 
 @app.get("/raft/log/full")
-def log_full():
-    """Devuelve el log completo para reconciliación."""
-    return {"entries": [e.to_dict() for e in raft.log], "commit_index": raft.commit_index, "term": raft.current_term}
+async def log_full():
+    """Devuelve el log completo (posterior al snapshot) para reconciliación."""
+    return {
+        "entries": [e.to_dict() for e in raft.log],
+        "commit_index": raft.commit_index,
+        "term": raft.current_term,
+        "snapshot_index": raft.snapshot_index,
+    }
 
 @app.get("/health")
 async def health():
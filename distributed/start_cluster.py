@@ -158,7 +158,7 @@ async def create_event(event: dict):
     if not raft.is_leader():
         return {"error": "No soy el líder", "leader": raft.leader_id}
 
-    entry = raft.append_log(f"CREATE_EVENT:{event['title']}")
+    entry = await raft.append_log(f"CREATE_EVENT:{event['title']}")
     replicated = await raft.replicate_log(entry)
 
     if not replicated:
@@ -201,7 +201,7 @@ async def create_group(group: dict):
     if not raft.is_leader():
         return {"error": "No soy el líder", "leader": raft.leader_id}
 
-    entry = raft.append_log(f"CREATE_GROUP:{group['name']}")
+    entry = await raft.append_log(f"CREATE_GROUP:{group['name']}")
     replicated = await raft.replicate_log(entry)
 
     if not replicated:
@@ -241,7 +241,7 @@ async def create_user(user: dict):
     if not raft.is_leader():
         return {"error": "No soy el líder", "leader": raft.leader_id}
 
-    entry = raft.append_log(f"CREATE_USER:{user['username']}")
+    entry = await raft.append_log(f"CREATE_USER:{user['username']}")
     replicated = await raft.replicate_log(entry)
 
     if not replicated:
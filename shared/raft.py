@@ -1,14 +1,78 @@
 import asyncio
-import aiohttp
+import bisect
+import hashlib
 import json
 import os
 import random
 import time
 from enum import Enum
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Awaitable, Tuple
 import logging
 from urllib.parse import urlparse
 
+from shared.raft_log import (
+    DEFAULT_SEGMENT_SIZE,
+    DEFAULT_SYNC_BYTES,
+    DEFAULT_SYNC_INTERVAL,
+    CompactLog,
+    LogEntry,
+    ProgressFile,
+    SegmentedLogStore,
+    entries_as_records,
+    fsync_fds,
+    progress_path_for,
+    segment_dir_for,
+    snapshot_path_for,
+    write_json_atomic,
+)
+from shared.raft_executors import run_disk
+from shared.raft_membership import config_command, is_config_command, next_config_step, parse_config_command
+from shared.raft_metrics import COUNT_BOUNDS, SIZE_BOUNDS, Metrics, StackSampler, timed
+from shared.raft_scheduler import PRIORITY_CONSENSUS, PRIORITY_REPLICATION, Overloaded, PriorityLock
+from shared.raft_transport import (
+    MSG_APPEND_ENTRIES,
+    MSG_BULLY_CHALLENGE,
+    MSG_BULLY_VICTORY,
+    MSG_PRE_VOTE,
+    MSG_READ_INDEX,
+    MSG_REQUEST_VOTE,
+    MSG_TIMEOUT_NOW,
+    MSG_TRANSFER_LEADERSHIP,
+    MESSAGE_NAMES,
+    PeerClientPool,
+    PeerStreamClient,
+    StreamUnavailable,
+    serve_peer_stream,
+)
+from shared.raft_wire import (
+    BINARY_CONTENT_TYPE,
+    SYNC_CONTENT_TYPE,
+    SYNC_ENTRY,
+    SYNC_HEADER,
+    WIRE_HEADER,
+    append_entries_json,
+    decode_append_entries,
+    decode_sync_header,
+    encode_append_entries,
+    encode_sync_entries,
+    encode_sync_header,
+)
+
+# Tamaño de cada trozo al transferir snapshots (InstallSnapshot)
+SNAPSHOT_CHUNK_SIZE = 512 * 1024
+# Etiqueta `priority` de las métricas del lock
+LOCK_PRIORITY_NAMES = {PRIORITY_CONSENSUS: "consensus", PRIORITY_REPLICATION: "replication"}
+# Anti-entropía: rangos por nivel del árbol de digests y tamaño de hoja que se descarga
+DIGEST_FANOUT = 16
+DIGEST_LEAF_SIZE = 64
+# Tras ceder el liderazgo no lo reclamamos por prioridad durante este plazo (reinicios planificados)
+LEADERSHIP_HOLD = 30.0
+# Entrada vacía que un líder nuevo compromete en su término: con ella quedan comprometidas
+# las de términos anteriores (ReadIndex). La aplicación nunca la ve
+NOOP_COMMAND = json.dumps({"type": "RAFT_NOOP"})
+# Al reconfigurar, máximo que se espera a que los learners nuevos voten antes de quitar votantes
+LEARNER_CATCHUP_TIMEOUT = 60.0
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("raft")
@@ -18,19 +82,31 @@ class RaftRole(str, Enum):
     CANDIDATE = "candidate"
     LEADER = "leader"
 
-class LogEntry:
-    """Una entrada en el log de RAFT"""
-    def __init__(self, term: int, command: str, index: int = None):
-        self.term = term
-        self.command = command
-        self.index = index
+class PeerPipeline:
+    """Estado de la replicación en pipeline hacia un seguidor."""
+    __slots__ = ("cursor", "generation", "in_flight", "event", "heartbeat_due", "backoff_until", "task",
+                 "last_heartbeat", "sent_commit", "rtt")
+
+    def __init__(self, next_index: int):
+        self.cursor = next_index      # próximo índice a enviar (avanza de forma optimista)
+        self.generation = 0           # cambia al rebobinar: invalida respuestas viejas
+        self.in_flight = set()
+        self.event = asyncio.Event()
+        self.heartbeat_due = False    # fuerza un envío aunque no toque (elección, ReadIndex)
+        self.backoff_until = 0.0
+        self.task: Optional[asyncio.Task] = None
+        self.last_heartbeat = 0.0     # envío del último AppendEntries vacío
+        self.sent_commit = 0          # leader_commit del último mensaje enviado
+        self.rtt = 0.0                # ida y vuelta medida (media móvil)
+
+    def rewind(self, next_index: int):
+        self.cursor = next_index
+        self.generation += 1
 
-    def to_dict(self):
-        return {"term": self.term, "command": self.command, "index": self.index}
+    def finish(self, task: asyncio.Task):
+        self.in_flight.discard(task)
+        self.event.set()
 
-    @staticmethod
-    def from_dict(d):
-        return LogEntry(term=d["term"], command=d["command"], index=d.get("index"))
 
 class RaftNode:
     """
@@ -40,17 +116,78 @@ class RaftNode:
     def __init__(self, node_id: str, peers: List[str], state_file: str, 
                  heartbeat_interval: float = 1.0, election_timeout_range: tuple = (2.0, 4.0),
                  state_machine_callback=None, self_url: Optional[str] = None,
-                 replication_factor: Optional[int] = None):
+                 replication_factor: Optional[int] = None,
+                 segment_size: int = DEFAULT_SEGMENT_SIZE,
+                 snapshot_callback=None, restore_callback=None,
+                 snapshot_threshold: int = 1000, snapshot_interval: float = 30.0,
+                 http_pool: Optional[PeerClientPool] = None,
+                 batch_window: float = 0.002, max_batch_size: int = 128,
+                 max_append_entries: int = 256, max_append_bytes: int = 1024 * 1024,
+                 max_inflight: int = 4, replication_timeout: float = 5.0,
+                 apply_batch_callback=None, max_apply_batch: int = 256,
+                 lease_reads: bool = False, wire_format: str = "binary",
+                 stream_port_offset: Optional[int] = None, min_heartbeat_interval: float = 0.05,
+                 learner: bool = False, durability: str = "strict",
+                 sync_interval: float = DEFAULT_SYNC_INTERVAL, sync_bytes: int = DEFAULT_SYNC_BYTES,
+                 max_pending_proposals: int = 1024, max_queued_appends: int = 8,
+                 profiler: Optional[StackSampler] = None,
+                 stream_client: Optional[PeerStreamClient] = None):
         self.node_id = node_id
         self.peers = peers
+        # Learners: reciben el log y sirven lecturas, pero no votan ni cuentan para el
+        # quórum. Los miembros nuevos entran así y el líder los promueve al ponerse al
+        # día; una réplica de lectura (learner=True) no se promueve nunca.
+        self.learners: List[str] = []
+        self.read_replica = learner
+        self.is_learner = learner
+        self._read_replicas = set()
+        # Índice de la última configuración adoptada del log (0: membresía por env/admin)
+        # y la última comprometida, a la que se vuelve si se trunca una sin comprometer
+        self._config_index = 0
+        self._committed_config: Tuple[int, Optional[dict]] = (0, None)
+        self._reconfig_lock = asyncio.Lock()
+        self._reconfig_task: Optional[asyncio.Task] = None
         self.state_file = state_file
+        # Log persistente en segmentos append-only (el state_file solo guarda metadatos).
+        # durability: "strict" (fsync por lote), "group" (fsync cada sync_interval o
+        # sync_bytes) o "relaxed" (lo vuelca el SO). Fuera de strict un nodo confirma
+        # entradas que una caída de la máquina puede perder: si cae una mayoría a la
+        # vez se pierden escrituras ya confirmadas al cliente.
+        self.durability = durability
+        self.log_store = SegmentedLogStore(segment_dir_for(state_file), segment_size=segment_size,
+                                           durability=durability, sync_interval=sync_interval,
+                                           sync_bytes=sync_bytes)
+        # Último fsync del log en curso en el ejecutor de disco (cada uno espera al anterior)
+        self._log_sync: Optional[asyncio.Future] = None
+        # commit_index/last_applied avanzan en cada RPC: se guardan aparte, sin reescribir el JSON
+        self.progress_file = ProgressFile(progress_path_for(state_file))
+        # Snapshots de la máquina de estado: callback(path) escribe/restaura el archivo
+        self.snapshot_callback = snapshot_callback
+        self.restore_callback = restore_callback
+        self.snapshot_file = snapshot_path_for(state_file)
+        self.snapshot_threshold = snapshot_threshold
+        self.snapshot_interval = snapshot_interval
         self.state_machine_callback = state_machine_callback
         self.self_url = self_url or node_id
+        # Conexiones persistentes por peer para todos los RPC
+        self.http = http_pool or PeerClientPool()
+        # Stream TCP multiplexado por peer (puerto HTTP + offset) para AppendEntries,
+        # votos, Bully y ReadIndex; HTTP queda para administración y como respaldo.
+        # `stream_client` reemplaza el transporte (p.ej. la red en memoria de raft_sim)
+        self.stream_port_offset = stream_port_offset
+        self.stream = stream_client or (PeerStreamClient(stream_port_offset) if stream_port_offset else None)
+        self._stream_server: Optional[asyncio.AbstractServer] = None
+        # RaftGroupHost que aloja este grupo junto a otros del mismo proceso (Multi-RAFT):
+        # comparte transporte, sirve el stream y envía los heartbeats ociosos en lote
+        self.group_host = None
         
         # Estado RAFT persistente
         self.current_term = 0
         self.voted_for: Optional[str] = None
-        self.log: List[LogEntry] = []
+        # Entradas posteriores al snapshot; en memoria solo términos y offsets
+        self.log = CompactLog(self.log_store)
+        self.snapshot_index = 0
+        self.snapshot_term = 0
         
         # Estado RAFT volátil
         self.commit_index = 0
@@ -62,6 +199,7 @@ class RaftNode:
         # Para líderes
         self.next_index: Dict[str, int] = {}
         self.match_index: Dict[str, int] = {}
+        self._match_sorted: List[int] = []  # match_index de los peers, ordenado ascendente
         self.peer_health: Dict[str, float] = {}
         self.peer_health_window = 5.0  # segundos para considerar un peer "vivo"
         self.replication_factor = max(1, min(len(peers) + 1, replication_factor or len(peers) + 1))
@@ -73,13 +211,79 @@ class RaftNode:
         self._last_preempt_attempt = 0.0
         
         # Configuración de timeouts
+        # heartbeat_interval es el máximo entre heartbeats a un peer ocioso; con RTT
+        # alto se acorta para que lleguen antes del timeout de elección
         self.heartbeat_interval = heartbeat_interval
+        self.min_heartbeat_interval = min(min_heartbeat_interval, heartbeat_interval)
         self.election_timeout_range = election_timeout_range
         self.election_timeout = self._random_election_timeout()
         self.last_heartbeat_time = time.time()
+        self._leader_contact = 0.0  # último mensaje recibido de un líder (pre-vote)
+
+        # Transferencia de liderazgo (TimeoutNow): mientras hay una en curso las
+        # propuestas nuevas esperan; _transfer_waiter se resuelve con la victoria del destino
+        self._transfer_target: Optional[str] = None
+        self._transfer_idle = asyncio.Event()
+        self._transfer_idle.set()
+        self._transfer_waiter: Optional[asyncio.Future] = None
+        self._victory_event = asyncio.Event()  # se dispara (y renueva) con cada anuncio de victoria
+        self._preempt_hold_until = 0.0
         
-        # Bloqueo para operaciones concurrentes
-        self._lock = asyncio.Lock()
+        # Bloqueo para operaciones concurrentes, con prioridad: votos, heartbeats y Bully
+        # pasan antes que la replicación. Con más de max_queued_appends AppendEntries
+        # con entradas esperando, los nuevos se rechazan y el líder reintenta más tarde
+        self._lock = PriorityLock()
+        self.max_queued_appends = max(1, max_queued_appends)
+        self._snapshot_transfers = set()
+
+        # Aplicación de entradas: un worker alimentado por avisos de commit, fuera de _lock.
+        # apply_batch_callback(entries) aplica un lote completo (p.ej. en una transacción)
+        self.apply_batch_callback = apply_batch_callback
+        self.max_apply_batch = max(1, max_apply_batch)
+        self._apply_queue: asyncio.Queue = asyncio.Queue()
+        self._apply_lock = asyncio.Lock()  # serializa aplicar vs snapshot/restauración
+        self._applied_event = asyncio.Event()
+
+        # Group commit: propuestas que llegan juntas se agregan y replican en un lote
+        self.batch_window = batch_window
+        self.max_batch_size = max(1, max_batch_size)
+        self._proposals: List[tuple] = []
+        # Admisión: con la cola llena propose lanza Overloaded (429 con Retry-After)
+        self.max_pending_proposals = max(self.max_batch_size, max_pending_proposals)
+        self._batch_latency = 0.0  # duración media de un lote (estimar Retry-After)
+        self._proposal_event = asyncio.Event()
+        self._batch_task: Optional[asyncio.Task] = None
+        self._batches_in_flight = set()  # tareas que esperan el commit de un lote
+        self._noop_task: Optional[asyncio.Task] = None  # no-op del término, propuesta al ascender
+
+        # Tope por mensaje AppendEntries: la puesta al día viaja en trozos acotados
+        self.max_append_entries = max(1, max_append_entries)
+        self.max_append_bytes = max_append_bytes
+
+        # Replicación en pipeline: una tarea por seguidor con ventana de mensajes en vuelo
+        self.max_inflight = max(1, max_inflight)
+        self.replication_timeout = replication_timeout
+        self._pipelines: Dict[str, PeerPipeline] = {}
+        # Lecturas linealizables: momento de envío del último AppendEntries que cada
+        # peer confirmó. Con lease_reads el líder sirve lecturas sin ronda extra mientras
+        # una mayoría lo confirmó hace menos que el timeout mínimo de elección.
+        self.lease_reads = lease_reads
+        self.lease_duration = election_timeout_range[0] * 0.8
+        self._lease_since = 0.0  # el lease solo cuenta acks de envíos posteriores (transferencias)
+        self._peer_ack_sent: Dict[str, float] = {}
+        self._ack_event = asyncio.Event()
+        # Formato de AppendEntries: "binary" (frame compacto) o "json"; un peer que
+        # rechaza el binario sin anunciar WIRE_HEADER (versión vieja) pasa a JSON
+        self.wire_format = wire_format
+        self._peer_wire: Dict[str, str] = {}
+        # Último índice que cada peer reportó tener (anti-entropía)
+        self._peer_last_index: Dict[str, int] = {}
+        self._commit_event = asyncio.Event()
+        self._commit_time = 0.0  # último avance de commit_index (aviso diferido a seguidores)
+
+        # Métricas (GET /metrics) y profiler opcional de append/replicación/aplicación
+        self.profiler = profiler
+        self._init_metrics()
         
         # Cargar estado persistente
         self.load_state()
@@ -94,60 +298,239 @@ class RaftNode:
 
     def _init_leader_state(self):
         """Inicializa el estado específico del líder"""
-        for peer in self.peers:
-            self.next_index[peer] = len(self.log) + 1
-            self.match_index[peer] = 0
+        for peer in self.peers + self.learners:
+            self.next_index[peer] = self._last_log_index() + 1
+        self._reset_match_index()
+        self._peer_ack_sent = {}
+        # Las tareas de replicación previas terminan al ver un pipeline nuevo
+        self._pipelines = {p: PeerPipeline(self.next_index[p]) for p in self.peers + self.learners}
 
     # ====================================================
     # Persistencia
     # ====================================================
 
     def save_state(self):
-        """Guarda el estado persistente en disco"""
-        os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+        """Guarda los metadatos persistentes (el log vive en los segmentos)"""
+        os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
         state = {
             "current_term": self.current_term,
             "voted_for": self.voted_for,
-            "log": [e.to_dict() for e in self.log],
             "commit_index": self.commit_index,
             "last_applied": self.last_applied,
+            "snapshot_index": self.snapshot_index,
+            "snapshot_term": self.snapshot_term,
             "peers": self.peers,
+            "learners": self.learners + ([self.self_url] if self.is_learner else []),
             "replication_factor": self.replication_factor,
+            "config_index": self._config_index,
+            "committed_config": list(self._committed_config),
         }
         try:
-            with open(self.state_file, "w") as f:
-                json.dump(state, f, indent=2)
+            write_json_atomic(self.state_file, state, durable=self.durability != "relaxed")
         except Exception as e:
             logger.error(f"Error guardando estado: {e}")
+        self.save_progress()
+
+    def save_progress(self):
+        """Persiste solo commit_index/last_applied (un pwrite, sin fsync ni rename)."""
+        try:
+            self.progress_file.write(self.commit_index, self.last_applied)
+        except Exception as e:
+            logger.error(f"Error guardando progreso: {e}")
 
     def load_state(self):
         """Carga el estado persistente desde disco"""
+        state = {}
         if os.path.exists(self.state_file):
             try:
                 with open(self.state_file, "r") as f:
                     state = json.load(f)
-                self.current_term = state.get("current_term", 0)
-                self.voted_for = state.get("voted_for")
-                
-                # Reconstruir log con índices
-                log_data = state.get("log", [])
-                self.log = []
-                for i, entry_data in enumerate(log_data):
-                    entry = LogEntry.from_dict(entry_data)
-                    entry.index = i + 1
-                    self.log.append(entry)
-                
-                self.commit_index = state.get("commit_index", 0)
-                self.last_applied = state.get("last_applied", 0)
-                loaded_peers = state.get("peers")
-                if loaded_peers:
-                    self._set_peers(loaded_peers, persist=False)
-                rep = state.get("replication_factor")
-                if rep:
-                    self.replication_factor = max(1, rep)
-                logger.info(f"✅ Estado cargado: término {self.current_term}, {len(self.log)} entradas")
             except Exception as e:
                 logger.error(f"Error cargando estado: {e}")
+        self.current_term = state.get("current_term", 0)
+        self.voted_for = state.get("voted_for")
+        self.snapshot_index = state.get("snapshot_index", 0)
+        self.snapshot_term = state.get("snapshot_term", 0)
+
+        try:
+            self.log_store.load()
+        except Exception as e:
+            logger.error(f"Error cargando segmentos del log: {e}")
+        # Los segmentos pueden conservar entradas ya cubiertas por el snapshot (la vista las oculta)
+        if self.log and self.log_store.first_index() > self.snapshot_index + 1:
+            logger.error(f"Log no contiguo con el snapshot ({self.snapshot_index}), se descarta")
+            self._replace_log([])
+
+        # Migración: formato antiguo con el log completo dentro del JSON
+        log_data = state.get("log")
+        if log_data and not self.log and not self.snapshot_index:
+            entries = []
+            for i, entry_data in enumerate(log_data):
+                entry = LogEntry.from_dict(entry_data)
+                entry.index = i + 1
+                entries.append(entry)
+            self._replace_log(entries)
+            logger.info(f"📦 Migradas {len(self.log)} entradas al log segmentado")
+
+        self.commit_index = max(self.snapshot_index, min(state.get("commit_index", 0), self._last_log_index()))
+        self.last_applied = max(self.snapshot_index, state.get("last_applied", 0))
+        loaded_peers = state.get("peers")
+        if loaded_peers:
+            learners = state.get("learners", [])
+            self._set_peers(loaded_peers + learners, persist=False, learners=learners)
+        self._config_index = state.get("config_index", 0)
+        self._committed_config = tuple(state.get("committed_config", (0, None)))
+        rep = state.get("replication_factor")
+        if rep:
+            self.replication_factor = max(1, rep)
+        # El archivo de progreso puede ir por delante de los metadatos
+        progress_commit, progress_applied = self.progress_file.read()
+        self.commit_index = max(self.commit_index, min(progress_commit, self._last_log_index()))
+        self.last_applied = max(self.last_applied, progress_applied)
+        if log_data is not None:
+            self.save_state()
+        if state:
+            logger.info(f"✅ Estado cargado: término {self.current_term}, {len(self.log)} entradas "
+                        f"(snapshot en {self.snapshot_index})")
+
+    def _persist_entries(self, entries: List[LogEntry], sync: bool = True):
+        """Agrega entradas al log (costo proporcional a las nuevas).
+
+        Con `sync=False` el fsync queda para `_sync_log`, fuera del event loop.
+        """
+        if not entries:
+            return
+        self.log_store.append(entries_as_records(entries), sync=sync)
+        for entry in entries:
+            if is_config_command(entry.command):
+                self._adopt_config(entry.index, parse_config_command(entry.command))
+
+    def _merge_entries(self, entries: List[LogEntry]):
+        """Agrega entradas contiguas: omite las que ya tenemos y trunca solo ante conflicto.
+
+        No hace fsync: el llamador espera `_sync_log` antes de dar las entradas por persistidas.
+        """
+        new_entries = []
+        for entry in entries:
+            if not new_entries:
+                if entry.index <= self.snapshot_index:
+                    continue
+                if entry.index <= self._last_log_index() and self._term_at(entry.index) == entry.term:
+                    continue
+                self._truncate_log(entry.index - 1)
+            new_entries.append(entry)
+        self._persist_entries(new_entries, sync=False)
+
+    async def _sync_log(self):
+        """fsync del log en el ejecutor de disco según la durabilidad.
+
+        En modo strict espera a que todo lo escrito hasta ahora esté en disco (incluidos
+        fsync ya en curso); en modo group solo lo lanza si toca, sin esperar.
+        """
+        if self.log_store.sync_due():
+            job = self.log_store.begin_sync()
+            if job is not None:
+                self._log_sync = asyncio.ensure_future(self._fsync_log(job, self._log_sync))
+                # En modo group nadie lo espera: el error ya queda registrado
+                self._log_sync.add_done_callback(lambda f: f.cancelled() or f.exception())
+        if self.durability == "strict" and self._log_sync is not None and not self._log_sync.done():
+            await asyncio.shield(self._log_sync)
+
+    async def _fsync_log(self, job: Tuple[List[int], int], previous: Optional[asyncio.Future]):
+        try:
+            with timed(self._m_fsync):
+                await run_disk(fsync_fds, job[0])
+        except Exception as e:
+            self.log_store.end_sync(job, ok=False)
+            logger.error(f"Error sincronizando el log: {e}")
+            raise
+        self.log_store.end_sync(job)
+        if previous is not None:
+            # Lo anterior puede estar en otro segmento: terminado este, también aquel
+            await previous
+
+    async def close_log(self):
+        """Cierre ordenado del log: lo pendiente se sincroniza en el ejecutor de disco."""
+        job = self.log_store.begin_sync()
+        if job is not None:
+            try:
+                await self._fsync_log(job, self._log_sync)
+            except Exception:
+                pass  # ya registrado en _fsync_log; close() lo reintenta
+        self.log_store.close()
+
+    def _truncate_log(self, last_index: int):
+        """Descarta las entradas posteriores a `last_index`."""
+        if max(last_index, self.snapshot_index) < self._last_log_index():
+            self.log_store.truncate_from(max(last_index, self.snapshot_index) + 1)
+            if self._config_index > self._last_log_index():
+                # Se descartó una configuración sin comprometer: vuelve la comprometida
+                self._adopt_config(*self._committed_config)
+
+    def _replace_log(self, entries: List[LogEntry]):
+        """Reemplaza el log completo (adopción del log de otro nodo)."""
+        self.log_store.reset(entries_as_records(entries))
+
+    # ====================================================
+    # Índices del log (el log en memoria empieza tras el snapshot)
+    # ====================================================
+
+    def _last_log_index(self) -> int:
+        return self.snapshot_index + len(self.log)
+
+    def _last_log_term(self) -> int:
+        return self._term_at(self._last_log_index())
+
+    @property
+    def snapshot_index(self) -> int:
+        return self.log.base
+
+    @snapshot_index.setter
+    def snapshot_index(self, value: int):
+        # La vista del log empieza justo después del snapshot
+        self.log.base = value
+
+    def _entry_at(self, index: int) -> Optional[LogEntry]:
+        """Entrada con índice `index`, o None si está compactada o no existe."""
+        if self.snapshot_index < index <= self._last_log_index():
+            return self.log_store.read_range(index, index)[0]
+        return None
+
+    def _term_at(self, index: int) -> int:
+        """Término de `index` sin leer el comando del disco."""
+        if index == self.snapshot_index:
+            return self.snapshot_term
+        if self.snapshot_index < index <= self._last_log_index():
+            return self.log_store.term_at(index)
+        return 0
+
+    def log_range(self, start: int, end: int, max_bytes: Optional[int] = None) -> List[LogEntry]:
+        """Entradas con índice en [start, end] que sigan en el log."""
+        start = max(start, self.snapshot_index + 1)
+        end = min(end, self._last_log_index())
+        if start > end:
+            return []
+        return self.log_store.read_range(start, end, max_bytes=max_bytes)
+
+    def _range_hash(self, start: int, end: int) -> str:
+        h = hashlib.blake2b(digest_size=8)
+        for entry in self.log_range(start, end):
+            h.update(f"{entry.term}:{len(entry.command)}:{entry.command}".encode("utf-8"))
+        return h.hexdigest()
+
+    def log_digest(self, start: int, end: int = 0, buckets: int = DIGEST_FANOUT) -> dict:
+        """Digests de `buckets` subrangos de [start, end] (end=0: hasta el final del log)."""
+        last = self._last_log_index()
+        start = max(start, self.snapshot_index + 1)
+        end = min(end, last) if end else last
+        ranges = []
+        if start <= end:
+            buckets = max(1, min(buckets, end - start + 1))
+            step = -(-(end - start + 1) // buckets)
+            for lo in range(start, end + 1, step):
+                hi = min(end, lo + step - 1)
+                ranges.append([lo, hi, self._range_hash(lo, hi)])
+        return {"last_index": last, "snapshot_index": self.snapshot_index, "ranges": ranges}
 
     # ====================================================
     # Estado interno
@@ -156,17 +539,33 @@ class RaftNode:
     def is_leader(self) -> bool:
         return self.role == RaftRole.LEADER
 
+    def log_summary(self) -> dict:
+        """Resumen del log para diagnóstico y recuperación."""
+        return {
+            "last_index": self._last_log_index(),
+            "last_term": self._last_log_term(),
+            "commit_index": self.commit_index,
+            "snapshot_index": self.snapshot_index,
+            "snapshot_term": self.snapshot_term,
+        }
+
     def _healthy_peers(self) -> List[str]:
-        """Peers con los que tuvimos contacto reciente."""
+        """Peers con voto con los que tuvimos contacto reciente."""
         now = time.time()
-        return [p for p, ts in self.peer_health.items() if ts and (now - ts) <= self.peer_health_window]
+        return [p for p in self.peers
+                if self.peer_health.get(p) and (now - self.peer_health[p]) <= self.peer_health_window]
 
     def _target_peers(self) -> List[str]:
         """Selecciona el subconjunto al que se replicará activamente."""
         healthy = self._healthy_peers()
         unhealthy = [p for p in self.peers if p not in healthy]
         ordered = healthy + unhealthy
-        return ordered[: max(0, self.replication_factor - 1)]
+        # Los learners reciben siempre el log: no cuentan para el factor de replicación
+        targets = ordered[: max(0, self.replication_factor - 1)] + self.learners
+        # El destino de una transferencia debe recibir el log aunque quede fuera del factor
+        if self._transfer_target and self._transfer_target not in targets:
+            targets.append(self._transfer_target)
+        return targets
 
     def _priority_of_url(self, url: str) -> int:
         """Deriva prioridad solo desde el puerto del URL; fallback a dígitos si no hay puerto."""
@@ -197,44 +596,160 @@ class RaftNode:
     async def _maybe_preempt_as_highest(self):
         """Si somos el de mayor prioridad conocido, arranca elección para liderar."""
         await asyncio.sleep(0)  # cede control para permitir setup de loops
-        if not self.is_leader() and self._is_highest_priority():
+        if not self.is_leader() and not self.is_learner and self._is_highest_priority():
             now = time.time()
             if now - self._last_preempt_attempt > (self.election_timeout / 2):
                 self._last_preempt_attempt = now
                 await self._start_bully_election()
 
     async def _maybe_challenge_lower_priority_leader(self, leader_id: str):
-        """Si el líder visto tiene menor prioridad que nosotros, forzamos elección."""
-        if not leader_id:
+        """Si el líder visto tiene menor prioridad, le pedimos que nos transfiera el liderazgo.
+
+        La transferencia es cooperativa: el líder nos pone al día antes de cedernos
+        el puesto, en vez de deponerlo con una elección.
+        """
+        if not leader_id or self.is_learner:
             return
         leader_prio = self._priority_of_url(leader_id)
         if self.priority > leader_prio:
             now = time.time()
+            if now < self._preempt_hold_until:
+                return
             if now - self._last_preempt_attempt > (self.election_timeout / 2):
                 self._last_preempt_attempt = now
-                await self._start_bully_election()
-
-    def _set_peers(self, peers: List[str], persist: bool = True):
-        """Actualiza peers en memoria (y opcionalmente persiste)."""
-        filtered = [p for p in peers if p and p != self.self_url]
-        self.peers = filtered
+                logger.info(f"🤝 {self.node_id} pide a {leader_id} que le transfiera el liderazgo")
+                try:
+                    await self._peer_rpc(leader_id, MSG_TRANSFER_LEADERSHIP, "/raft/transfer_leadership",
+                                         {"target": self.self_url}, timeout=self.replication_timeout + 1)
+                except Exception as e:
+                    logger.warning(f"No pude pedir la transferencia a {leader_id}: {e}")
+
+    def _set_peers(self, peers: List[str], persist: bool = True, learners: Optional[List[str]] = None):
+        """Actualiza peers en memoria (y opcionalmente persiste).
+
+        `peers` son todos los miembros. `learners`, si viene (lo manda el líder), es la
+        lista exacta de miembros sin voto; si no, los miembros que no conocíamos entran
+        como learners, salvo al formar el cluster.
+        """
+        members = [p for p in peers if p and p != self.self_url]
+        if learners is None:
+            known = set(self.peers) | set(self.learners)
+            learners = [p for p in members if p in self.learners or (known and p not in known)]
+        else:
+            self.is_learner = self.read_replica or self.self_url in learners
+        self.learners = [p for p in members if p in learners]
+        self.peers = [p for p in members if p not in learners]
         # Mantener salud previa si existe
-        self.peer_health = {p: self.peer_health.get(p, 0.0) for p in self.peers}
+        self.peer_health = {p: self.peer_health.get(p, 0.0) for p in members}
         # Ajustar factor de replicación sin exceder cluster
         self.replication_factor = max(1, min(len(self.peers) + 1, self.replication_factor or len(self.peers) + 1))
-        # Reconfigurar estructuras de líder
+        # Reconfigurar estructuras de líder: los peers que siguen conservan su progreso
         if self.is_leader():
-            self.next_index = {p: len(self.log) + 1 for p in self.peers}
-            self.match_index = {p: 0 for p in self.peers}
+            last = self._last_log_index()
+            self.next_index = {p: self.next_index.get(p, last + 1) for p in members}
+            self.match_index = {p: self.match_index.get(p, 0) for p in members}
+            self._match_sorted = sorted(self.match_index[p] for p in self.peers)
+            self._pipelines = {p: self._pipelines.get(p) or PeerPipeline(self.next_index[p]) for p in members}
         if persist:
             self.save_state()
 
-    async def update_peers(self, peers: List[str], replication_factor: Optional[int] = None):
-        """Actualiza peers de forma dinámica con lock."""
+    async def update_peers(self, peers: List[str], replication_factor: Optional[int] = None) -> bool:
+        """Actualiza peers de forma dinámica con lock.
+
+        Una vez que la membresía está en el log, solo el líder la cambia (proponiendo
+        entradas de configuración); el resto la recibe por replicación. Devuelve False
+        si la ignoramos por no ser líder (hay que pedírsela a leader_id).
+        """
         async with self._lock:
             if replication_factor:
                 self.replication_factor = max(1, replication_factor)
-            self._set_peers(peers, persist=True)
+            if not self._config_index and not self.is_leader():
+                self._set_peers(peers, persist=True)
+                await self._reset_transport()
+                return True
+        if not self.is_leader():
+            return False
+        if self._reconfig_task is not None:
+            self._reconfig_task.cancel()
+        self._reconfig_task = asyncio.create_task(self.reconfigure(peers))
+        return True
+
+    async def _reset_transport(self):
+        if self.group_host is None:  # el transporte compartido lo gestiona el host
+            await self.http.reset(self.peers + self.learners)
+            if self.stream is not None:
+                await self.stream.reset(self.peers + self.learners)
+
+    # ====================================================
+    # Membresía en el log (cambios de un servidor a la vez)
+    # ====================================================
+
+    def _current_config(self) -> dict:
+        """Configuración vigente vista por el líder (los votantes lo incluyen)."""
+        return {"voters": [self.self_url] + self.peers, "learners": list(self.learners)}
+
+    def _adopt_config(self, index: int, config: Optional[dict]):
+        """Adopta la configuración de la entrada `index` (vale desde que está en el log)."""
+        self._config_index = index
+        if config is None:
+            return
+        replicate_all = self.replication_factor >= len(self.peers) + 1
+        voters, learners = config["voters"], config["learners"]
+        self._set_peers(voters + learners, persist=False, learners=learners)
+        # Fuera de los votantes (learner o quitado del shard) no se vota ni se compite
+        self.is_learner = self.read_replica or self.self_url not in voters
+        if replicate_all:
+            self.replication_factor = len(self.peers) + 1
+        self.save_state()
+        if self.is_leader():
+            self._start_replicators()
+        asyncio.get_running_loop().create_task(self._reset_transport())
+        logger.info(f"🧭 Configuración {index}: votantes {voters}, learners {learners}")
+
+    async def _append_config(self, voters: List[str], learners: List[str]) -> bool:
+        """Propone una configuración (líder) tras comprometerse la anterior."""
+        if self._config_index > self.commit_index:
+            if self._term_at(self._config_index) < self.current_term:
+                # Heredada de otro líder: se compromete re-proponiéndola en nuestro término
+                current = self._current_config()
+                if await self.propose(config_command(current["voters"], current["learners"])) is None:
+                    return False
+            elif not await self.wait_committed(self._config_index, self.replication_timeout):
+                return False
+        return await self.propose(config_command(voters, learners)) is not None
+
+    async def reconfigure(self, members: List[str]) -> bool:
+        """Lleva la membresía hacia `members` (líder), un cambio de votante por entrada.
+
+        Los nuevos entran como learners y votan cuando se ponen al día; un votante
+        sobrante sale recién cuando los learners nuevos ya votan (o tras
+        LEARNER_CATCHUP_TIMEOUT), así reemplazar un nodo no reduce la tolerancia a fallos.
+        """
+        target = list(dict.fromkeys([m for m in members if m] + [self.self_url]))
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + LEARNER_CATCHUP_TIMEOUT
+        while self.is_leader():
+            async with self._reconfig_lock:
+                config = self._current_config()
+                step = next_config_step(config["voters"], config["learners"], target)
+                if step is None:
+                    return True
+                catching_up = [p for p in self.learners if p in target and p not in self._read_replicas]
+                if len(step[0]) == len(config["voters"]) or not catching_up or loop.time() > deadline:
+                    if not await self._append_config(*step):
+                        return False
+                    continue
+            await asyncio.sleep(0.5)
+        return False
+
+    async def _promote_learner(self, peer: str):
+        """Un learner al día pasa a votar (solo líder)."""
+        async with self._reconfig_lock:
+            if not self.is_leader() or peer not in self.learners:
+                return
+            config = self._current_config()
+            if await self._append_config(config["voters"] + [peer], [p for p in config["learners"] if p != peer]):
+                logger.info(f"🎓 {peer} se puso al día y pasa a votar")
 
     def _quorum_size(self) -> int:
         """Quórum dinámico basado en peers activos.
@@ -257,10 +772,18 @@ class RaftNode:
     async def start(self):
         """Inicia las tareas del nodo RAFT"""
         logger.info(f"🚀 Iniciando nodo {self.node_id} como {self.role}")
+        if self.profiler is not None:
+            self.profiler.start()
+        if self.stream_port_offset and self.group_host is None:
+            await self._serve_stream()
         asyncio.create_task(self._election_loop())
-        asyncio.create_task(self._heartbeat_loop())
-        asyncio.create_task(self._apply_committed_entries())
+        asyncio.create_task(self._apply_loop())
+        self._kick_apply()  # entradas comprometidas pendientes desde el último arranque
         asyncio.create_task(self._consistency_loop())
+        if self.snapshot_callback:
+            asyncio.create_task(self._snapshot_loop())
+        if self.durability == "group":
+            asyncio.create_task(self._sync_loop())
         # Si somos el de mayor prioridad conocido, forzamos elección al arrancar para liderar.
         asyncio.create_task(self._maybe_preempt_as_highest())
 
@@ -269,20 +792,13 @@ class RaftNode:
         while True:
             await asyncio.sleep(0.1)
             
-            if self.role == RaftRole.LEADER:
+            if self.role == RaftRole.LEADER or self.is_learner:
                 continue
 
             # Verificar timeout de elección
             if time.time() - self.last_heartbeat_time > self.election_timeout:
                 await self._start_bully_election()
 
-    async def _heartbeat_loop(self):
-        """Loop para enviar heartbeats (solo líderes)"""
-        while True:
-            await asyncio.sleep(self.heartbeat_interval)
-            if self.role == RaftRole.LEADER:
-                await self._broadcast_heartbeat()
-
     async def _consistency_loop(self):
         """Verifica salud de peers y cura réplicas rezagadas."""
         while True:
@@ -295,11 +811,285 @@ class RaftNode:
                 # Además, si el peer tiene entradas que nosotros no, intente reconciliarlas
                 await self._reconcile_from_peer(peer)
 
-    async def _apply_committed_entries(self):
-        """Aplica las entradas comprometidas a la máquina de estado"""
+    async def _sync_loop(self):
+        """Durabilidad "group": fsync de lo pendiente aunque no lleguen más escrituras."""
         while True:
-            await asyncio.sleep(0.2)
-            await self._drain_committed_entries()
+            await asyncio.sleep(self.log_store.sync_interval)
+            try:
+                await self._sync_log()
+            except Exception:
+                pass  # ya registrado en _fsync_log
+
+    async def _snapshot_loop(self):
+        """Toma snapshots periódicos cuando el log aplicado supera el umbral."""
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            if self.last_applied - self.snapshot_index >= self.snapshot_threshold:
+                await self.take_snapshot()
+
+    def _kick_apply(self):
+        """Avisa al worker de aplicación de que commit_index avanzó."""
+        self._apply_queue.put_nowait(self.commit_index)
+
+    async def _apply_loop(self):
+        """Aplica en lotes las entradas comprometidas a medida que llegan avisos de commit."""
+        while True:
+            await self._apply_queue.get()
+            # Varios avisos acumulados se atienden con una sola pasada
+            while not self._apply_queue.empty():
+                self._apply_queue.get_nowait()
+            try:
+                while await self._apply_next_batch():
+                    pass
+            except Exception as e:
+                logger.error(f"Error en el worker de aplicación: {e}")
+
+    async def _apply_next_batch(self) -> bool:
+        """Aplica hasta `max_apply_batch` entradas; False si no había nada pendiente."""
+        async with self._apply_lock:
+            upto = min(self.commit_index, self._last_log_index(), self.last_applied + self.max_apply_batch)
+            entries = self.log_range(self.last_applied + 1, upto)
+            if not entries or entries[0].index != self.last_applied + 1:
+                return False
+            self._m_apply_entries.observe(len(entries))
+            async with timed(self._m_apply, self.profiler, "apply"):
+                await self._apply_entries(entries)
+        self._notify_applied()
+        return True
+
+    async def _apply_entries(self, entries: List[LogEntry]):
+        """Aplica un tramo contiguo de entradas comprometidas (con _apply_lock tomado)."""
+        configs = [e for e in entries if is_config_command(e.command)]
+        if configs:
+            # Las configuraciones no llegan a la aplicación; solo quedan comprometidas
+            self._committed_config = (configs[-1].index, parse_config_command(configs[-1].command))
+        app_entries = [e for e in entries if e.command != NOOP_COMMAND and not is_config_command(e.command)]
+        if self.apply_batch_callback:
+            try:
+                if app_entries:
+                    await self.apply_batch_callback(app_entries)
+            except Exception as e:
+                logger.error(f"Error aplicando lote {entries[0].index}-{entries[-1].index}: {e}")
+        else:
+            for entry in app_entries:
+                await self.apply_to_state_machine(entry)
+        self.last_applied = entries[-1].index
+        if configs:
+            self.save_state()
+        else:
+            self.save_progress()
+
+    def _notify_applied(self):
+        self._applied_event.set()
+        self._applied_event = asyncio.Event()
+
+    async def wait_applied(self, index: int, timeout: Optional[float] = None) -> bool:
+        """Espera (sin sondeo) a que last_applied alcance `index`."""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while self.last_applied < index:
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._applied_event.wait(), remaining)
+            except asyncio.TimeoutError:
+                return self.last_applied >= index
+        return True
+
+    # ====================================================
+    # Métricas
+    # ====================================================
+
+    def _init_metrics(self):
+        """Registra contadores, histogramas (por peer y tipo de RPC) y gauges del nodo."""
+        m = self.metrics = Metrics(node=self.node_id)
+        self._m_rpc_client = m.histogram("raft_rpc_client_seconds", "Latencia de RPC salientes", ("peer", "rpc"))
+        self._m_rpc_errors = m.counter("raft_rpc_client_errors_total", "RPC salientes fallidos", ("peer", "rpc"))
+        self._m_rpc_server = m.histogram("raft_rpc_server_seconds", "Tiempo atendiendo RPC del stream", ("rpc",))
+        self._m_append_rtt = m.histogram("raft_append_entries_rtt_seconds", "RTT de AppendEntries", ("peer",))
+        self._m_append_result = m.counter("raft_append_entries_total", "AppendEntries enviados por resultado",
+                                          ("peer", "result"))
+        self._m_append_entries = m.histogram("raft_append_entries_entries", "Entradas por AppendEntries",
+                                             ("peer",), COUNT_BOUNDS)
+        self._m_append_bytes = m.histogram("raft_append_entries_bytes", "Bytes de comandos por AppendEntries",
+                                           ("peer",), SIZE_BOUNDS)
+        self._m_append_log = m.histogram("raft_append_log_seconds", "Persistir entradas en el log del líder")
+        self._m_fsync = m.histogram("raft_log_fsync_seconds", "Duración de cada fsync del log")
+        self._m_replicate = m.histogram("raft_replicate_seconds", "Espera de mayoría en replicate_log")
+        self._m_commit = m.histogram("raft_commit_batch_seconds", "Lote de propuestas: de persistir a comprometido",
+                                     ("result",))
+        self._m_batch_entries = m.histogram("raft_commit_batch_entries", "Propuestas por lote", (), COUNT_BOUNDS)
+        self._m_proposals_rejected = m.counter("raft_proposals_rejected_total", "Propuestas rechazadas (429/503)",
+                                               ("reason",))
+        self._m_apply = m.histogram("raft_apply_batch_seconds", "Aplicar un lote a la máquina de estado")
+        self._m_apply_entries = m.histogram("raft_apply_batch_entries", "Entradas por lote aplicado", (),
+                                            COUNT_BOUNDS)
+        self._m_snapshot = m.histogram("raft_snapshot_seconds", "Tomar un snapshot de la máquina de estado")
+        self._m_elections = m.counter("raft_elections_total", "Candidaturas iniciadas")
+        self._m_pre_vote_rejected = m.counter("raft_pre_vote_rejected_total", "Pre-votes rechazados")
+        self._m_leader_changes = m.counter("raft_leader_changes_total", "Líderes nuevos reconocidos")
+        self._m_lock_wait = m.histogram("raft_lock_wait_seconds", "Espera del lock del nodo", ("priority",))
+        self._m_lock_hold = m.histogram("raft_lock_hold_seconds", "Tenencia del lock del nodo", ("priority",))
+        self._lock.observer = self._observe_lock
+
+        m.collect("raft_term", "Término actual", lambda: self.current_term)
+        m.collect("raft_is_leader", "1 si el nodo es líder", lambda: int(self.is_leader()))
+        m.collect("raft_is_learner", "1 si el nodo es learner", lambda: int(self.is_learner))
+        m.collect("raft_commit_index", "Índice comprometido", lambda: self.commit_index)
+        m.collect("raft_last_applied", "Último índice aplicado", lambda: self.last_applied)
+        m.collect("raft_last_log_index", "Último índice del log", lambda: self._last_log_index())
+        m.collect("raft_snapshot_index", "Índice del último snapshot", lambda: self.snapshot_index)
+        m.collect("raft_commit_lag", "Entradas en el log sin comprometer",
+                  lambda: self._last_log_index() - self.commit_index)
+        m.collect("raft_apply_lag", "Entradas comprometidas sin aplicar",
+                  lambda: self.commit_index - self.last_applied)
+        m.collect("raft_peer_replication_lag", "Entradas del líder que faltan en cada peer",
+                  lambda: [((peer,), self._last_log_index() - self.match_index.get(peer, 0))
+                           for peer in self._target_peers()] if self.is_leader() else [], ("peer",))
+        m.collect("raft_peer_inflight", "AppendEntries en vuelo por peer",
+                  lambda: [((peer,), len(pipe.in_flight)) for peer, pipe in self._pipelines.items()],
+                  ("peer",))
+        m.collect("raft_pending_proposals", "Propuestas en cola", lambda: len(self._proposals))
+        m.collect("raft_lock_waiters", "Tareas esperando el lock",
+                  lambda: [((name,), self._lock.waiting(p)) for p, name in LOCK_PRIORITY_NAMES.items()],
+                  ("priority",))
+
+    def _observe_lock(self, priority: int, waited: float, held: float):
+        name = LOCK_PRIORITY_NAMES.get(priority, str(priority))
+        self._m_lock_wait.labels(name).observe(waited)
+        self._m_lock_hold.labels(name).observe(held)
+
+    def _set_leader(self, leader_id: Optional[str]):
+        if leader_id and leader_id != self.leader_id:
+            self._m_leader_changes.inc()
+        self.leader_id = leader_id
+
+    # ====================================================
+    # Transporte entre peers
+    # ====================================================
+
+    async def _serve_stream(self):
+        """Abre el servidor del stream entre peers en el puerto HTTP + offset."""
+        port = urlparse(self.self_url).port
+        if not port:
+            logger.warning(f"Sin puerto en {self.self_url}: los peers usarán HTTP")
+            return
+        try:
+            self._stream_server = await serve_peer_stream(
+                "0.0.0.0", port + self.stream_port_offset,
+                lambda kind, group, body: self._handle_stream_message(kind, body))
+        except OSError as e:
+            logger.warning(f"No pude abrir el stream en {port + self.stream_port_offset}: {e}")
+            return
+        logger.info(f"🔌 Stream RAFT escuchando en el puerto {port + self.stream_port_offset}")
+
+    async def _handle_stream_message(self, kind: int, body: bytes) -> bytes:
+        """Despacha un mensaje recibido por el stream midiendo el tiempo de atención."""
+        with timed(self._m_rpc_server.labels(MESSAGE_NAMES.get(kind, str(kind)))):
+            return await self._dispatch_stream_message(kind, body)
+
+    async def _dispatch_stream_message(self, kind: int, body: bytes) -> bytes:
+        """Despacha un mensaje recibido por el stream al handler RAFT correspondiente."""
+        if kind == MSG_APPEND_ENTRIES:
+            data = decode_append_entries(body)
+            result = await self.receive_append_entries(
+                data["term"], data["leader_id"], data["entries"],
+                data["prev_log_index"], data["prev_log_term"], data["leader_commit"])
+            return json.dumps(result).encode()
+        data = json.loads(body) if body else {}
+        if kind == MSG_REQUEST_VOTE:
+            result = await self.handle_vote_request(
+                data["term"], data["candidate_id"],
+                data.get("last_log_index", 0), data.get("last_log_term", 0))
+        elif kind == MSG_BULLY_CHALLENGE:
+            result = await self.handle_bully_challenge(
+                data.get("candidate_id"), data.get("candidate_url"), data.get("priority", 0))
+        elif kind == MSG_BULLY_VICTORY:
+            result = await self.handle_bully_victory(
+                data.get("leader_id"), data.get("leader_url"), data.get("priority", 0), data.get("term", 0))
+        elif kind == MSG_PRE_VOTE:
+            result = await self.handle_pre_vote(data.get("candidate_id"), data.get("term", 0),
+                                                data.get("last_log_index", 0), data.get("last_log_term", 0))
+        elif kind == MSG_TIMEOUT_NOW:
+            result = await self.handle_timeout_now(data.get("term", 0), data.get("leader_id"))
+        elif kind == MSG_TRANSFER_LEADERSHIP:
+            result = await self.handle_transfer_leadership(data.get("target"))
+        elif kind == MSG_READ_INDEX:
+            if not self.is_leader():
+                result = {"error": "No soy líder", "leader": self.leader_id}
+            else:
+                result = {"read_index": await self.read_index()}
+        else:
+            raise ValueError(f"Mensaje de stream desconocido: {kind}")
+        return json.dumps(result).encode()
+
+    async def _peer_rpc(self, peer: str, kind: int, path: str, payload: Optional[dict] = None,
+                        timeout: float = 3.0, method: str = "post") -> Optional[dict]:
+        """RPC JSON a un peer: por el stream si está disponible, si no por HTTP.
+
+        Devuelve None si el peer respondió por HTTP con un estado distinto de 200.
+        """
+        rpc = MESSAGE_NAMES.get(kind, str(kind))
+        try:
+            with timed(self._m_rpc_client.labels(peer, rpc)):
+                return await self._peer_rpc_call(peer, kind, path, payload, timeout, method)
+        except Exception:
+            self._m_rpc_errors.labels(peer, rpc).inc()
+            raise
+
+    async def _peer_rpc_call(self, peer: str, kind: int, path: str, payload: Optional[dict],
+                             timeout: float, method: str) -> Optional[dict]:
+        if self.stream is not None:
+            try:
+                body = json.dumps(payload).encode() if payload is not None else b""
+                return json.loads(await self.stream.call(peer, kind, body, timeout))
+            except StreamUnavailable:
+                pass
+        if method == "get":
+            request = self.http.get(peer, path, timeout=timeout)
+        else:
+            request = self.http.post(peer, path, json=payload, timeout=timeout)
+        async with request as resp:
+            if resp.status != 200:
+                return None
+            return await resp.json()
+
+    async def _fan_out(self, peers: List[str], call, timeout: float, until=None) -> Dict[str, Any]:
+        """Lanza `call(peer)` a todos los peers a la vez, con un plazo global.
+
+        Devuelve {peer: resultado} de los que respondieron. Los que fallan o no
+        llegan a tiempo quedan como no sanos. Si `until(resultado)` es verdadero
+        se deja de esperar al resto.
+        """
+        tasks = {asyncio.create_task(call(peer)): peer for peer in peers}
+        pending = set(tasks)
+        results: Dict[str, Any] = {}
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        try:
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    for task in pending:
+                        self.peer_health[tasks[task]] = 0.0
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    peer = tasks[task]
+                    if task.exception() is not None:
+                        logger.warning(f"RPC a {peer} falló: {task.exception()}")
+                        self.peer_health[peer] = 0.0
+                        continue
+                    results[peer] = task.result()
+                    self.peer_health[peer] = time.time()
+                    if until is not None and until(results[peer]):
+                        return results
+        finally:
+            for task in pending:
+                task.cancel()
+        return results
 
     # ====================================================
     # Elecciones de líder
@@ -309,14 +1099,12 @@ class RaftNode:
         """Compat: elección RAFT, ya no usada (Bully)."""
         return
 
-    async def _start_bully_election(self):
-        """Elección de líder usando Bully."""
-        async with self._lock:
-            self.role = RaftRole.CANDIDATE
-            self.leader_id = None
-            self.current_term += 1
+    async def _start_bully_election(self, pre_vote: bool = True):
+        """Elección de líder usando Bully, precedida por un pre-vote."""
+        if pre_vote and not await self._pre_vote():
             self.reset_election_timer()
-            self.save_state()
+            return
+        await self._begin_candidacy()
 
         higher_peers = self._higher_priority_peers()
         if not higher_peers:
@@ -325,35 +1113,76 @@ class RaftNode:
             return
 
         logger.info(f"🗳️ {self.node_id} inicia Bully contra {len(higher_peers)} peers mayores")
-        any_alive = False
-        for peer in higher_peers:
+        payload = {"candidate_id": self.node_id, "candidate_url": self.self_url, "priority": self.priority}
+        victory = self._victory_event
+        # Challenges en paralelo: basta la primera respuesta de un peer mayor vivo
+        replies = await self._fan_out(
+            higher_peers,
+            lambda peer: self._peer_rpc(peer, MSG_BULLY_CHALLENGE, "/raft/bully/challenge", payload,
+                                        timeout=self.election_timeout_range[0] / 2),
+            timeout=self.election_timeout_range[0] / 2,
+            until=lambda data: bool(data and data.get("alive")))
+        alive = [peer for peer, data in replies.items() if data and data.get("alive")]
+
+        if alive:
+            logger.info(f"⚔️ {self.node_id} encontró peer mayor vivo: {alive[0]}")
+            # Esperamos un anuncio de victoria; si no llega, nos coronamos
             try:
-                async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=3)) as session:
-                    payload = {"candidate_id": self.node_id, "candidate_url": self.self_url, "priority": self.priority}
-                    async with session.post(f"{peer}/raft/bully/challenge", json=payload) as resp:
-                        if resp.status == 200:
-                            data = await resp.json()
-                            if data.get("alive"):
-                                any_alive = True
-                                self.peer_health[peer] = time.time()
-                                logger.info(f"⚔️ {self.node_id} encontró peer mayor vivo: {peer}")
-            except Exception as e:
-                logger.warning(f"Challenge a {peer} falló: {e}")
-                self.peer_health[peer] = 0.0
-
-        if any_alive:
-            # Esperamos un anuncio de victoria; si no llega, volvemos a intentar
-            await asyncio.sleep(self.election_timeout)
+                await asyncio.wait_for(victory.wait(), self.election_timeout)
+            except asyncio.TimeoutError:
+                pass
             if self.leader_id:
                 logger.info(f"🙌 {self.node_id} reconoce líder {self.leader_id}")
                 return
-            # Nadie se proclamó, nos coronamos
+        await self._become_leader_bully()
+
+    async def _begin_candidacy(self):
+        self._m_elections.inc()
+        async with self._lock.hold(PRIORITY_CONSENSUS):
+            self.role = RaftRole.CANDIDATE
+            self.leader_id = None
+            self.current_term += 1
+            self.reset_election_timer()
+            self.save_state()
+
+    async def _pre_vote(self) -> bool:
+        """Ronda previa que no toca el término: ¿aceptarían los peers una elección?
+
+        Un peer la rechaza si oyó a un líder vivo hace menos que el timeout mínimo
+        de elección, así un seguidor con pausas no depone a un líder sano, o si
+        nuestro log está atrasado respecto del suyo (no le daría el voto). Hace falta
+        la mayoría de los que responden; sin respuestas (nodo aislado) seguimos,
+        igual que el quórum dinámico.
+        """
+        payload = {"candidate_id": self.node_id, "candidate_url": self.self_url, "term": self.current_term + 1,
+                   "last_log_index": self._last_log_index(), "last_log_term": self._last_log_term()}
+        timeout = self.election_timeout_range[0] / 2
+        replies = await self._fan_out(
+            self.peers,
+            lambda peer: self._peer_rpc(peer, MSG_PRE_VOTE, "/raft/pre_vote", payload, timeout=timeout),
+            timeout=timeout)
+        granted = responded = 1
+        for reply in replies.values():
+            if reply is None:
+                continue
+            responded += 1
+            granted += 1 if reply.get("granted") else 0
+        if granted < responded // 2 + 1:
+            self._m_pre_vote_rejected.inc()
+            logger.info(f"🛑 Pre-vote de {self.node_id} rechazado ({granted}/{responded}): "
+                        f"hay líder vivo o nuestro log está atrasado")
+            return False
+        return True
+
+    async def _take_leadership(self):
+        """Elección inmediata tras un TimeoutNow: sin pre-vote ni challenges."""
+        await self._begin_candidacy()
         await self._become_leader_bully()
 
     async def _become_leader_bully(self):
-        async with self._lock:
+        async with self._lock.hold(PRIORITY_CONSENSUS):
             self.role = RaftRole.LEADER
-            self.leader_id = self.self_url or self.node_id
+            self._set_leader(self.self_url or self.node_id)
             self._init_leader_state()
             self.reset_election_timer()
             self.save_state()
@@ -361,25 +1190,33 @@ class RaftNode:
         # Antes de aceptar clientes, intenta recuperar el log más avanzado de los peers
         await self._recover_from_peers()
         self._init_leader_state()  # re-inicializa índices tras posible cambio de log
+        self._start_replicators()
         await self._announce_victory()
         await self._broadcast_heartbeat()
+        self._noop_task = asyncio.create_task(self._propose_noop())
+
+    async def _propose_noop(self) -> Optional[LogEntry]:
+        """Propone la no-op del término actual; None si no se pudo (se reintenta al leer)."""
+        try:
+            return await self.propose(NOOP_COMMAND)
+        except Exception as e:
+            logger.warning(f"No se pudo comprometer la no-op del término {self.current_term}: {e}")
+            return None
 
     async def _request_vote(self, peer: str) -> bool:
         """Solicita voto a un peer específico"""
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=2)) as session:
-                data = {
-                    "term": self.current_term,
-                    "candidate_id": self.node_id,
-                    "last_log_index": len(self.log),
-                    "last_log_term": self.log[-1].term if self.log else 0
-                }
-                async with session.post(f"{peer}/raft/request_vote", json=data) as resp:
-                    result = await resp.json()
-                    self.peer_health[peer] = time.time()
-                    if result.get("vote_granted", False):
-                        self.votes_received.add(peer)
-                        return True
+            data = {
+                "term": self.current_term,
+                "candidate_id": self.node_id,
+                "last_log_index": self._last_log_index(),
+                "last_log_term": self._last_log_term()
+            }
+            result = await self._peer_rpc(peer, MSG_REQUEST_VOTE, "/raft/request_vote", data, timeout=2) or {}
+            self.peer_health[peer] = time.time()
+            if result.get("vote_granted", False):
+                self.votes_received.add(peer)
+                return True
         except Exception as e:
             logger.warning(f"Error solicitando voto a {peer}: {e}")
             if peer in self.peer_health:
@@ -391,213 +1228,646 @@ class RaftNode:
     # ====================================================
 
     async def _broadcast_heartbeat(self):
-        """Envía heartbeats a todos los seguidores"""
+        """Pide a cada tarea de replicación un AppendEntries inmediato (elección, ReadIndex)"""
         if not self.is_leader():
             return
-
-        peers = self._target_peers()
-        tasks = [asyncio.create_task(self._send_append_entries(peer)) for peer in peers]
-        await asyncio.gather(*tasks, return_exceptions=True)
+        for peer in self._target_peers():
+            pipe = self._pipelines.get(peer)
+            if pipe:
+                pipe.heartbeat_due = True
+                pipe.event.set()
 
     async def _announce_victory(self):
-        """Difunde que somos líder (Bully)."""
-        for peer in self.peers:
+        """Difunde que somos líder (Bully) a todos los peers a la vez."""
+        payload = {"leader_id": self.node_id, "leader_url": self.self_url,
+                   "priority": self.priority, "term": self.current_term}
+        await self._fan_out(
+            self.peers,
+            lambda peer: self._peer_rpc(peer, MSG_BULLY_VICTORY, "/raft/bully/victory", payload,
+                                        timeout=self.election_timeout_range[0] / 2),
+            timeout=self.election_timeout_range[0] / 2)
+
+    def _heartbeat_interval_for(self, pipe: PeerPipeline) -> float:
+        """Intervalo de heartbeat para un peer según su RTT medido."""
+        budget = self.election_timeout_range[0] / 2 - 2 * pipe.rtt
+        return max(self.min_heartbeat_interval, min(self.heartbeat_interval, budget))
+
+    def _heartbeat_wait(self, peer: str, pipe: PeerPipeline) -> float:
+        """Segundos hasta que el peer necesite un heartbeat (<= 0 si ya toca).
+
+        Cualquier AppendEntries confirmado cuenta como heartbeat; sin confirmación,
+        un heartbeat vacío en vuelo tampoco se repite antes del intervalo.
+        """
+        last = max(self._peer_ack_sent.get(peer, 0.0), pipe.last_heartbeat)
+        return self._heartbeat_interval_for(pipe) - (time.time() - last)
+
+    def _build_append_entries(self, next_idx: int) -> dict:
+        """Arma un AppendEntries desde `next_idx`, acotado en entradas y bytes.
+
+        Las entradas quedan como LogEntry: se serializan al enviar según el formato del peer.
+        """
+        prev_log_index = next_idx - 1
+        entries = self.log_range(next_idx, next_idx + self.max_append_entries - 1,
+                                 max_bytes=self.max_append_bytes)
+        return {
+            "term": self.current_term,
+            "leader_id": self.self_url or self.node_id,
+            "prev_log_index": prev_log_index,
+            "prev_log_term": self._term_at(prev_log_index),
+            "entries": entries,
+            "leader_commit": self.commit_index
+        }
+
+    def _handle_append_response(self, peer: str, data: dict, result: dict) -> bool:
+        """Actualiza next/match_index según la respuesta; True si fue aceptada."""
+        self.peer_health[peer] = time.time()
+        prev_log_index = data["prev_log_index"]
+        if result.get("success", False):
+            match = prev_log_index + len(data["entries"])
+            self._advance_match_index(peer, match)
+            self.next_index[peer] = max(self.next_index.get(peer, 1), match + 1)
+            if "last_log_index" in result:
+                self._peer_last_index[peer] = result["last_log_index"]
+            if result.get("read_replica"):
+                self._read_replicas.add(peer)
+            elif peer in self.learners and self.match_index[peer] >= self.commit_index \
+                    and not self._reconfig_lock.locked():
+                asyncio.create_task(self._promote_learner(peer))
+            return True
+        # Rechazo: usar la pista de conflicto para saltar un término completo
+        conflict_term = result.get("conflict_term")
+        conflict_index = result.get("conflict_index")
+        next_idx = prev_log_index
+        if conflict_term:
+            last_same_term = self._last_index_of_term(conflict_term, prev_log_index)
+            next_idx = last_same_term + 1 if last_same_term else (conflict_index or prev_log_index)
+        elif conflict_index:
+            next_idx = conflict_index
+        self.next_index[peer] = max(1, min(next_idx, prev_log_index))
+        return False
+
+    def _last_index_of_term(self, term: int, upto: int) -> int:
+        """Último índice <= `upto` cuyo término es `term` (0 si no hay)."""
+        index = min(upto, self._last_log_index())
+        while index > self.snapshot_index:
+            entry_term = self._term_at(index)
+            if entry_term == term:
+                return index
+            if entry_term < term:
+                break
+            index -= 1
+        if index == self.snapshot_index and self.snapshot_term == term:
+            return index
+        return 0
+
+    # ====================================================
+    # Replicación en pipeline (una tarea por seguidor)
+    # ====================================================
+
+    def _start_replicators(self):
+        """Lanza las tareas de replicación que falten para los pipelines actuales."""
+        for peer, pipe in self._pipelines.items():
+            if pipe.task is None or pipe.task.done():
+                pipe.task = asyncio.create_task(self._replication_loop(peer, pipe, self.current_term))
+
+    def _wake_replicators(self):
+        for pipe in self._pipelines.values():
+            pipe.event.set()
+
+    async def _replication_loop(self, peer: str, pipe: PeerPipeline, term: int):
+        """Mantiene hasta `max_inflight` AppendEntries en vuelo hacia un seguidor.
+
+        `pipe.cursor` avanza al enviar, sin esperar la respuesta; las respuestas
+        pueden llegar desordenadas y solo suben match_index. Ante un rechazo o
+        error se rebobina el cursor a next_index y se descartan las respuestas
+        de la generación anterior.
+        """
+        while self.is_leader() and self.current_term == term and self._pipelines.get(peer) is pipe:
+            pipe.event.clear()
+            if pipe.cursor <= self.snapshot_index and not pipe.in_flight:
+                # Lo que necesita el peer ya está compactado: enviar snapshot
+                await self._send_snapshot(peer)
+                pipe.rewind(max(self.next_index.get(peer, 1), self.snapshot_index + 1))
+                continue
+            targeted = peer in self._target_peers()
+            wait = self._heartbeat_wait(peer, pipe)
+            timer_due = wait <= 0
+            if self.group_host is not None:
+                # Los heartbeats ociosos los envía el host en lote (collect_heartbeats)
+                timer_due = False
+                wait = max(wait, self._heartbeat_interval_for(pipe))
+            # Un commit_index nuevo viaja en el próximo AppendEntries; si en
+            # min_heartbeat_interval no salen más datos, va en un heartbeat vacío
+            commit_due = False
+            if not pipe.in_flight and pipe.sent_commit < self.commit_index:
+                commit_wait = self._commit_time + self.min_heartbeat_interval - time.time()
+                commit_due = commit_wait <= 0
+                wait = min(wait, commit_wait)
+            while (targeted and len(pipe.in_flight) < self.max_inflight
+                   and time.time() >= pipe.backoff_until
+                   and pipe.cursor > self.snapshot_index
+                   and (pipe.cursor <= self._last_log_index() or pipe.heartbeat_due
+                        or timer_due or commit_due)):
+                data = self._build_append_entries(pipe.cursor)
+                pipe.heartbeat_due = False
+                pipe.sent_commit = data["leader_commit"]
+                pipe.cursor += len(data["entries"])
+                task = asyncio.create_task(self._pipeline_send(peer, pipe, data, pipe.generation))
+                pipe.in_flight.add(task)
+                task.add_done_callback(pipe.finish)
+                if not data["entries"]:
+                    pipe.last_heartbeat = time.time()
+                    wait = self._heartbeat_interval_for(pipe)
+                    break
             try:
-                async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=3)) as session:
-                    payload = {"leader_id": self.node_id, "leader_url": self.self_url, "priority": self.priority}
-                    async with session.post(f"{peer}/raft/bully/victory", json=payload) as resp:
-                        if resp.status == 200:
-                            self.peer_health[peer] = time.time()
-            except Exception as e:
-                logger.warning(f"No pude anunciar victoria a {peer}: {e}")
-                self.peer_health[peer] = 0.0
+                await asyncio.wait_for(pipe.event.wait(), timeout=max(wait, self.min_heartbeat_interval))
+            except asyncio.TimeoutError:
+                pass
 
-    async def _send_append_entries(self, peer: str):
-        """Envía AppendEntries RPC a un seguidor"""
-        try:
-            next_idx = self.next_index.get(peer, 1)
-            prev_log_index = next_idx - 1
-            prev_log_term = 0
-            
-            if prev_log_index > 0 and prev_log_index <= len(self.log):
-                prev_log_term = self.log[prev_log_index - 1].term
-            
-            entries = []
-            if next_idx <= len(self.log):
-                entries = [entry.to_dict() for entry in self.log[next_idx - 1:]]
+    def collect_heartbeats(self, horizon: float) -> List[Tuple[str, dict, asyncio.Future]]:
+        """Heartbeats vacíos que vencen en menos de `horizon` segundos (Multi-RAFT).
 
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=3)) as session:
-                data = {
-                    "term": self.current_term,
-                    "leader_id": self.self_url or self.node_id,
-                    "prev_log_index": prev_log_index,
-                    "prev_log_term": prev_log_term,
-                    "entries": entries,
-                    "leader_commit": self.commit_index
-                }
-                async with session.post(f"{peer}/raft/append_entries", json=data) as resp:
-                    result = await resp.json()
-                    
-                    if result.get("success", False):
-                        # Actualizar índices de replicación
-                        self.next_index[peer] = len(self.log) + 1
-                        self.match_index[peer] = len(self.log)
-                        self.peer_health[peer] = time.time()
-
-                        # Verificar si podemos comprometer nuevas entradas
-                        await self._update_commit_index()
-                    else:
-                        # Retroceder next_index
-                        if self.next_index[peer] > 1:
-                            self.next_index[peer] -= 1
-                        # Respondió pero sin éxito: sigue estando vivo
-                        self.peer_health[peer] = time.time()
+        Los deja en vuelo en su pipeline y devuelve (peer, AppendEntries, future);
+        el host los envía en lote y entrega cada respuesta (o excepción) en su future.
+        """
+        if not self.is_leader():
+            return []
+        loop = asyncio.get_running_loop()
+        targets = self._target_peers()
+        batch = []
+        for peer, pipe in self._pipelines.items():
+            if (peer not in targets or pipe.in_flight or time.time() < pipe.backoff_until
+                    or pipe.cursor <= self.snapshot_index or pipe.cursor <= self._last_log_index()
+                    or self._heartbeat_wait(peer, pipe) > horizon):
+                continue
+            data = self._build_append_entries(pipe.cursor)
+            pipe.sent_commit = data["leader_commit"]
+            pipe.last_heartbeat = time.time()
+            reply = loop.create_future()
+            task = asyncio.create_task(self._pipeline_send(peer, pipe, data, pipe.generation, reply))
+            pipe.in_flight.add(task)
+            task.add_done_callback(pipe.finish)
+            batch.append((peer, data, reply))
+        return batch
+
+    async def _pipeline_send(self, peer: str, pipe: PeerPipeline, data: dict, generation: int,
+                             reply: Optional[Awaitable[Optional[dict]]] = None):
+        """Envía un AppendEntries del pipeline y procesa su respuesta.
+
+        Con `reply` el envío lo hace otro (el host de grupos) y aquí solo se espera.
+        """
+        sent_at = time.time()
+        try:
+            result = await (reply if reply is not None else self._send_append_entries(peer, data))
         except Exception as e:
+            self._m_append_result.labels(peer, "error").inc()
             logger.warning(f"Error enviando AppendEntries a {peer}: {e}")
             if peer in self.peer_health:
                 self.peer_health[peer] = 0.0
+            if generation == pipe.generation:
+                pipe.rewind(self.next_index.get(peer, 1))
+                pipe.backoff_until = time.time() + self.heartbeat_interval
+            # Con un peer menos vivo el quórum dinámico puede cambiar
+            await self._update_commit_index()
+            pipe.event.set()
+            return
+        if result is None:
+            # Cambió el formato del peer: reenviamos desde next_index
+            if generation == pipe.generation:
+                pipe.rewind(self.next_index.get(peer, 1))
+            pipe.event.set()
+            return
+        if result.get("overloaded"):
+            # El peer está vivo pero saturado: reenviamos más tarde sin tocar next_index
+            self._m_append_result.labels(peer, "overloaded").inc()
+            self.peer_health[peer] = time.time()
+            if generation == pipe.generation:
+                pipe.rewind(self.next_index.get(peer, 1))
+                pipe.backoff_until = time.time() + float(result.get("retry_after", self.heartbeat_interval))
+            pipe.event.set()
+            return
+        rtt = time.time() - sent_at
+        pipe.rtt = rtt if not pipe.rtt else 0.8 * pipe.rtt + 0.2 * rtt
+        self._m_append_rtt.labels(peer).observe(rtt)
+        if result.get("term", 0) <= self.current_term:
+            # Aceptada o no, el peer reconoce nuestro término en `sent_at`
+            self._note_ack(peer, sent_at)
+        accepted = self._handle_append_response(peer, data, result)
+        self._m_append_result.labels(peer, "ok" if accepted else "rejected").inc()
+        if accepted:
+            # Verificar si podemos comprometer nuevas entradas
+            await self._update_commit_index()
+        elif generation == pipe.generation:
+            pipe.rewind(self.next_index[peer])
+        pipe.event.set()
+
+    async def _send_append_entries(self, peer: str, data: dict) -> Optional[dict]:
+        """Envía un AppendEntries por el stream o por HTTP; None si hay que reenviarlo en JSON."""
+        entries = data["entries"]
+        if entries:
+            self._m_append_entries.labels(peer).observe(len(entries))
+            self._m_append_bytes.labels(peer).observe(sum(len(e.command) for e in entries))
+        if self.stream is not None:
+            try:
+                body = await self.stream.call(peer, MSG_APPEND_ENTRIES, encode_append_entries(data),
+                                              timeout=self.replication_timeout)
+                return json.loads(body)
+            except StreamUnavailable:
+                pass
+        wire = self._peer_wire.get(peer, self.wire_format)
+        if wire == "binary":
+            body = {"data": encode_append_entries(data), "headers": {"Content-Type": BINARY_CONTENT_TYPE}}
+        else:
+            body = {"json": append_entries_json(data)}
+        async with self.http.post(peer, "/raft/append_entries", timeout=self.replication_timeout, **body) as resp:
+            speaks_binary = resp.headers.get(WIRE_HEADER) == "binary"
+            if wire == "binary" and resp.status != 200 and not speaks_binary:
+                # Nodo viejo: rechaza el frame (500 de req.json(), 415, 422) sin anunciar el formato
+                logger.info(f"↩️ {peer} no acepta AppendEntries binario ({resp.status}), usando JSON")
+                self._peer_wire[peer] = "json"
+                return None
+            if wire == "json" and speaks_binary and self.wire_format == "binary":
+                # El peer se actualizó (o el rechazo fue de un proxy): volvemos al binario
+                logger.info(f"🔁 {peer} anuncia AppendEntries binario, dejando JSON")
+                self._peer_wire.pop(peer, None)
+            if resp.status != 200:
+                # Error del propio peer: se reintenta sin cambiar el formato
+                raise RuntimeError(f"AppendEntries respondió {resp.status}")
+            return await resp.json()
+
+    async def wait_committed(self, index: int, timeout: float) -> bool:
+        """Espera (sin sondeo) a que commit_index alcance `index` mientras seamos líder."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.commit_index < index:
+            remaining = deadline - loop.time()
+            if not self.is_leader() or remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._commit_event.wait(), remaining)
+            except asyncio.TimeoutError:
+                return self.commit_index >= index
+        return True
+
+    def _notify_commit(self):
+        self._commit_event.set()
+        self._commit_event = asyncio.Event()
+        self._kick_apply()
+
+    def _reset_match_index(self):
+        self.match_index = {p: 0 for p in self.peers + self.learners}
+        self._match_sorted = [0] * len(self.peers)
+
+    def _advance_match_index(self, peer: str, value: int):
+        """Sube match_index de un peer manteniendo la vista ordenada."""
+        old = self.match_index.get(peer, 0)
+        if value <= old:
+            return
+        self.match_index[peer] = value
+        if peer in self.peers:
+            del self._match_sorted[bisect.bisect_left(self._match_sorted, old)]
+            bisect.insort(self._match_sorted, value)
 
     async def _update_commit_index(self):
         """Actualiza el commit_index basado en las réplicas"""
         if not self.is_leader():
             return
 
-        # Encontrar el índice más alto que está replicado en la mayoría
-        for n in range(len(self.log), self.commit_index, -1):
-            count = 1  # El líder cuenta
-            for peer in self.peers:
-                if self.match_index.get(peer, 0) >= n:
-                    count += 1
-            
-            if count >= self._quorum_size():
-                if n > self.commit_index and self.log[n-1].term == self.current_term:
-                    self.commit_index = n
-                    self.save_state()
-                break
+        # El índice replicado en la mayoría es el (quórum-1)-ésimo mayor match_index
+        # de los peers (el líder cuenta como uno y siempre tiene todo su log)
+        needed = self._quorum_size() - 1
+        if needed > len(self._match_sorted):
+            return
+        n = self._last_log_index()
+        if needed > 0:
+            n = min(n, self._match_sorted[-needed])
+        if n > self.commit_index and self._term_at(n) == self.current_term:
+            self.commit_index = n
+            self._commit_time = time.time()
+            self.save_progress()
+            self._notify_commit()
+            # Los seguidores lo reciben en el próximo AppendEntries de su pipeline
+            self._wake_replicators()
 
     # ====================================================
     # API para aplicaciones
     # ====================================================
 
-    def append_log(self, command: str) -> LogEntry:
-        """Agrega una nueva entrada al log (solo líder)"""
+    async def append_log(self, command: str) -> LogEntry:
+        """Agrega una nueva entrada al log (solo líder); el fsync corre en el ejecutor de disco."""
         if not self.is_leader():
             raise Exception("Solo el líder puede agregar entradas al log")
         
-        entry = LogEntry(self.current_term, command, index=len(self.log) + 1)
-        self.log.append(entry)
-        self.save_state()
+        entry = LogEntry(self.current_term, command, index=self._last_log_index() + 1)
+        async with timed(self._m_append_log, self.profiler, "append_log"):
+            self._persist_entries([entry], sync=False)
+            await self._sync_log()
+        return entry
+
+    async def propose(self, command: str) -> Optional[LogEntry]:
+        """Propone un comando (solo líder) y espera a que su lote se comprometa y aplique.
+
+        Las propuestas que llegan dentro de `batch_window` (o hasta `max_batch_size`)
+        se persisten con un único fsync y se replican en una sola ronda de
+        AppendEntries. Devuelve la entrada, o None si el lote no alcanzó mayoría.
+        Lanza Overloaded si la cola de propuestas está llena o se está cediendo el liderazgo.
+        """
+        if not self.is_leader():
+            raise Exception("Solo el líder puede agregar entradas al log")
+        if not self._transfer_idle.is_set():
+            self._m_proposals_rejected.labels("transfer").inc()
+            raise Overloaded("Transfiriendo el liderazgo", retry_after=self.election_timeout_range[0], status=503)
+        if len(self._proposals) >= self.max_pending_proposals:
+            batches_ahead = len(self._proposals) / self.max_batch_size
+            self._m_proposals_rejected.labels("queue_full").inc()
+            raise Overloaded("Cola de escrituras llena",
+                             retry_after=max(1.0, batches_ahead * self._batch_latency))
+        future = asyncio.get_running_loop().create_future()
+        self._proposals.append((command, future))
+        if len(self._proposals) >= self.max_batch_size:
+            self._proposal_event.set()
+        if self._batch_task is None or self._batch_task.done():
+            self._batch_task = asyncio.create_task(self._batch_loop())
+        entry = await future
+        if entry is not None:
+            # Responder tras aplicar: el cliente lee lo que acaba de escribir. Se espera
+            # aquí y no en el lote, así aplicar no retrasa el commit de los siguientes
+            await self.wait_applied(entry.index, self.replication_timeout)
         return entry
 
+    async def _batch_loop(self):
+        """Agrupa propuestas pendientes y las agrega al log lote a lote.
+
+        Un lote no espera el commit del anterior: se persiste, se entrega a los
+        replicadores y su commit se espera en una tarea propia, así el pipeline por
+        seguidor lleva varios lotes en vuelo (hasta `max_inflight` a la vez).
+        """
+        while self._proposals:
+            if len(self._proposals) < self.max_batch_size:
+                try:
+                    await asyncio.wait_for(self._proposal_event.wait(), self.batch_window)
+                except asyncio.TimeoutError:
+                    pass
+            self._proposal_event.clear()
+            # Durante una transferencia de liderazgo no se agregan entradas nuevas
+            await self._transfer_idle.wait()
+            batch = self._proposals[:self.max_batch_size]
+            del self._proposals[:self.max_batch_size]
+            started = time.time()
+            entries = await self._append_batch(batch)
+            task = asyncio.create_task(self._commit_batch(batch, entries, started))
+            self._batches_in_flight.add(task)
+            task.add_done_callback(self._batches_in_flight.discard)
+            if len(self._batches_in_flight) >= self.max_inflight:
+                await asyncio.wait(self._batches_in_flight, return_when=asyncio.FIRST_COMPLETED)
+
+    async def _append_batch(self, batch: List[tuple]) -> List[LogEntry]:
+        """Persiste un lote como entradas del término actual; [] si no se pudo."""
+        if not self.is_leader():
+            return []
+        first_index = self._last_log_index() + 1
+        entries = [LogEntry(self.current_term, command, index=first_index + i)
+                   for i, (command, _) in enumerate(batch)]
+        self._m_batch_entries.observe(len(entries))
+        try:
+            async with timed(self._m_append_log, self.profiler, "append_log"):
+                self._persist_entries(entries, sync=False)
+                await self._sync_log()
+        except Exception as e:
+            logger.error(f"Error agregando lote de {len(batch)} entradas: {e}")
+            return []
+        return entries
+
+    async def _commit_batch(self, batch: List[tuple], entries: List[LogEntry], started: float):
+        """Espera el commit de un lote ya agregado y resuelve las propuestas."""
+        committed = False
+        try:
+            if entries:
+                committed = await self.replicate_log(entries[-1])
+        except Exception as e:
+            logger.error(f"Error comprometiendo lote de {len(batch)} entradas: {e}")
+            committed = False
+        elapsed = time.time() - started
+        self._batch_latency = elapsed if not self._batch_latency else 0.8 * self._batch_latency + 0.2 * elapsed
+        self._m_commit.labels("ok" if committed else "failed").observe(elapsed)
+        for i, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(entries[i] if committed else None)
+
     async def replicate_log(self, entry: LogEntry) -> bool:
         """Replica una entrada a la mayoría de nodos"""
         if not self.is_leader():
             return False
 
-        # La entrada ya está en el log del líder, ahora replicarla
-        success_count = 1  # El líder cuenta
-        
-        target_peers = self._target_peers()
-        tasks = []
-        for peer in target_peers:
-            task = asyncio.create_task(self._replicate_entry_to_peer(peer, entry))
-            tasks.append(task)
+        # La entrada ya está en el log del líder: las tareas por seguidor la envían
+        async with timed(self._m_replicate, self.profiler, "replicate_log"):
+            self._wake_replicators()
+            await self._update_commit_index()
+            has_majority = await self.wait_committed(entry.index, self.replication_timeout)
 
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        success_count += sum(1 for r in results if r is True)
-
-        # Verificar mayoría (degradando si hay menos nodos vivos)
-        majority_required = self._quorum_size()
-        
-        has_majority = success_count >= majority_required
-        
         if has_majority:
-            # Actualizar commit_index si es mayor que el actual
-            entry_index = entry.index
-            if entry_index > self.commit_index:
-                self.commit_index = entry_index
-                self.save_state()
-            logger.info(f"✅ Entrada {entry_index} replicada en mayoría")
-            # Empujar commit_index actualizado inmediatamente a seguidores
-            await self._broadcast_heartbeat()
+            logger.info(f"✅ Entrada {entry.index} replicada en mayoría")
         else:
-            logger.warning(f"⚠️ Entrada {entry.index} no alcanzó mayoría ({success_count}/{majority_required})")
+            logger.warning(f"⚠️ Entrada {entry.index} no alcanzó mayoría (quórum {self._quorum_size()})")
 
         return has_majority
 
-    async def _replicate_entry_to_peer(self, peer: str, entry: LogEntry) -> bool:
-        """Replica una entrada específica a un peer"""
+    async def _sync_peer_state(self, peer: str):
+        """Despierta la replicación de un peer para curar rezagos."""
+        if not self.is_leader():
+            return
+        pipe = self._pipelines.get(peer)
+        if pipe is None or pipe.task is None or pipe.task.done():
+            self._start_replicators()
+        else:
+            pipe.event.set()
+
+    # ====================================================
+    # Transferencia de liderazgo
+    # ====================================================
+
+    def _transfer_candidate(self) -> Optional[str]:
+        """Peer sano más al día (a igualdad, el de mayor prioridad)."""
+        healthy = self._healthy_peers()
+        if not healthy:
+            return None
+        return max(healthy, key=lambda p: (self.match_index.get(p, 0), self._priority_of_url(p)))
+
+    async def transfer_leadership(self, target: Optional[str] = None,
+                                  timeout: Optional[float] = None) -> Optional[str]:
+        """Cede el liderazgo a `target` (o al peer sano más al día) al estilo TimeoutNow.
+
+        Frena las propuestas nuevas, espera a que el destino tenga todo nuestro log
+        y le pide una elección inmediata. Devuelve el nuevo líder, o None si no se pudo
+        (seguimos siendo líder).
+        """
+        if not self.is_leader() or self._transfer_target:
+            return None
+        target = target or self._transfer_candidate()
+        if target not in self.peers:
+            return None
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.replication_timeout)
+        self._transfer_target = target
+        # El destino podrá elegirse sin esperar su timeout: el lease deja de valer ya
+        self._lease_since = time.time()
+        self._transfer_idle.clear()
+        self._transfer_waiter = loop.create_future()
+        logger.info(f"🤝 {self.node_id} transfiere el liderazgo a {target}")
         try:
-            # Usamos next_index para enviar todas las entradas faltantes en el peer
-            next_idx = self.next_index.get(peer, len(self.log) + 1)
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as session:
-                while next_idx > 0:
-                    prev_log_index = next_idx - 1
-                    prev_log_term = self.log[prev_log_index - 1].term if 0 < prev_log_index <= len(self.log) else 0
-                    entries = [e.to_dict() for e in self.log[next_idx - 1:]]
-                    data = {
-                        "term": self.current_term,
-                        "leader_id": self.node_id,
-                        "prev_log_index": prev_log_index,
-                        "prev_log_term": prev_log_term,
-                        "entries": entries,
-                        "leader_commit": self.commit_index
-                    }
-                    async with session.post(f"{peer}/raft/append_entries", json=data) as resp:
-                        result = await resp.json()
-                        if result.get("success", False):
-                            self.next_index[peer] = len(self.log) + 1
-                            self.match_index[peer] = len(self.log)
-                            self.peer_health[peer] = time.time()
-                            return True
-                        # Respondió pero no aceptó: sigue vivo, decrementamos y reintentamos
-                        self.peer_health[peer] = time.time()
-                    # Si falla, retroceder next_idx para buscar punto común
-                    if next_idx <= 1:
-                        break
-                    next_idx -= 1
+            self._start_replicators()
+            # 1) Poner al día al destino
+            while self.match_index.get(target, 0) < self._last_log_index():
+                ack = self._ack_event
+                remaining = deadline - loop.time()
+                if remaining <= 0 or not self.is_leader():
+                    logger.warning(f"⌛ {target} no se puso al día para la transferencia")
+                    return None
+                self._wake_replicators()
+                try:
+                    await asyncio.wait_for(ack.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            # 2) TimeoutNow: el destino se proclama sin esperar su timeout de elección
+            self._preempt_hold_until = time.time() + LEADERSHIP_HOLD
+            payload = {"term": self.current_term, "leader_id": self.self_url or self.node_id}
+            reply = await self._peer_rpc(target, MSG_TIMEOUT_NOW, "/raft/timeout_now", payload,
+                                         timeout=max(0.1, deadline - loop.time()))
+            if not reply or not reply.get("success"):
+                self._preempt_hold_until = 0.0
+                return None
+            # 3) Esperar su anuncio de victoria
+            return await asyncio.wait_for(asyncio.shield(self._transfer_waiter),
+                                          max(0.1, deadline - loop.time()))
         except Exception as e:
-            logger.warning(f"Error replicando a {peer}: {e}")
-            if peer in self.peer_health:
-                self.peer_health[peer] = 0.0
-            return False
+            logger.warning(f"Transferencia de liderazgo a {target} falló: {e}")
+            return None
+        finally:
+            # Si la transferencia falló, el lease se rehace con acks enviados después de ella
+            self._lease_since = time.time()
+            self._transfer_target = None
+            self._transfer_waiter = None
+            self._transfer_idle.set()
 
-    async def _sync_peer_state(self, peer: str):
-        """Empuja las entradas faltantes a un peer para curar rezagos."""
-        if not self.is_leader() or not self.log:
-            return
+    # ====================================================
+    # Lecturas linealizables (ReadIndex y lease)
+    # ====================================================
+
+    def _note_ack(self, peer: str, sent_at: float):
+        if sent_at > self._peer_ack_sent.get(peer, 0.0):
+            self._peer_ack_sent[peer] = sent_at
+        self._ack_event.set()
+        self._ack_event = asyncio.Event()
+
+    def _quorum_ack_time(self) -> float:
+        """Envío más reciente confirmado por un quórum (el líder cuenta como uno)."""
+        needed = self._quorum_size() - 1
+        if needed <= 0:
+            return time.time()
+        acks = sorted((self._peer_ack_sent.get(p, 0.0) for p in self.peers), reverse=True)
+        return acks[needed - 1] if len(acks) >= needed else 0.0
+
+    async def _confirm_leadership(self, timeout: float) -> bool:
+        """Confirma con un quórum (mismo que las escrituras) que seguimos siendo líder.
+
+        Durante una transferencia no hay lease: tras TimeoutNow el destino puede
+        ganar antes de que venza.
+        """
+        acked = self._quorum_ack_time()
+        if (self.lease_reads and not self._transfer_target and acked >= self._lease_since
+                and time.time() < acked + self.lease_duration):
+            return True
+        start = time.time()
+        await self._broadcast_heartbeat()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.is_leader():
+            if self._quorum_ack_time() >= start:
+                return True
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._ack_event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        return False
+
+    async def read_index(self, timeout: Optional[float] = None) -> Optional[int]:
+        """Índice hasta el que hay que aplicar para leer de forma linealizable.
+
+        En el líder es su commit_index tras confirmar el liderazgo; un seguidor
+        se lo pide al líder por `/raft/read_index`. None si no se pudo obtener.
+        """
+        timeout = timeout or self.replication_timeout
+        if self.is_leader():
+            # Un líder nuevo no conoce todo lo comprometido hasta comprometer algo de su
+            # término: espera la no-op del ascenso (o propone otra si aquella falló)
+            if self._term_at(self.commit_index) != self.current_term:
+                noop = self._noop_task
+                if noop is not None and not noop.done():
+                    await asyncio.wait({noop}, timeout=timeout)
+                if self._term_at(self._last_log_index()) != self.current_term:
+                    await self._propose_noop()
+                if not await self.wait_committed(self._last_log_index(), timeout):
+                    return None
+            index = self.commit_index
+            return index if await self._confirm_leadership(timeout) else None
+        if not self.leader_id or self.leader_id in (self.node_id, self.self_url):
+            return None
         try:
-            # Intenta replicar desde el último índice conocido del peer
-            await self._replicate_entry_to_peer(peer, self.log[-1])
+            data = await self._peer_rpc(self.leader_id, MSG_READ_INDEX, "/raft/read_index",
+                                        timeout=timeout, method="get")
         except Exception as e:
-            logger.warning(f"Error curando peer {peer}: {e}")
+            logger.warning(f"Error pidiendo read_index al líder {self.leader_id}: {e}")
+            return None
+        return data.get("read_index") if data else None
+
+    async def read_barrier(self, timeout: Optional[float] = None) -> bool:
+        """ReadIndex + esperar a aplicar hasta ese índice: tras esto, leer localmente es linealizable."""
+        timeout = timeout or self.replication_timeout
+        index = await self.read_index(timeout)
+        if index is None:
+            return False
+        return await self.wait_applied(index, timeout)
 
     async def _reconcile_from_peer(self, peer: str):
         """Trae entradas que el peer tenga y el líder no, y las replica al resto.
 
         Política simple: se consideran nuevas las entradas cuyo par (term, command)
-        no exista en nuestro log. Se incorporan en el líder y luego se replican
+        no exista en nuestro log desde el inicio de la divergencia. Se incorporan en el líder y luego se replican
         al resto. Esto permite que un nodo aislado aporte escrituras al reunirse.
+
+        Hasta match_index el log del peer coincide con el nuestro, y si el peer no
+        tiene nada más allá no hay nada que pedir. Si no, se comparan digests por
+        rangos de índices (bajando por niveles) y solo se descargan las hojas que
+        difieren.
         """
         if not self.is_leader():
             return
+        match = self.match_index.get(peer, 0)
+        peer_last = self._peer_last_index.get(peer)
+        if peer_last is not None and peer_last <= match:
+            return
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as session:
-                async with session.get(f"{peer}/raft/log/full") as resp:
-                    if resp.status != 200:
-                        return
-                    data = await resp.json()
-                    peer_entries = data.get("entries", [])
+            peer_entries = await self._fetch_divergent_entries(peer, max(match, self.snapshot_index) + 1)
         except Exception as e:
-            logger.warning(f"Error obteniendo log completo de {peer}: {e}")
+            logger.warning(f"Error comparando digests del log con {peer}: {e}")
             return
 
         if not peer_entries:
             return
 
-        existing_keys = {(e.term, e.command) for e in self.log}
+        # Claves solo desde el inicio de la divergencia: lo anterior coincide con el peer.
+        # Hasta nuestro final, porque lo reconciliado antes pudo quedar en otro índice
+        first = min((e.get("index") or 0) for e in peer_entries)
+        existing_keys = {(e.term, e.command)
+                         for e in self.log_range(max(first, self.snapshot_index + 1), self._last_log_index())}
         new_entries = []
         for entry_data in peer_entries:
+            # Lo cubierto por nuestro snapshot ya está comprometido y aplicado
+            if (entry_data.get("index") or 0) <= self.snapshot_index:
+                continue
             key = (entry_data.get("term"), entry_data.get("command"))
             if key in existing_keys:
                 continue
@@ -611,71 +1881,250 @@ class RaftNode:
         logger.info(f"🔄 Reconciliando {len(new_entries)} entradas nuevas desde {peer}")
         for entry in new_entries:
             # Incorporar entrada al líder
-            entry.index = len(self.log) + 1
-            self.log.append(entry)
+            entry.index = self._last_log_index() + 1
+            self._persist_entries([entry], sync=False)
+            await self._sync_log()
             self.commit_index = max(self.commit_index, entry.index)
-            self.last_applied = self.commit_index
-            self.save_state()
+            self.save_progress()
             # Aplicar al estado local
-            await self.apply_to_state_machine(entry)
+            self._notify_commit()
+            await self.wait_applied(entry.index, self.replication_timeout)
             # Replicar al resto
             await self.replicate_log(entry)
 
+    async def _fetch_divergent_entries(self, peer: str, start: int) -> List[dict]:
+        """Desciende por el árbol de digests del peer y devuelve sus entradas en rangos distintos."""
+        pending = [(start, 0)]
+        leaves = []
+        while pending:
+            lo, hi = pending.pop()
+            async with self.http.get(peer, "/raft/log/digest", timeout=5,
+                                     params={"start": lo, "end": hi, "buckets": DIGEST_FANOUT}) as resp:
+                if resp.status != 200:
+                    return []
+                digest = await resp.json()
+            for r_lo, r_hi, r_hash in digest.get("ranges", []):
+                if r_lo <= self.snapshot_index:
+                    continue
+                if r_hi <= self._last_log_index() and self._range_hash(r_lo, r_hi) == r_hash:
+                    continue
+                if r_hi - r_lo + 1 <= DIGEST_LEAF_SIZE or r_lo > self._last_log_index():
+                    leaves.append((r_lo, r_hi))
+                else:
+                    pending.append((r_lo, r_hi))
+        # Cada hoja se pide en tramos acotados, como en la replicación: una hoja más allá
+        # de nuestro final cubre todo lo que nos falta y no puede ir en una sola respuesta
+        entries = []
+        for lo, hi in sorted(leaves):
+            while lo <= hi:
+                end = min(hi, lo + self.max_append_entries - 1)
+                async with self.http.get(peer, "/raft/log/range", timeout=5,
+                                         params={"start": lo, "end": end}) as resp:
+                    if resp.status != 200:
+                        return []
+                    chunk = (await resp.json()).get("entries", [])
+                entries.extend(chunk)
+                if len(chunk) < end - lo + 1:
+                    break  # el peer compactó o truncó lo que sigue
+                lo = end + 1
+        return entries
+
     async def _recover_from_peers(self):
         """Cuando nos volvemos líder, buscamos el log más avanzado en los peers y lo adoptamos."""
-        best_log = None
-        best_summary = {
-            "last_index": len(self.log),
-            "last_term": self.log[-1].term if self.log else 0,
-            "commit_index": self.commit_index,
-        }
-        for peer in self.peers:
+        async def summary(peer: str):
+            async with self.http.get(peer, "/raft/log/summary", timeout=5) as resp:
+                return await resp.json() if resp.status == 200 else None
+
+        # Resúmenes de todos los peers en paralelo; el log se baja solo del más avanzado
+        summaries = await self._fan_out(self.peers, summary, timeout=self.election_timeout_range[0] / 2)
+        ours = (self._last_log_index(), self._last_log_term())
+        candidates = sorted(
+            ((data.get("last_index", 0), data.get("last_term", 0), peer, data.get("commit_index", 0))
+             for peer, data in summaries.items() if data),
+            reverse=True)
+        for peer_last, peer_term, peer, peer_commit in candidates:
+            # Escogemos el log más avanzado (mayor índice, o mayor término a mismo índice)
+            if (peer_last, peer_term) <= ours:
+                break
+            last = await self._pull_log(peer, fetch_snapshot=True)
+            if last is None:
+                continue
+            async with self._lock:
+                async with self._apply_lock:
+                    self.commit_index = max(self.commit_index, min(peer_commit, last, self._last_log_index()))
+                    # Lo adoptado aún no está aplicado: el worker lo aplica desde nuestro last_applied
+                    self.last_applied = max(self.snapshot_index, min(self.last_applied, self.commit_index))
+                self.save_state()
+            self._kick_apply()
+            return
+
+    # ====================================================
+    # Snapshots y compactación
+    # ====================================================
+
+    async def take_snapshot(self) -> bool:
+        """Guarda un snapshot de la máquina de estado en last_applied y compacta el log.
+
+        El backup corre solo con _apply_lock: _lock (AppendEntries, votos, heartbeats)
+        queda libre mientras dura y se toma únicamente para publicar y compactar.
+        """
+        if not self.snapshot_callback:
+            return False
+        tmp_path = f"{self.snapshot_file}.tmp"
+        async with self._apply_lock:
+            # El snapshot cubre hasta donde llegó el worker de aplicación
+            index = self.last_applied
+            if index <= self.snapshot_index or index > self._last_log_index():
+                return False
+            term = self._term_at(index)
             try:
-                async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as session:
-                    async with session.get(f"{peer}/raft/log/summary") as resp:
-                        if resp.status != 200:
-                            continue
-                        summary = await resp.json()
-                        peer_last = summary.get("last_index", 0)
-                        peer_term = summary.get("last_term", 0)
-                        peer_commit = summary.get("commit_index", 0)
-                        # Escogemos el log más avanzado (mayor índice, o mayor término a mismo índice)
-                        better = False
-                        if peer_last > best_summary["last_index"]:
-                            better = True
-                        elif peer_last == best_summary["last_index"] and peer_term > best_summary["last_term"]:
-                            better = True
-                        if not better:
-                            continue
-                        async with session.get(f"{peer}/raft/sync?follower={self.node_id}") as sync_resp:
-                            if sync_resp.status != 200:
-                                continue
-                            data = await sync_resp.json()
-                            entries = data.get("missing_entries", [])
-                            candidate_log = []
-                            for i, entry_data in enumerate(entries):
-                                entry = LogEntry.from_dict(entry_data)
-                                entry.index = i + 1
-                                candidate_log.append(entry)
-                            if candidate_log:
-                                best_log = candidate_log
-                                best_summary = {
-                                    "last_index": peer_last,
-                                    "last_term": peer_term,
-                                    "commit_index": min(peer_commit, len(candidate_log)),
-                                }
-                        self.peer_health[peer] = time.time()
+                with timed(self._m_snapshot):
+                    await self.snapshot_callback(tmp_path)
             except Exception as e:
-                logger.warning(f"Error recuperando log de {peer}: {e}")
+                logger.error(f"Error tomando snapshot: {e}")
+                return False
+        async with self._lock:
+            # Durante el backup pudo instalarse un snapshot más nuevo o cambiar el log
+            if index <= self.snapshot_index or self._term_at(index) != term:
+                os.remove(tmp_path)
+                return False
+            os.replace(tmp_path, self.snapshot_file)
+            self._compact_log(index, term)
+        logger.info(f"📸 Snapshot en índice {index} (término {term}), log compactado")
+        return True
+
+    def _compact_log(self, index: int, term: int):
+        """Descarta del log las entradas cubiertas por un snapshot en `index`."""
+        self.snapshot_index = index
+        self.snapshot_term = term
+        # Primero los metadatos: si caemos antes de borrar segmentos, load_state filtra
+        self.save_state()
+        self.log_store.compact_prefix(index)
+
+    def read_snapshot_chunk(self, offset: int, size: int = SNAPSHOT_CHUNK_SIZE):
+        """Lee un trozo del snapshot actual: (datos, terminado, índice, término)."""
+        if not self.snapshot_index or not os.path.exists(self.snapshot_file):
+            return b"", True, 0, 0
+        with open(self.snapshot_file, "rb") as f:
+            total = os.fstat(f.fileno()).st_size
+            f.seek(offset)
+            data = f.read(size)
+        return data, offset + len(data) >= total, self.snapshot_index, self.snapshot_term
+
+    async def _send_snapshot(self, peer: str) -> bool:
+        """Envía el snapshot en trozos a un peer rezagado (InstallSnapshot)."""
+        if peer in self._snapshot_transfers:
+            return False
+        self._snapshot_transfers.add(peer)
+        offset = 0
+        sent_index = None
+        try:
+            while self.is_leader():
+                data, done, index, term = self.read_snapshot_chunk(offset)
+                if not index:
+                    return False
+                if sent_index is not None and index != sent_index:
+                    # Se tomó un snapshot nuevo a mitad de la transferencia: reiniciar
+                    offset, sent_index = 0, None
+                    continue
+                sent_index = index
+                params = {
+                    "term": self.current_term,
+                    "leader_id": self.self_url or self.node_id,
+                    "last_included_index": index,
+                    "last_included_term": term,
+                    "offset": offset,
+                    "done": "true" if done else "false",
+                }
+                if done and self._config_index <= index:
+                    # Sin configuraciones en el log tras el snapshot, la vigente es la del snapshot
+                    params["config"] = json.dumps(self._current_config())
+                async with self.http.post(peer, "/raft/install_snapshot", params=params, data=data, timeout=10) as resp:
+                    result = await resp.json()
+                self.peer_health[peer] = time.time()
+                if not result.get("success", False):
+                    if "next_offset" not in result:
+                        return False
+                    offset = result["next_offset"]
+                    continue
+                if done:
+                    self.next_index[peer] = index + 1
+                    self._advance_match_index(peer, index)
+                    logger.info(f"📸 Snapshot {index} instalado en {peer}")
+                    return True
+                offset = result.get("next_offset", offset + len(data))
+        except Exception as e:
+            logger.warning(f"Error enviando snapshot a {peer}: {e}")
+            if peer in self.peer_health:
                 self.peer_health[peer] = 0.0
+        finally:
+            self._snapshot_transfers.discard(peer)
+        return False
 
-        if best_log:
-            async with self._lock:
-                self.log = best_log
-                self.commit_index = best_summary.get("commit_index", len(best_log))
-                self.last_applied = min(self.commit_index, len(self.log))
-                self.save_state()
-            await self._drain_committed_entries()
+    async def _fetch_snapshot(self, peer: str) -> bool:
+        """Descarga el snapshot de un peer en trozos y lo instala localmente."""
+        offset = 0
+        expected_index = None
+        try:
+            while True:
+                async with self.http.get(peer, "/raft/snapshot", params={"offset": offset}, timeout=10) as resp:
+                    if resp.status != 200:
+                        return False
+                    index = int(resp.headers.get("X-Snapshot-Index", 0))
+                    term = int(resp.headers.get("X-Snapshot-Term", 0))
+                    done = resp.headers.get("X-Snapshot-Done") == "true"
+                    data = await resp.read()
+                if not index:
+                    return False
+                if expected_index is not None and index != expected_index:
+                    offset, expected_index = 0, None
+                    continue
+                expected_index = index
+                async with self._lock:
+                    result = await self._install_snapshot_chunk(index, term, offset, data, done)
+                if not result.get("success", False):
+                    return False
+                if done:
+                    return True
+                offset = result["next_offset"]
+        except Exception as e:
+            logger.warning(f"Error descargando snapshot de {peer}: {e}")
+            return False
+
+    async def _install_snapshot_chunk(self, last_index: int, last_term: int, offset: int,
+                                      data: bytes, done: bool) -> dict:
+        """Escribe un trozo de snapshot y, al completarlo, restaura la máquina de estado.
+
+        Debe llamarse con el lock tomado.
+        """
+        part_path = f"{self.snapshot_file}.part"
+        current_size = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if offset != 0 and offset != current_size:
+            return {"term": self.current_term, "success": False, "next_offset": current_size}
+        with open(part_path, "wb" if offset == 0 else "ab") as f:
+            f.write(data)
+        next_offset = offset + len(data)
+        if done and last_index > self.snapshot_index:
+            os.replace(part_path, self.snapshot_file)
+            await self._apply_lock.acquire()
+            try:
+                if self.restore_callback:
+                    await self.restore_callback(self.snapshot_file)
+                self.last_applied = last_index
+            finally:
+                self._apply_lock.release()
+            if self._entry_at(last_index) and self._term_at(last_index) == last_term:
+                # Conservamos el sufijo del log posterior al snapshot
+                self._compact_log(last_index, last_term)
+            else:
+                self._replace_log([])
+                self.snapshot_index = last_index
+                self.snapshot_term = last_term
+            self.commit_index = max(self.commit_index, last_index)
+            self.save_state()
+            self._notify_applied()
+            logger.info(f"📥 Snapshot instalado hasta índice {last_index} (término {last_term})")
+        return {"term": self.current_term, "success": True, "next_offset": next_offset, "node_id": self.node_id}
 
     # ====================================================
     # Handlers para requests RAFT
@@ -684,7 +2133,7 @@ class RaftNode:
     async def handle_vote_request(self, term: int, candidate_id: str, 
                                 last_log_index: int, last_log_term: int) -> dict:
         """Maneja RequestVote RPC"""
-        async with self._lock:
+        async with self._lock.hold(PRIORITY_CONSENSUS):
             # Actualizar término si es necesario
             if term > self.current_term:
                 self.current_term = term
@@ -695,15 +2144,11 @@ class RaftNode:
             vote_granted = False
             
             # Verificar condiciones para otorgar voto
-            if (term == self.current_term and 
+            if (not self.is_learner and term == self.current_term and
                 (self.voted_for is None or self.voted_for == candidate_id)):
                 
                 # Verificar que el log del candidato está al menos tan actualizado como el nuestro
-                our_last_log_term = self.log[-1].term if self.log else 0
-                our_last_log_index = len(self.log)
-                
-                if (last_log_term > our_last_log_term or 
-                    (last_log_term == our_last_log_term and last_log_index >= our_last_log_index)):
+                if self._log_up_to_date(last_log_index, last_log_term):
                     
                     self.voted_for = candidate_id
                     vote_granted = True
@@ -720,13 +2165,19 @@ class RaftNode:
                                    entries: List[dict], prev_log_index: int, 
                                    prev_log_term: int, leader_commit: int) -> dict:
         """Maneja AppendEntries RPC"""
-        apply_now = False
-        async with self._lock:
+        if entries and self._lock.waiting(PRIORITY_REPLICATION) >= self.max_queued_appends:
+            # Saturado: se rechaza sin tocar el log; el líder reintenta tras retry_after.
+            # Los heartbeats (sin entradas) siempre pasan y mantienen el liderazgo
+            return {"term": self.current_term, "success": False, "node_id": self.node_id,
+                    "overloaded": True, "retry_after": self.min_heartbeat_interval}
+        priority = PRIORITY_REPLICATION if entries else PRIORITY_CONSENSUS
+        async with self._lock.hold(priority):
             # Actualizar término si es necesario
             if term > self.current_term:
                 self.current_term = term
                 self.role = RaftRole.FOLLOWER
                 self.voted_for = None
+                self.save_state()
 
             success = False
 
@@ -735,63 +2186,130 @@ class RaftNode:
 
             # Resetear temporizador de elección
             self.reset_election_timer()
+            self._leader_contact = time.time()
             self.role = RaftRole.FOLLOWER
             # Preferimos la URL si viene (para respetar prioridad por puerto)
-            self.leader_id = leader_id or self.leader_id
+            self._set_leader(leader_id or self.leader_id)
             # Si tenemos más prioridad que el líder actual, gatilla reelección.
             asyncio.create_task(self._maybe_challenge_lower_priority_leader(leader_id))
 
+            # Entradas ya cubiertas por nuestro snapshot están comprometidas: se omiten
+            if prev_log_index < self.snapshot_index:
+                skip = self.snapshot_index - prev_log_index
+                entries = entries[skip:]
+                prev_log_index = self.snapshot_index
+                prev_log_term = self.snapshot_term
+
             # Verificar consistencia del log
             if prev_log_index > 0:
-                if prev_log_index > len(self.log) or \
-                   (prev_log_index <= len(self.log) and self.log[prev_log_index - 1].term != prev_log_term):
-                    return {"term": self.current_term, "success": False}
-
-            # Aplicar entradas
-            if entries:
-                # Eliminar entradas conflictivas
-                if prev_log_index < len(self.log):
-                    self.log = self.log[:prev_log_index]
-                
-                # Agregar nuevas entradas
-                for entry_data in entries:
-                    entry = LogEntry.from_dict(entry_data)
-                    entry.index = len(self.log) + 1
-                    self.log.append(entry)
-
-            # Actualizar commit_index
+                if prev_log_index > self._last_log_index():
+                    return {"term": self.current_term, "success": False,
+                            "conflict_index": self._last_log_index() + 1, "conflict_term": 0}
+                if self._term_at(prev_log_index) != prev_log_term:
+                    # Pista: término en conflicto y su primer índice, para saltarlo entero
+                    conflict_term = self._term_at(prev_log_index)
+                    conflict_index = prev_log_index
+                    while conflict_index - 1 > self.snapshot_index and \
+                            self._term_at(conflict_index - 1) == conflict_term:
+                        conflict_index -= 1
+                    return {"term": self.current_term, "success": False,
+                            "conflict_index": conflict_index, "conflict_term": conflict_term}
+
+            self._merge_entries([LogEntry(entry_data["term"], entry_data["command"], index=prev_log_index + i + 1)
+                                 for i, entry_data in enumerate(entries)])
+            # El fsync corre en otro hilo; _lock mantiene el orden de los AppendEntries
+            await self._sync_log()
+
+            # Actualizar commit_index (hasta la última entrada recibida de este líder)
             if leader_commit > self.commit_index:
-                self.commit_index = min(leader_commit, len(self.log))
+                self.commit_index = max(self.commit_index, min(leader_commit, prev_log_index + len(entries)))
             if self.last_applied < self.commit_index:
-                apply_now = True
+                self._kick_apply()
 
             success = True
-            self.save_state()
+            self.save_progress()
 
             response = {
                 "term": self.current_term,
                 "success": success,
-                "node_id": self.node_id
+                "node_id": self.node_id,
+                "last_log_index": self._last_log_index(),
             }
-
-        if apply_now:
-            # Aplica inmediatamente los commits recién anunciados para evitar lags tras failover
-            await self._drain_committed_entries()
+            if self.read_replica:
+                response["read_replica"] = True
 
         return response
 
+    async def handle_install_snapshot(self, term: int, leader_id: str, last_included_index: int,
+                                      last_included_term: int, offset: int, data: bytes, done: bool,
+                                      config: Optional[dict] = None) -> dict:
+        """Maneja InstallSnapshot RPC (un trozo por llamada)"""
+        async with self._lock:
+            if term > self.current_term:
+                self.current_term = term
+                self.voted_for = None
+            if term < self.current_term:
+                return {"term": self.current_term, "success": False}
+            self.reset_election_timer()
+            self._leader_contact = time.time()
+            self.role = RaftRole.FOLLOWER
+            self._set_leader(leader_id or self.leader_id)
+            result = await self._install_snapshot_chunk(last_included_index, last_included_term, offset, data, done)
+            if done and config and result.get("success") and self._config_index <= last_included_index:
+                self._committed_config = (last_included_index, config)
+                self._adopt_config(last_included_index, config)
+            return result
+
     async def receive_heartbeat(self, term: int, leader_id: str):
         """Maneja heartbeat simple"""
-        async with self._lock:
+        async with self._lock.hold(PRIORITY_CONSENSUS):
             if term >= self.current_term:
                 self.current_term = term
                 self.role = RaftRole.FOLLOWER
-                self.leader_id = leader_id or self.leader_id
+                self._set_leader(leader_id or self.leader_id)
                 self.reset_election_timer()
+                self._leader_contact = time.time()
                 self.save_state()
                 # Si vemos heartbeats de un líder con menor prioridad, forzamos elección.
                 asyncio.create_task(self._maybe_challenge_lower_priority_leader(leader_id))
 
+    def _log_up_to_date(self, last_log_index: int, last_log_term: int) -> bool:
+        """¿El log del candidato está al menos tan actualizado como el nuestro? (término, luego índice)"""
+        our_last_log_term = self._last_log_term()
+        return (last_log_term > our_last_log_term or
+                (last_log_term == our_last_log_term and last_log_index >= self._last_log_index()))
+
+    async def handle_pre_vote(self, candidate_id: str, term: int,
+                              last_log_index: int = 0, last_log_term: int = 0) -> dict:
+        """Maneja PreVote: no cambia término ni voto.
+
+        Lo concede solo si no hay un líder vivo y el candidato obtendría nuestro voto
+        real: su término no es menor que el nuestro (en Bully el retador ya subió el
+        suyo) y su log está al menos tan actualizado.
+        """
+        leader_alive = self.is_leader() or (
+            self.leader_id is not None
+            and time.time() - self._leader_contact < self.election_timeout_range[0])
+        granted = (not leader_alive and term >= self.current_term
+                   and self._log_up_to_date(last_log_index, last_log_term))
+        return {"term": self.current_term, "granted": granted, "leader": self.leader_id}
+
+    async def handle_timeout_now(self, term: int, leader_id: str) -> dict:
+        """Maneja TimeoutNow: el líder nos cedió el puesto, elección inmediata."""
+        # Solo del líder actual y en su término: uno viejo o ajeno no nos hace competir
+        if term != self.current_term or leader_id != self.leader_id or self.is_learner:
+            return {"term": self.current_term, "success": False}
+        logger.info(f"⏩ {self.node_id} recibe TimeoutNow de {leader_id}")
+        asyncio.create_task(self._take_leadership())
+        return {"term": self.current_term, "success": True}
+
+    async def handle_transfer_leadership(self, target: Optional[str] = None) -> dict:
+        """Pedido (de un peer o de un operador) de ceder el liderazgo."""
+        if not self.is_leader():
+            return {"success": False, "error": "No soy líder", "leader": self.leader_id}
+        new_leader = await self.transfer_leadership(target)
+        return {"success": new_leader is not None, "leader": new_leader or self.leader_id}
+
     # ====================================================
     # Bully handlers
     # ====================================================
@@ -799,19 +2317,27 @@ class RaftNode:
     async def handle_bully_challenge(self, candidate_id: str, candidate_url: str, candidate_priority: int) -> dict:
         """Responder a un challenge Bully. Si tenemos mayor prioridad, lanzamos nuestra elección."""
         my_prio = self.priority
+        if self.is_learner:
+            return {"alive": False, "priority": my_prio, "leader": self.leader_id}
         if my_prio > candidate_priority:
             # Tengo más prioridad, inicio elección (o reafirmo liderazgo)
             asyncio.create_task(self._start_bully_election())
         return {"alive": True, "priority": my_prio, "leader": self.leader_id}
 
-    async def handle_bully_victory(self, leader_id: str, leader_url: str, priority: int) -> dict:
+    async def handle_bully_victory(self, leader_id: str, leader_url: str, priority: int, term: int = 0) -> dict:
         """Aceptar victoria de otro nodo."""
-        async with self._lock:
+        async with self._lock.hold(PRIORITY_CONSENSUS):
             self.role = RaftRole.FOLLOWER
-            self.leader_id = leader_url or leader_id
-            self.current_term = max(self.current_term, priority)
+            self._set_leader(leader_url or leader_id)
+            # Adoptamos el término del ganador; la prioridad no es un término
+            self.current_term = max(self.current_term, term)
             self.reset_election_timer()
+            self._leader_contact = time.time()
             self.save_state()
+        if self._transfer_waiter is not None and not self._transfer_waiter.done():
+            self._transfer_waiter.set_result(self.leader_id)
+        self._victory_event.set()
+        self._victory_event = asyncio.Event()
         return {"status": "ok", "ack": True}
 
     # ====================================================
@@ -822,35 +2348,134 @@ class RaftNode:
         """Solicita sincronización de log al líder"""
         if not self.leader_id or self.is_leader():
             return
+        before = self._last_log_index()
+        last = await self._pull_log(self.leader_id, fetch_snapshot=False)
+        if last is not None:
+            self.save_state()
+            logger.info(f"✅ Sincronizadas {max(0, last - before)} entradas desde líder")
 
-        try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as session:
-                async with session.get(f"{self.leader_id}/raft/sync?follower={self.node_id}") as resp:
-                    if resp.status == 200:
+    async def sync_stream(self, from_index: int):
+        """Log desde `from_index` para /raft/sync: cabecera y trozos binarios (raft_wire).
+
+        Lee del disco de a max_append_entries/max_append_bytes y el envío sigue el ritmo
+        del cliente, así la memoria no depende del rezago. Termina en el último índice
+        de la cabecera, o antes si el log cambia bajo el stream (compactación o truncado).
+        """
+        start = max(from_index, self.snapshot_index + 1)
+        upto = self._last_log_index()
+        yield encode_sync_header(self.snapshot_index, self.snapshot_term, upto, self.commit_index)
+        prev_index = start - 1
+        prev_term = self._term_at(prev_index)
+        while start <= upto:
+            if self._term_at(prev_index) != prev_term:
+                return
+            entries = self.log_range(start, min(upto, start + self.max_append_entries - 1),
+                                     max_bytes=self.max_append_bytes)
+            if not entries:
+                return
+            yield encode_sync_entries(entries)
+            prev_index, prev_term = entries[-1].index, entries[-1].term
+            start = prev_index + 1
+
+    async def _stream_log(self, peer: str, from_index: int, retries: int = 3):
+        """Descarga el log de `peer` desde `from_index` por /raft/sync, en trozos.
+
+        Produce (cabecera, entradas) con a lo sumo max_append_entries entradas por trozo.
+        Ante un corte reanuda desde la siguiente entrada (hasta `retries` cortes seguidos
+        sin progreso). Si `from_index` ya está compactado en el peer produce (cabecera, [])
+        y termina: hace falta su snapshot.
+        """
+        next_index = from_index
+        failures = 0
+        while failures <= retries:
+            progressed = False
+            try:
+                async with self.http.stream(peer, "/raft/sync", read_timeout=5,
+                                            params={"follower": self.node_id, "from_index": next_index}) as resp:
+                    if resp.status != 200:
+                        return
+                    if resp.content_type != SYNC_CONTENT_TYPE:
+                        # Peer anterior al streaming: manda el log entero en JSON
                         data = await resp.json()
-                        missing_entries = data.get("missing_entries", [])
-                        for entry_data in missing_entries:
-                            entry = LogEntry.from_dict(entry_data)
-                            if entry.index > len(self.log):
-                                self.log.append(entry)
-                        self.save_state()
-                        logger.info(f"✅ Sincronizadas {len(missing_entries)} entradas desde líder")
-        except Exception as e:
-            logger.warning(f"Error sincronizando con líder: {e}")
+                        snapshot_index = data.get("snapshot_index", 0)
+                        header = {"snapshot_index": snapshot_index, "snapshot_term": data.get("snapshot_term", 0)}
+                        if snapshot_index >= next_index:
+                            yield header, []
+                            return
+                        entries = [LogEntry(e["term"], e["command"], index=snapshot_index + i + 1)
+                                   for i, e in enumerate(data.get("missing_entries", []))]
+                        entries = entries[next_index - snapshot_index - 1:]
+                        for i in range(0, len(entries), self.max_append_entries):
+                            yield header, entries[i:i + self.max_append_entries]
+                        return
+                    header = decode_sync_header(await resp.content.readexactly(SYNC_HEADER.size))
+                    if header["snapshot_index"] >= next_index:
+                        yield header, []
+                        return
+                    chunk: List[LogEntry] = []
+                    error = None
+                    while next_index <= header["last_index"]:
+                        try:
+                            index, term, length = SYNC_ENTRY.unpack(await resp.content.readexactly(SYNC_ENTRY.size))
+                            command = (await resp.content.readexactly(length)).decode("utf-8")
+                        except Exception as e:
+                            error = e  # lo recibido hasta aquí se entrega antes de reanudar
+                            break
+                        if index != next_index:
+                            raise ValueError(f"se esperaba la entrada {next_index} y llegó {index}")
+                        chunk.append(LogEntry(term, command, index=index))
+                        next_index += 1
+                        if len(chunk) >= self.max_append_entries:
+                            yield header, chunk
+                            chunk, progressed = [], True
+                    if chunk:
+                        yield header, chunk
+                        progressed = True
+                    if error is not None:
+                        raise error
+                    if next_index > header["last_index"]:
+                        return
+            except Exception as e:
+                logger.warning(f"Corte sincronizando log desde {peer} en la entrada {next_index}: {e}")
+            failures = 0 if progressed else failures + 1
+        self.peer_health[peer] = 0.0
+
+    async def _pull_log(self, peer: str, fetch_snapshot: bool) -> Optional[int]:
+        """Trae el log de `peer` desde nuestro commit_index y lo funde con el nuestro.
+
+        Devuelve el último índice recibido (None si no llegó nada). Con `fetch_snapshot`,
+        si lo que falta ya está compactado en el peer se descarga antes su snapshot.
+        """
+        from_index = max(self.snapshot_index, self.commit_index) + 1
+        last = None
+        for _ in range(3):
+            restart = None
+            stream = self._stream_log(peer, from_index)
+            try:
+                async for header, entries in stream:
+                    if not entries:
+                        if self._term_at(header["snapshot_index"]) != header["snapshot_term"]:
+                            if not fetch_snapshot or not await self._fetch_snapshot(peer):
+                                return last
+                        restart = header["snapshot_index"] + 1
+                        break
+                    async with self._lock:
+                        if entries[0].index > self._last_log_index() + 1:
+                            return last  # nuestro log cambió entre trozos
+                        self._merge_entries(entries)
+                        await self._sync_log()
+                    last = entries[-1].index
+            finally:
+                await stream.aclose()  # libera la respuesta HTTP si cortamos antes
+            if restart is None:
+                break
+            from_index = restart
+        return last
 
     # ====================================================
     # Aplicación a máquina de estado
     # ====================================================
 
-    async def _drain_committed_entries(self):
-        """Aplica todas las entradas pendientes hasta commit_index."""
-        async with self._lock:
-            while self.last_applied < self.commit_index and self.last_applied < len(self.log):
-                entry = self.log[self.last_applied]
-                await self.apply_to_state_machine(entry)
-                self.last_applied += 1
-            self.save_state()
-
     async def apply_to_state_machine(self, entry: LogEntry):
         """Aplica una entrada comprometida a la máquina de estado"""
         if self.state_machine_callback:
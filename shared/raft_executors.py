@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from shared.raft_metrics import Metrics
+
+logger = logging.getLogger("raft")
+
+T = TypeVar("T")
+
+# Ejecutores compartidos por todo el proceso (todos los grupos de un nodo Multi-RAFT):
+# hilos para fsync y archivos, procesos para trabajo de CPU (bcrypt). El event loop
+# queda para RPC, timers y heartbeats.
+IO_THREADS = int(os.getenv("RAFT_IO_THREADS", "4"))
+CPU_WORKERS = int(os.getenv("RAFT_CPU_WORKERS", "0")) or min(2, os.cpu_count() or 1)
+
+_disk: Optional[ThreadPoolExecutor] = None
+_cpu: Optional[ProcessPoolExecutor] = None
+
+
+def disk_executor() -> ThreadPoolExecutor:
+    global _disk
+    if _disk is None:
+        _disk = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="raft-io")
+    return _disk
+
+
+def cpu_executor() -> ProcessPoolExecutor:
+    """Procesos para CPU pura; "spawn" evita heredar locks de los hilos del proceso."""
+    global _cpu
+    if _cpu is None:
+        _cpu = ProcessPoolExecutor(max_workers=CPU_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _cpu
+
+
+def serial_executor(name: str) -> ThreadPoolExecutor:
+    """Un hilo dedicado: para recursos atados a un hilo (p.ej. la conexión SQLite de un shard)."""
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+
+
+async def run_in(executor: Executor, fn: Callable[..., T], *args) -> T:
+    return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+
+async def run_disk(fn: Callable[..., T], *args) -> T:
+    return await run_in(disk_executor(), fn, *args)
+
+
+async def run_cpu(fn: Callable[..., T], *args) -> T:
+    return await run_in(cpu_executor(), fn, *args)
+
+
+def shutdown_executors():
+    global _disk, _cpu
+    if _disk is not None:
+        _disk.shutdown(wait=True)
+        _disk = None
+    if _cpu is not None:
+        _cpu.shutdown(wait=False, cancel_futures=True)
+        _cpu = None
+
+
+class LoopLagMonitor:
+    """Mide cuánto se atrasa el event loop respecto de un sleep periódico.
+
+    Un atraso alto significa que algo bloqueó el loop: los heartbeats salen tarde
+    y los seguidores pueden iniciar elecciones sin que el líder haya caído.
+    `metrics` es el registro del proceso para GET /metrics.
+    """
+
+    def __init__(self, interval: float = 0.1, warn_after: float = 0.2, window: int = 600):
+        self.interval = interval
+        self.warn_after = warn_after
+        self.samples = deque(maxlen=window)  # últimos atrasos (segundos)
+        self.max_lag = 0.0
+        self.stalls = 0                      # muestras por encima de warn_after
+        self.total = 0
+        self._last_warning = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.metrics = Metrics()
+        self._lag = self.metrics.histogram("raft_event_loop_lag_seconds", "Atraso del event loop del proceso")
+        self.metrics.collect("raft_event_loop_stalls_total", "Muestras con atraso mayor que warn_after",
+                             lambda: self.stalls, kind="counter")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, loop.time() - start - self.interval))
+
+    def record(self, lag: float):
+        self.samples.append(lag)
+        self._lag.observe(lag)
+        self.total += 1
+        self.max_lag = max(self.max_lag, lag)
+        if lag >= self.warn_after:
+            self.stalls += 1
+            now = time.monotonic()
+            if now - self._last_warning >= 5.0:
+                self._last_warning = now
+                logger.warning(f"🐢 Event loop bloqueado {lag * 1000:.0f} ms")
+
+    def stats(self) -> dict:
+        ordered = sorted(self.samples)
+        n = len(ordered)
+
+        def ms(value: float) -> float:
+            return round(value * 1000, 2)
+
+        return {
+            "last_ms": ms(self.samples[-1]) if n else 0.0,
+            "avg_ms": ms(sum(ordered) / n) if n else 0.0,
+            "p99_ms": ms(ordered[min(n - 1, int(n * 0.99))]) if n else 0.0,
+            "window_max_ms": ms(ordered[-1]) if n else 0.0,
+            "max_ms": ms(self.max_lag),
+            "stalls": self.stalls,
+            "samples": self.total,
+        }
+
+
+_loop_lag: Optional[LoopLagMonitor] = None
+
+
+def loop_lag_monitor() -> LoopLagMonitor:
+    """Monitor del loop del proceso (uno solo aunque haya varios grupos RAFT)."""
+    global _loop_lag
+    if _loop_lag is None:
+        _loop_lag = LoopLagMonitor()
+    return _loop_lag
@@ -0,0 +1,481 @@
+import bisect
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("raft")
+
+# Cabecera de cada registro: longitud del comando, crc32, índice y término
+RECORD_HEADER = struct.Struct(">IIQQ")
+# Archivo de progreso: commit_index, last_applied y crc32 de ambos
+PROGRESS_RECORD = struct.Struct(">QQI")
+SEGMENT_SUFFIX = ".seg"
+DEFAULT_SEGMENT_SIZE = 4 * 1024 * 1024
+# Durabilidad del log: "strict" hace fsync en cada append, "group" lo agrupa por
+# tiempo o bytes pendientes y "relaxed" deja el volcado al SO (sobrevive a la caída
+# del proceso, no a la de la máquina)
+DURABILITY_MODES = ("strict", "group", "relaxed")
+DEFAULT_SYNC_INTERVAL = 0.05
+DEFAULT_SYNC_BYTES = 1024 * 1024
+
+
+class LogEntry:
+    """Una entrada en el log de RAFT"""
+    __slots__ = ("term", "command", "index")
+
+    def __init__(self, term: int, command: str, index: int = None):
+        self.term = term
+        self.command = command
+        self.index = index
+
+    def to_dict(self):
+        return {"term": self.term, "command": self.command, "index": self.index}
+
+    @staticmethod
+    def from_dict(d):
+        return LogEntry(term=d["term"], command=d["command"], index=d.get("index"))
+
+
+class _Segment:
+    """Archivo de segmento: entradas consecutivas a partir de first_index.
+
+    En memoria solo se guardan el offset y el término de cada registro.
+    """
+    __slots__ = ("first_index", "path", "offsets", "terms", "size")
+
+    def __init__(self, first_index: int, path: str):
+        self.first_index = first_index
+        self.path = path
+        self.offsets = array("Q")
+        self.terms = array("Q")
+        self.size = 0
+
+    @property
+    def last_index(self) -> int:
+        return self.first_index + len(self.offsets) - 1
+
+
+class SegmentedLogStore:
+    """Log de RAFT append-only en segmentos de tamaño fijo.
+
+    Cada registro lleva longitud y checksum, así que escribir N entradas cuesta
+    O(N) sin importar el tamaño del log. Un registro incompleto al final del
+    último segmento (caída a mitad de escritura) se descarta al cargar.
+    Los comandos no se mantienen en memoria: `read_range` los lee del segmento
+    con un pread por segmento. Con durabilidad "group" el fsync se hace cuando
+    pasan `sync_interval` segundos o se acumulan `sync_bytes` sin sincronizar
+    (el dueño llama a `sync` periódicamente para no dejar una cola pendiente).
+    """
+
+    def __init__(self, directory: str, segment_size: int = DEFAULT_SEGMENT_SIZE,
+                 durability: str = "strict", sync_interval: float = DEFAULT_SYNC_INTERVAL,
+                 sync_bytes: int = DEFAULT_SYNC_BYTES):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Durabilidad desconocida: {durability} (opciones: {', '.join(DURABILITY_MODES)})")
+        self.directory = directory
+        self.segment_size = segment_size
+        self.durability = durability
+        self.sync_interval = sync_interval
+        self.sync_bytes = sync_bytes
+        self._segments: List[_Segment] = []
+        self._active = None
+        self._readers: Dict[str, int] = {}
+        self._unsynced = 0          # bytes escritos desde el último fsync
+        self._pending_fds: List[int] = []  # segmentos cerrados o truncados y directorio, sin fsync
+        self._last_sync = 0.0
+        os.makedirs(self.directory, exist_ok=True)
+
+    # ====================================================
+    # Lectura
+    # ====================================================
+
+    def load(self) -> int:
+        """Indexa todos los segmentos (offsets y términos) y devuelve el último índice."""
+        self.close()
+        self._segments = []
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith(SEGMENT_SUFFIX))
+        for name in names:
+            try:
+                first_index = int(name[: -len(SEGMENT_SUFFIX)])
+            except ValueError:
+                continue
+            segment = _Segment(first_index, os.path.join(self.directory, name))
+            expected = self._segments[-1].last_index + 1 if self._segments else first_index
+            if first_index != expected:
+                logger.error(f"Segmento {name} no es contiguo (esperado {expected}), se descarta")
+                os.remove(segment.path)
+                continue
+            self._read_segment(segment)
+            self._segments.append(segment)
+        return self.last_index()
+
+    def _read_segment(self, segment: _Segment):
+        with open(segment.path, "rb") as f:
+            data = f.read()
+        offset = 0
+        expected_index = segment.first_index
+        while offset + RECORD_HEADER.size <= len(data):
+            length, crc, index, term = RECORD_HEADER.unpack_from(data, offset)
+            start = offset + RECORD_HEADER.size
+            payload = data[start:start + length]
+            if len(payload) < length or index != expected_index or \
+                    zlib.crc32(payload, zlib.crc32(struct.pack(">QQ", index, term))) != crc:
+                break
+            segment.offsets.append(offset)
+            segment.terms.append(term)
+            offset = start + length
+            expected_index += 1
+        if offset != len(data):
+            logger.warning(f"⚠️ Registro corrupto o incompleto en {segment.path} (offset {offset}), truncando")
+            with open(segment.path, "r+b") as f:
+                f.truncate(offset)
+        segment.size = offset
+
+    def _locate(self, index: int) -> Optional[_Segment]:
+        i = bisect.bisect_right([s.first_index for s in self._segments], index) - 1
+        if i < 0:
+            return None
+        segment = self._segments[i]
+        return segment if index <= segment.last_index else None
+
+    def _reader(self, segment: _Segment) -> int:
+        fd = self._readers.get(segment.path)
+        if fd is None:
+            fd = os.open(segment.path, os.O_RDONLY)
+            self._readers[segment.path] = fd
+        return fd
+
+    def term_at(self, index: int) -> int:
+        segment = self._locate(index)
+        return segment.terms[index - segment.first_index] if segment else 0
+
+    def read_range(self, start: int, end: int, max_bytes: Optional[int] = None) -> List[LogEntry]:
+        """Entradas con índice en [start, end]; con `max_bytes` corta al superar ese
+        tamaño de comandos (siempre devuelve al menos una)."""
+        entries: List[LogEntry] = []
+        size = 0
+        index = start
+        while index <= end:
+            segment = self._locate(index)
+            if segment is None:
+                break
+            lo = index - segment.first_index
+            hi = min(end, segment.last_index) - segment.first_index
+            begin = segment.offsets[lo]
+            stop = segment.offsets[hi + 1] if hi + 1 < len(segment.offsets) else segment.size
+            data = memoryview(os.pread(self._reader(segment), stop - begin, begin))
+            pos = 0
+            for i in range(lo, hi + 1):
+                length = RECORD_HEADER.unpack_from(data, pos)[0]
+                if entries and max_bytes is not None and size + length > max_bytes:
+                    return entries
+                pos += RECORD_HEADER.size
+                entries.append(LogEntry(segment.terms[i], str(data[pos:pos + length], "utf-8"),
+                                        segment.first_index + i))
+                size += length
+                pos += length
+            index = segment.first_index + hi + 1
+        return entries
+
+    # ====================================================
+    # Escritura
+    # ====================================================
+
+    def append(self, entries: Iterable[Tuple[int, int, str]], sync: bool = True):
+        """Agrega entradas al final del log; en modo strict con un único fsync.
+
+        Con `sync=False` no hace fsync: el llamador lo hace fuera del event loop con
+        `begin_sync`/`end_sync`.
+        """
+        wrote = False
+        for index, term, command in entries:
+            segment = self._segment_for_append(index)
+            payload = command.encode("utf-8")
+            crc = zlib.crc32(payload, zlib.crc32(struct.pack(">QQ", index, term)))
+            record = RECORD_HEADER.pack(len(payload), crc, index, term) + payload
+            self._active.write(record)
+            segment.offsets.append(segment.size)
+            segment.terms.append(term)
+            segment.size += len(record)
+            self._unsynced += len(record)
+            wrote = True
+        if not wrote:
+            return
+        # Siempre llega al SO: read_range lee los segmentos con otro descriptor
+        self._active.flush()
+        if sync and self.sync_due():
+            self.sync()
+
+    def sync_due(self) -> bool:
+        """¿Toca fsync según el modo? (strict: siempre que haya algo pendiente)."""
+        if not (self._unsynced or self._pending_fds) or self.durability == "relaxed":
+            return False
+        if self.durability == "strict":
+            return True
+        return self._unsynced >= self.sync_bytes or time.monotonic() - self._last_sync >= self.sync_interval
+
+    def begin_sync(self) -> Optional[Tuple[List[int], int]]:
+        """Reclama lo pendiente para hacer fsync en otro hilo: (fds duplicados, bytes) o None.
+
+        Los duplicados siguen válidos aunque los segmentos se cierren mientras tanto;
+        quien los recibe hace `fsync_fds(fds)` y luego llama a `end_sync`.
+        """
+        if not (self._unsynced or self._pending_fds) or self.durability == "relaxed":
+            return None
+        fds, self._pending_fds = self._pending_fds, []
+        if self._active is not None and self._unsynced:
+            self._active.flush()
+            fds.append(os.dup(self._active.fileno()))
+        job = fds, self._unsynced
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        return job
+
+    def end_sync(self, job: Tuple[List[int], int], ok: bool = True):
+        if not ok:
+            # El próximo sync lo reintenta
+            self._pending_fds.extend(job[0])
+            self._unsynced += job[1]
+            return
+        for fd in job[0]:
+            os.close(fd)
+
+    def sync(self):
+        """Lleva a disco lo escrito desde el último fsync (en modo relaxed solo vuelca al SO).
+
+        Bloquea: en el event loop se usa `begin_sync`/`end_sync` con el ejecutor de disco.
+        """
+        job = self.begin_sync()
+        if job is not None:
+            try:
+                fsync_fds(job[0])
+            except OSError:
+                self.end_sync(job, ok=False)
+                raise
+            self.end_sync(job)
+        elif self._active is not None:
+            self._active.flush()
+        self._unsynced = 0
+
+    def _retire_active(self):
+        """Cierra el segmento activo sin fsync: lo pendiente queda para el próximo `begin_sync`."""
+        if self._active is None:
+            return
+        self._active.flush()
+        if self._unsynced and self.durability != "relaxed":
+            self._pending_fds.append(os.dup(self._active.fileno()))
+        self._active.close()
+        self._active = None
+
+    def _segment_for_append(self, index: int) -> _Segment:
+        last = self._segments[-1] if self._segments else None
+        if last is not None and index != last.last_index + 1:
+            raise ValueError(f"Entrada {index} no es contigua al log (último {last.last_index})")
+        if last is None or last.size >= self.segment_size:
+            self._retire_active()
+            last = _Segment(index, os.path.join(self.directory, f"{index:020d}{SEGMENT_SUFFIX}"))
+            self._segments.append(last)
+            self._active = open(last.path, "ab")
+            if self.durability == "strict":
+                # El segmento nuevo sobrevive a una caída cuando se sincroniza el directorio
+                self._pending_fds.append(os.open(self.directory, os.O_RDONLY))
+        elif self._active is None:
+            self._active = open(last.path, "ab")
+        return last
+
+    def truncate_from(self, index: int):
+        """Elimina las entradas con índice >= index (el fsync queda pendiente, como en `append`)."""
+        self._retire_active()
+        while self._segments and self._segments[-1].first_index >= index:
+            self._remove(self._segments.pop())
+        if not self._segments:
+            return
+        segment = self._segments[-1]
+        keep = index - segment.first_index
+        if keep < len(segment.offsets):
+            segment.size = segment.offsets[keep]
+            del segment.offsets[keep:]
+            del segment.terms[keep:]
+            fd = os.open(segment.path, os.O_WRONLY)
+            os.ftruncate(fd, segment.size)
+            if self.durability == "relaxed":
+                os.close(fd)
+            else:
+                self._pending_fds.append(fd)
+
+    def compact_prefix(self, index: int):
+        """Borra los segmentos cuyas entradas están todas cubiertas por un snapshot."""
+        while self._segments and self._segments[0].last_index <= index:
+            if len(self._segments) == 1:
+                self._retire_active()
+            self._remove(self._segments.pop(0))
+
+    def reset(self, entries: Iterable[Tuple[int, int, str]]):
+        """Reemplaza el log completo (p.ej. al adoptar el log de otro nodo)."""
+        self._retire_active()
+        for segment in self._segments:
+            self._remove(segment)
+        self._segments = []
+        self.append(entries)
+
+    def _remove(self, segment: _Segment):
+        fd = self._readers.pop(segment.path, None)
+        if fd is not None:
+            os.close(fd)
+        os.remove(segment.path)
+
+    def first_index(self) -> int:
+        return self._segments[0].first_index if self._segments else 0
+
+    def last_index(self) -> int:
+        return self._segments[-1].last_index if self._segments else 0
+
+    def close(self):
+        """Cierra el segmento activo sincronizando lo pendiente según el modo (bloquea)."""
+        self.sync()
+        if self._active:
+            self._active.close()
+            self._active = None
+
+
+class CompactLog:
+    """Log en memoria posterior al snapshot, respaldado por un SegmentedLogStore.
+
+    Se comporta como la lista de LogEntry que era antes (len, índices y slices
+    relativos a `base`, iteración), pero en memoria solo viven los arrays de
+    términos y offsets de cada segmento: las entradas se materializan al leerlas.
+    """
+
+    def __init__(self, store: SegmentedLogStore, base: int = 0):
+        self.store = store
+        self.base = base  # índice del snapshot: la posición 0 es base + 1
+
+    def __len__(self) -> int:
+        return max(0, self.store.last_index() - self.base)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __getitem__(self, key):
+        n = len(self)
+        if isinstance(key, slice):
+            start, stop, step = key.indices(n)
+            if step != 1:
+                raise ValueError("CompactLog solo admite slices contiguos")
+            if start >= stop:
+                return []
+            return self.store.read_range(self.base + start + 1, self.base + stop)
+        if key < 0:
+            key += n
+        if not 0 <= key < n:
+            raise IndexError("índice fuera del log")
+        return self.store.read_range(self.base + key + 1, self.base + key + 1)[0]
+
+    def __iter__(self):
+        index, last = self.base + 1, self.store.last_index()
+        while index <= last:
+            chunk = self.store.read_range(index, min(last, index + 1023))
+            if not chunk:
+                return
+            yield from chunk
+            index += len(chunk)
+
+
+class ProgressFile:
+    """Registro fijo de commit_index/last_applied sobrescrito en el lugar.
+
+    Se escribe con un único pwrite y sin fsync: sobrevive a la caída del
+    proceso, y si el SO pierde la última escritura los valores se recuperan
+    de los metadatos y del log. Un registro con crc inválido se ignora.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def read(self) -> Tuple[int, int]:
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read(PROGRESS_RECORD.size)
+        except FileNotFoundError:
+            return 0, 0
+        if len(data) < PROGRESS_RECORD.size:
+            return 0, 0
+        commit_index, last_applied, crc = PROGRESS_RECORD.unpack(data)
+        if zlib.crc32(data[:16]) != crc:
+            logger.warning(f"⚠️ Archivo de progreso corrupto en {self.path}, se ignora")
+            return 0, 0
+        return commit_index, last_applied
+
+    def write(self, commit_index: int, last_applied: int):
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        head = struct.pack(">QQ", commit_index, last_applied)
+        os.pwrite(self._fd, head + struct.pack(">I", zlib.crc32(head)), 0)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def write_json_atomic(path: str, data: dict, durable: bool = True):
+    """Escribe un JSON pequeño vía archivo temporal + rename atómico.
+
+    Con `durable` hace fsync del archivo y del directorio: el rename sobrevive a
+    una caída de la máquina. Sin él solo es atómico frente a la caída del proceso.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+        if durable:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if durable:
+        fsync_dir(os.path.dirname(path) or ".")
+
+
+def fsync_fds(fds: Iterable[int]):
+    """fsync de varios descriptores (para correr en el ejecutor de disco)."""
+    for fd in fds:
+        os.fsync(fd)
+
+
+def fsync_dir(directory: str):
+    """fsync de un directorio para que sobrevivan archivos creados o renombrados."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def segment_dir_for(state_file: str) -> str:
+    """Directorio de segmentos asociado a un archivo de estado."""
+    return os.path.splitext(state_file)[0] + "_log"
+
+
+def snapshot_path_for(state_file: str) -> str:
+    """Archivo de snapshot de la máquina de estado asociado a un archivo de estado."""
+    return os.path.splitext(state_file)[0] + "_snapshot"
+
+
+def progress_path_for(state_file: str) -> str:
+    """Archivo de progreso (commit/applied) asociado a un archivo de estado."""
+    return os.path.splitext(state_file)[0] + "_progress"
+
+
+def entries_as_records(entries) -> List[Tuple[int, int, str]]:
+    return [(e.index, e.term, e.command) for e in entries]
+
@@ -0,0 +1,44 @@
+import json
+from typing import List, Optional, Tuple
+
+# La membresía de un shard viaja en el log como una entrada más: cada nodo adopta
+# la última configuración de su log apenas la agrega (sin esperar el commit) y la
+# máquina de estado de la aplicación nunca la ve.
+CONFIG_ENTRY_TYPE = "RAFT_CONFIG"
+_CONFIG_PREFIX = json.dumps({"type": CONFIG_ENTRY_TYPE})[:-1]
+
+
+def config_command(voters: List[str], learners: List[str]) -> str:
+    """Comando de log para una configuración (votantes, con el líder, y learners)."""
+    return json.dumps({"type": CONFIG_ENTRY_TYPE, "payload": {"voters": voters, "learners": learners}})
+
+
+def is_config_command(command: str) -> bool:
+    return command.startswith(_CONFIG_PREFIX)
+
+
+def parse_config_command(command: str) -> Optional[dict]:
+    """Configuración de una entrada de log, o None si es un comando de la aplicación."""
+    if not is_config_command(command):
+        return None
+    payload = json.loads(command)["payload"]
+    return {"voters": list(payload.get("voters", [])), "learners": list(payload.get("learners", []))}
+
+
+def next_config_step(voters: List[str], learners: List[str],
+                     members: List[str]) -> Optional[Tuple[List[str], List[str]]]:
+    """Siguiente configuración hacia `members` cambiando a lo sumo un votante.
+
+    Los miembros nuevos entran juntos como learners y los learners que sobran salen:
+    ninguno cuenta para el quórum. Los votantes que sobran salen de a uno. Devuelve
+    (votantes, learners), o None si la configuración ya es la buscada.
+    """
+    target = set(members)
+    next_learners = [p for p in learners if p in target]
+    next_learners += [p for p in members if p not in voters and p not in learners]
+    if next_learners != list(learners):
+        return list(voters), next_learners
+    for voter in voters:
+        if voter not in target:
+            return [v for v in voters if v != voter], list(learners)
+    return None
@@ -0,0 +1,314 @@
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Métricas en proceso con costo mínimo en el camino caliente: un incremento o un
+# bisect por observación, sin locks (todo corre en el event loop). Se exportan en
+# formato de texto de Prometheus.
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def log_linear_bounds(lowest: float, highest: float, sub_buckets: int = 2) -> List[float]:
+    """Límites de buckets estilo HDR: cada potencia de 2 dividida en `sub_buckets` lineales."""
+    bounds = [lowest]
+    base = lowest
+    while bounds[-1] < highest:
+        for i in range(1, sub_buckets + 1):
+            bounds.append(float(f"{base * (1 + i / sub_buckets):.6g}"))
+        base *= 2
+    return bounds
+
+
+LATENCY_BOUNDS = log_linear_bounds(50e-6, 60.0)       # 50 µs .. ~1 min
+SIZE_BOUNDS = log_linear_bounds(64, 64 * 1024 * 1024)  # bytes
+COUNT_BOUNDS = log_linear_bounds(1, 8192)              # entradas por mensaje/lote
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: List[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # el último es +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Cota superior del bucket que contiene el cuantil `q` (0 sin muestras)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Family:
+    """Una métrica con sus series por combinación de etiquetas."""
+
+    def __init__(self, name: str, kind: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 bounds: Optional[List[float]] = None):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.labelnames = labelnames
+        self.bounds = bounds
+        self.series: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values):
+        child = self.series.get(values)
+        if child is None:
+            child = Histogram(self.bounds) if self.kind == "histogram" else _Value()
+            self.series[values] = child
+        return child
+
+    # Atajos para métricas sin etiquetas
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+
+class Metrics:
+    """Registro de métricas de un nodo (o del proceso), con etiquetas fijas."""
+
+    def __init__(self, **const_labels: str):
+        self.const_labels = const_labels
+        self.families: Dict[str, Family] = {}
+        # Gauges que se calculan al exportar: fn() -> valor o [(valores_etiquetas, valor)]
+        self._collectors: List[Tuple[Family, Callable]] = []
+
+    def _family(self, name: str, kind: str, help_text: str, labelnames: Iterable[str],
+                bounds: Optional[List[float]] = None) -> Family:
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = Family(name, kind, help_text, tuple(labelnames), bounds)
+        return family
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Family:
+        return self._family(name, "counter", help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Family:
+        return self._family(name, "gauge", help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                  bounds: List[float] = LATENCY_BOUNDS) -> Family:
+        return self._family(name, "histogram", help_text, labelnames, bounds)
+
+    def collect(self, name: str, help_text: str, fn: Callable, labelnames: Iterable[str] = (),
+                kind: str = "gauge"):
+        """Registra un gauge (o counter) leído del estado del nodo en cada exportación."""
+        self._collectors.append((self._family(name, kind, help_text, labelnames), fn))
+
+    def refresh(self):
+        for family, fn in self._collectors:
+            try:
+                value = fn()
+            except Exception:
+                continue
+            if isinstance(value, list):
+                family.series = {}
+                for labels, v in value:
+                    family.labels(*labels).set(v)
+            else:
+                family.labels().set(value)
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def render_prometheus(*registries: Metrics) -> str:
+    """Texto de Prometheus; las familias con el mismo nombre en varios registros
+    (p.ej. los grupos de un nodo Multi-RAFT) se emiten juntas bajo un único HELP/TYPE."""
+    merged: Dict[str, List[Tuple[Family, Dict[str, str]]]] = {}
+    for registry in registries:
+        registry.refresh()
+        for family in registry.families.values():
+            merged.setdefault(family.name, []).append((family, registry.const_labels))
+    lines: List[str] = []
+    for name, parts in merged.items():
+        first = parts[0][0]
+        lines.append(f"# HELP {name} {first.help}")
+        lines.append(f"# TYPE {name} {first.kind}")
+        for family, const in parts:
+            names = tuple(const) + family.labelnames
+            for values, child in family.series.items():
+                values = tuple(const.values()) + values
+                if family.kind != "histogram":
+                    lines.append(f"{name}{_format_labels(names, values)} {_number(child.value)}")
+                    continue
+                cumulative = 0
+                for bound, n in zip(family.bounds, child.counts):
+                    cumulative += n
+                    le = 'le="%s"' % _number(bound)
+                    lines.append(f"{name}_bucket{_format_labels(names, values, le)} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{name}_bucket{_format_labels(names, values, le)} {child.count}")
+                lines.append(f"{name}_sum{_format_labels(names, values)} {_number(child.sum)}")
+                lines.append(f"{name}_count{_format_labels(names, values)} {child.count}")
+    return "\n".join(lines) + "\n"
+
+
+class _Section:
+    __slots__ = ("profiler", "name")
+
+    def __init__(self, profiler: "StackSampler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._active[self.name] = self.profiler._active.get(self.name, 0) + 1
+
+    def __exit__(self, *exc):
+        remaining = self.profiler._active[self.name] - 1
+        if remaining:
+            self.profiler._active[self.name] = remaining
+        else:
+            del self.profiler._active[self.name]
+
+    async def __aenter__(self):
+        self.__enter__()
+
+    async def __aexit__(self, *exc):
+        self.__exit__()
+
+
+_HANDLE_FILE = "asyncio/events.py".replace("/", os.sep)
+
+
+class StackSampler:
+    """Profiler por muestreo para secciones del camino caliente (append, replicación, aplicar).
+
+    Un hilo toma la pila del hilo del event loop cada `interval` segundos mientras
+    alguna sección está abierta y la acumula por sección en formato "collapsed"
+    (una línea `f1;f2;f3 muestras`, apto para flamegraph). Con corrutinas, la pila
+    muestreada es lo que corre en el loop mientras la sección está abierta.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 48):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples: Dict[str, _Tally] = {}
+        self._active: Dict[str, int] = {}
+        self._thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Empieza a muestrear el hilo que llama (el del event loop)."""
+        if self._thread is not None:
+            return
+        self._thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="raft-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def section(self, name: str) -> _Section:
+        return _Section(self, name)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            active = list(self._active)
+            if not active:
+                continue
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            stack = []
+            # Se corta en el callback del loop (Handle._run): lo de abajo es siempre igual
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                if code.co_name == "_run" and code.co_filename.endswith(_HANDLE_FILE):
+                    break
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            if frame is None:
+                stack = stack[:3]  # loop esperando en select(): basta el tope de la pila
+            collapsed = ";".join(reversed(stack))
+            for name in active:
+                self.samples.setdefault(name, _Tally())[collapsed] += 1
+
+    def collapsed(self, section: Optional[str] = None, limit: int = 200) -> str:
+        """Pilas más frecuentes de una sección (o de todas) en formato collapsed."""
+        tally = _Tally()
+        for name, counts in self.samples.items():
+            if section is None or name == section:
+                tally.update(counts)
+        return "".join(f"{stack} {n}\n" for stack, n in tally.most_common(limit))
+
+
+class _Timer:
+    """Mide la duración de un bloque en un histograma y, si hay profiler, lo abre como sección."""
+    __slots__ = ("histogram", "section", "start")
+
+    def __init__(self, histogram: Histogram, section):
+        self.histogram = histogram
+        self.section = section
+        self.start = 0.0
+
+    def __enter__(self):
+        if self.section is not None:
+            self.section.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        if self.section is not None:
+            self.section.__exit__()
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc):
+        self.__exit__()
+
+
+def timed(histogram: Histogram, profiler: Optional[StackSampler] = None, section: str = "") -> _Timer:
+    return _Timer(histogram, profiler.section(section) if profiler is not None else None)
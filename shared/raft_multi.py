@@ -0,0 +1,153 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import TYPE_CHECKING, Dict, List, Optional
+from urllib.parse import urlparse
+
+from shared.raft_transport import (
+    MSG_HEARTBEAT_BATCH,
+    PeerClientPool,
+    PeerStreamClient,
+    StreamUnavailable,
+    group_key,
+    peer_origin,
+    serve_peer_stream,
+)
+from shared.raft_wire import decode_heartbeat_batch, encode_append_entries, encode_heartbeat_batch
+
+if TYPE_CHECKING:
+    from shared.raft import RaftNode
+
+logger = logging.getLogger("raft")
+
+
+class RaftGroupHost:
+    """Aloja varios grupos RAFT (uno por shard) en un mismo proceso.
+
+    Los grupos comparten las sesiones HTTP, un único stream por proceso peer y el
+    servidor del stream, que despacha cada mensaje al grupo indicado en el frame.
+    Los heartbeats ociosos de todos los grupos hacia un mismo proceso salen juntos
+    en un MSG_HEARTBEAT_BATCH por tick, en vez de uno por grupo y peer.
+    """
+
+    def __init__(self, self_url: str, stream_port_offset: Optional[int] = None,
+                 http_pool: Optional[PeerClientPool] = None, tick: float = 0.25):
+        self.self_url = self_url
+        self.stream_port_offset = stream_port_offset
+        self.http = http_pool or PeerClientPool()
+        self.stream = PeerStreamClient(stream_port_offset) if stream_port_offset else None
+        self.tick = tick
+        self.groups: Dict[str, "RaftNode"] = {}
+        self._stream_server: Optional[asyncio.AbstractServer] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, node: "RaftNode"):
+        """Suma un RaftNode al host; su grupo es el path de su self_url."""
+        node.http = self.http
+        node.stream = self.stream
+        node.group_host = self
+        self.groups[group_key(node.self_url)] = node
+        # Con tick más largo que el intervalo de un grupo sus heartbeats llegarían tarde
+        self.tick = min(self.tick, node.heartbeat_interval / 4)
+
+    async def start(self):
+        if self.stream is not None:
+            await self._serve_stream()
+        self._task = asyncio.create_task(self._heartbeat_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self._stream_server is not None:
+            self._stream_server.close()
+        if self.stream is not None:
+            await self.stream.close()
+        await self.http.close()
+
+    # ====================================================
+    # Stream compartido
+    # ====================================================
+
+    async def _serve_stream(self):
+        port = urlparse(self.self_url).port
+        if not port:
+            logger.warning(f"Sin puerto en {self.self_url}: los peers usarán HTTP")
+            return
+        try:
+            self._stream_server = await serve_peer_stream("0.0.0.0", port + self.stream_port_offset,
+                                                          self._handle_message)
+        except OSError as e:
+            logger.warning(f"No pude abrir el stream en {port + self.stream_port_offset}: {e}")
+            return
+        logger.info(f"🔌 Stream Multi-RAFT ({len(self.groups)} grupos) escuchando en el puerto "
+                    f"{port + self.stream_port_offset}")
+
+    async def _handle_message(self, kind: int, group: str, body: bytes) -> bytes:
+        if kind == MSG_HEARTBEAT_BATCH:
+            items = decode_heartbeat_batch(body)
+            results = await asyncio.gather(*(self._receive_heartbeat(g, data) for g, data in items))
+            return json.dumps(results).encode("utf-8")
+        node = self.groups.get(group)
+        if node is None:
+            raise ValueError(f"Grupo RAFT desconocido: {group!r}")
+        return await node._handle_stream_message(kind, body)
+
+    async def _receive_heartbeat(self, group: str, data: dict) -> Optional[dict]:
+        node = self.groups.get(group)
+        if node is None:
+            return None
+        return await node.receive_append_entries(
+            data["term"], data["leader_id"], data["entries"],
+            data["prev_log_index"], data["prev_log_term"], data["leader_commit"])
+
+    # ====================================================
+    # Heartbeats en lote
+    # ====================================================
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            by_origin: Dict[str, List[tuple]] = defaultdict(list)
+            for node in self.groups.values():
+                # Se adelantan hasta un tick para que coincidan con los de otros grupos
+                for peer, data, reply in node.collect_heartbeats(horizon=self.tick):
+                    by_origin[peer_origin(peer)].append((node, peer, data, reply))
+            for items in by_origin.values():
+                asyncio.create_task(self._send_batch(items))
+
+    async def _send_batch(self, items: List[tuple]):
+        """Envía los heartbeats de un proceso peer juntos; sin stream, uno a uno por HTTP."""
+        if self.stream is not None:
+            body = encode_heartbeat_batch([(group_key(peer), encode_append_entries(data))
+                                           for _, peer, data, _ in items])
+            try:
+                timeout = min(node.replication_timeout for node, _, _, _ in items)
+                raw = await self.stream.call(items[0][1], MSG_HEARTBEAT_BATCH, body, timeout=timeout, group="")
+                for (_, peer, _, reply), result in zip(items, json.loads(raw)):
+                    if reply.done():
+                        continue
+                    if result is None:
+                        reply.set_exception(ConnectionError(f"{peer} no aloja el grupo"))
+                    else:
+                        reply.set_result(result)
+                return
+            except StreamUnavailable:
+                pass
+            except Exception as e:
+                for _, _, _, reply in items:
+                    if not reply.done():
+                        reply.set_exception(e)
+                return
+        await asyncio.gather(*(self._send_single(node, peer, data, reply) for node, peer, data, reply in items))
+
+    @staticmethod
+    async def _send_single(node, peer: str, data: dict, reply: asyncio.Future):
+        try:
+            result = await node._send_append_entries(peer, data)
+        except Exception as e:
+            if not reply.done():
+                reply.set_exception(e)
+            return
+        if not reply.done():
+            reply.set_result(result)
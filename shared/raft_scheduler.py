@@ -0,0 +1,102 @@
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Deque, List, Optional
+
+# Prioridades del lock del nodo (menor = antes): votos, heartbeats y Bully nunca
+# esperan detrás de la replicación (AppendEntries con entradas, snapshots, puesta al día)
+PRIORITY_CONSENSUS = 0
+PRIORITY_REPLICATION = 1
+
+
+class Overloaded(Exception):
+    """El nodo rechaza trabajo por saturación; reintentar tras `retry_after` segundos.
+
+    `status` es el código HTTP sugerido: 429 (cola de propuestas llena) o 503
+    (el nodo no puede aceptar escrituras por ahora, p.ej. cediendo el liderazgo).
+    """
+
+    def __init__(self, message: str, retry_after: float = 1.0, status: int = 429):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status = status
+
+
+class PriorityLock:
+    """Lock asyncio con una cola FIFO por prioridad.
+
+    Al liberarse se concede al primero de la prioridad más alta que espera, así un
+    voto o heartbeat adelanta a los AppendEntries de puesta al día encolados.
+    `async with lock:` toma el lock con prioridad de replicación; `lock.hold(p)`
+    elige la prioridad. Si hay `observer`, al liberar recibe (prioridad, espera, tenencia).
+    """
+
+    def __init__(self, levels: int = 2,
+                 observer: Optional[Callable[[int, float, float], None]] = None):
+        self._locked = False
+        self._waiters: List[Deque[asyncio.Future]] = [deque() for _ in range(levels)]
+        self.observer = observer
+        self._holder = (0, 0.0, 0.0)  # prioridad, pedido y concesión del dueño actual
+
+    def locked(self) -> bool:
+        return self._locked
+
+    def waiting(self, priority: int) -> int:
+        """Tareas esperando el lock con esa prioridad."""
+        return len(self._waiters[priority])
+
+    async def acquire(self, priority: int = PRIORITY_REPLICATION):
+        requested = time.perf_counter()
+        if not self._locked and not any(self._waiters):
+            self._locked = True
+            self._holder = (priority, requested, requested)
+            return
+        future = asyncio.get_running_loop().create_future()
+        queue = self._waiters[priority]
+        queue.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._holder = (priority, requested, time.perf_counter())
+                self.release()  # nos lo cedieron justo al cancelar: pasa al siguiente
+            elif future in queue:
+                queue.remove(future)  # si no, release() ya lo sacó al saltar los cancelados
+            raise
+        self._holder = (priority, requested, time.perf_counter())
+
+    def release(self):
+        """Cede el lock al siguiente por prioridad (sigue tomado) o lo libera."""
+        if self.observer is not None:
+            priority, requested, granted = self._holder
+            self.observer(priority, granted - requested, time.perf_counter() - granted)
+        for queue in self._waiters:
+            while queue:
+                future = queue.popleft()
+                if not future.done():
+                    future.set_result(True)
+                    return
+        self._locked = False
+
+    def hold(self, priority: int) -> "_Hold":
+        return _Hold(self, priority)
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+class _Hold:
+    __slots__ = ("lock", "priority")
+
+    def __init__(self, lock: PriorityLock, priority: int):
+        self.lock = lock
+        self.priority = priority
+
+    async def __aenter__(self):
+        await self.lock.acquire(self.priority)
+
+    async def __aexit__(self, *exc):
+        self.lock.release()
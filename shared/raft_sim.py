@@ -0,0 +1,428 @@
+import asyncio
+import contextvars
+import os
+import random
+import selectors
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, TypeVar
+from urllib.parse import urlparse
+
+import shared.raft as raft_module
+from shared.raft import RaftNode
+from shared.raft_log import LogEntry
+from shared.raft_wire import SYNC_CONTENT_TYPE
+
+# Simulación determinista de un cluster RAFT en un solo proceso: N RaftNode reales
+# hablan por una red en memoria (latencia, pérdidas, particiones) sobre un event loop
+# con reloj virtual. Las esperas (timeouts de elección, heartbeats, latencia de red)
+# no consumen tiempo real, así que el costo medido es el CPU del núcleo de consenso.
+# Con la misma semilla y las mismas operaciones, la ejecución se repite igual.
+#
+# Limitaciones: los nodos usan durabilidad "relaxed" por defecto (un fsync en el hilo
+# de disco correría en tiempo real y desordenaría el reloj virtual; el costo de disco
+# lo mide tests/bench_durability.py) y no hay snapshots de la máquina de estado.
+
+T = TypeVar("T")
+
+# Nodo dueño de la tarea que corre: las tareas heredan el contexto de quien las crea.
+# Para crear una tarea de otro nodo se llama a create_task dentro de su contexto
+# (Context.run), sin el argumento `context=` que recién existe en Python 3.11
+_current_node: contextvars.ContextVar = contextvars.ContextVar("raft_sim_node", default=None)
+
+SIM_EPOCH = 1_700_000_000.0  # time.time() simulado = SIM_EPOCH + reloj del loop
+
+
+class _VirtualSelector:
+    """Selector que, sin eventos listos, adelanta el reloj hasta el próximo timer."""
+
+    def __init__(self, loop: "SimLoop"):
+        self._loop = loop
+        self._selector = selectors.DefaultSelector()
+
+    def select(self, timeout: Optional[float] = None):
+        events = self._selector.select(0)
+        if events:
+            return events
+        if timeout is None:
+            return self._selector.select(1.0)  # sin timers: solo un hilo puede despertarnos
+        self._loop.advance(timeout)
+        return events
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+
+class SimLoop(asyncio.SelectorEventLoop):
+    """Event loop con reloj virtual que registra las tareas de cada nodo simulado."""
+
+    def __init__(self):
+        self._now = 0.0
+        self.node_tasks: Dict[str, Set[asyncio.Task]] = {}
+        super().__init__(_VirtualSelector(self))
+        self.set_task_factory(self._make_task)
+
+    def time(self) -> float:
+        return self._now
+
+    def advance(self, seconds: float):
+        self._now += max(0.0, seconds)
+
+    def _make_task(self, loop, coro, context=None):
+        if context is None:
+            task = asyncio.Task(coro, loop=loop)
+            owner = _current_node.get()
+        else:  # create_task(..., context=) de quien use el simulador en 3.11+
+            task = asyncio.Task(coro, loop=loop, context=context)
+            owner = context.get(_current_node)
+        if owner is not None:
+            tasks = self.node_tasks.setdefault(owner, set())
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        return task
+
+
+class _SimTime:
+    """Reemplaza al módulo time dentro de shared.raft: time() sigue al reloj virtual."""
+
+    def __init__(self, loop: SimLoop):
+        self._loop = loop
+
+    def time(self) -> float:
+        return SIM_EPOCH + self._loop.time()
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+@contextmanager
+def _simulated_raft(loop: SimLoop, seed: int):
+    saved = raft_module.time, raft_module.random
+    raft_module.time = _SimTime(loop)
+    raft_module.random = random.Random(seed)  # timeouts de elección reproducibles
+    try:
+        yield
+    finally:
+        raft_module.time, raft_module.random = saved
+
+
+def run_simulation(main: Callable[[], Awaitable[T]], seed: int = 0) -> T:
+    """Ejecuta `main()` en un SimLoop nuevo con shared.raft sobre el reloj virtual."""
+    loop = SimLoop()
+    try:
+        with _simulated_raft(loop, seed):
+            return loop.run_until_complete(main())
+    finally:
+        loop.run_until_complete(_cancel_all())
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+
+async def _cancel_all():
+    pending = asyncio.all_tasks() - {asyncio.current_task()}
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+
+# ====================================================
+# Red en memoria
+# ====================================================
+
+class SimNetwork:
+    """Red entre nodos simulados: latencia por sentido, pérdidas y particiones.
+
+    Un mensaje a un nodo caído falla con ConnectionRefusedError; uno perdido o
+    que cruza una partición agota el timeout del llamador, como en TCP real.
+    """
+
+    def __init__(self, latency: float = 0.001, jitter: float = 0.0005, loss: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.nodes: Dict[str, RaftNode] = {}
+        self.contexts: Dict[str, contextvars.Context] = {}
+        self.down: Set[str] = set()
+        self._side: Dict[str, int] = {}
+        self.messages = 0
+        self.dropped = 0
+
+    def partition(self, *groups: Iterable[str]):
+        """Separa los nodos en grupos aislados; los no listados quedan juntos."""
+        self._side = {url: i for i, group in enumerate(groups) for url in group}
+
+    def heal(self):
+        self._side = {}
+
+    def reachable(self, src: str, dst: str) -> bool:
+        return self._side.get(src, -1) == self._side.get(dst, -1)
+
+    def _delay(self) -> float:
+        return self.latency + self.rng.uniform(0.0, self.jitter)
+
+    def _lost(self, src: str, dst: str) -> bool:
+        if not self.reachable(src, dst) or (self.loss and self.rng.random() < self.loss):
+            self.dropped += 1
+            return True
+        return False
+
+    async def call(self, src: str, dst: str, handler: Callable[[RaftNode], Awaitable[T]], timeout: float) -> T:
+        """Entrega `handler(nodo destino)` en el contexto del destino y devuelve su respuesta."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        self.messages += 1
+        if dst in self.down or dst not in self.nodes:
+            await asyncio.sleep(self._delay())
+            raise ConnectionRefusedError(f"{dst} caído")
+        if self._lost(src, dst):
+            await asyncio.sleep(timeout)
+            raise asyncio.TimeoutError()
+        await asyncio.sleep(self._delay())
+        node = self.nodes.get(dst)
+        if node is None:
+            raise ConnectionResetError(f"{dst} se cayó")
+        task = self.contexts[dst].run(asyncio.create_task, handler(node))
+        done, _ = await asyncio.wait({task}, timeout=max(0.0, deadline - loop.time()))
+        if not done:
+            raise asyncio.TimeoutError()
+        if task.cancelled():
+            raise ConnectionResetError(f"{dst} se cayó atendiendo el mensaje")
+        if task.exception() is not None:
+            raise RuntimeError(str(task.exception()))
+        if self._lost(dst, src):
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+            raise asyncio.TimeoutError()
+        await asyncio.sleep(self._delay())
+        return task.result()
+
+
+class SimStream:
+    """Stream entre peers sobre SimNetwork (la interfaz de PeerStreamClient que usa RaftNode)."""
+
+    def __init__(self, network: SimNetwork, url: str):
+        self.network = network
+        self.url = url
+
+    async def call(self, peer: str, kind: int, body: bytes, timeout: float = 3.0,
+                   group: Optional[str] = None) -> bytes:
+        return await self.network.call(self.url, peer, lambda node: node._handle_stream_message(kind, body), timeout)
+
+    async def reset(self, peers: Iterable[str]):
+        pass
+
+    async def close(self):
+        pass
+
+
+class _SimResponse:
+    def __init__(self, status: int, payload=None, body: bytes = b"", content_type: str = "application/json"):
+        self.status = status
+        self.content_type = content_type
+        self._payload = payload
+        self.content = asyncio.StreamReader()
+        self.content.feed_data(body)
+        self.content.feed_eof()
+
+    async def json(self):
+        return self._payload
+
+    async def read(self) -> bytes:
+        return await self.content.read()
+
+
+# Rutas HTTP entre peers que usa RaftNode (anti-entropía y puesta al día), como en raft_node.py
+async def _log_summary(node: RaftNode, params: dict) -> _SimResponse:
+    return _SimResponse(200, node.log_summary())
+
+
+async def _log_digest(node: RaftNode, params: dict) -> _SimResponse:
+    return _SimResponse(200, node.log_digest(int(params.get("start", 1)), int(params.get("end", 0)),
+                                             int(params.get("buckets", 16))))
+
+
+async def _log_range(node: RaftNode, params: dict) -> _SimResponse:
+    entries = node.log_range(int(params["start"]), int(params["end"]))
+    return _SimResponse(200, {"entries": [e.to_dict() for e in entries]})
+
+
+async def _sync(node: RaftNode, params: dict) -> _SimResponse:
+    if params.get("from_index") is None:
+        return _SimResponse(404, {"detail": "Solo /raft/sync en stream"})
+    body = b"".join([chunk async for chunk in node.sync_stream(int(params["from_index"]))])
+    return _SimResponse(200, body=body, content_type=SYNC_CONTENT_TYPE)
+
+
+_HTTP_ROUTES = {
+    "/raft/log/summary": _log_summary,
+    "/raft/log/digest": _log_digest,
+    "/raft/log/range": _log_range,
+    "/raft/sync": _sync,
+}
+
+
+class _SimRequest:
+    def __init__(self, network: SimNetwork, src: str, peer: str, path: str, params: Optional[dict], timeout: float):
+        self.network = network
+        self.src = src
+        self.peer = peer
+        self.path = path
+        self.params = params or {}
+        self.timeout = timeout
+
+    async def _serve(self, node: RaftNode) -> _SimResponse:
+        route = _HTTP_ROUTES.get(self.path)
+        if route is None:
+            return _SimResponse(404, {"detail": "Not Found"})
+        return await route(node, self.params)
+
+    async def __aenter__(self) -> _SimResponse:
+        return await self.network.call(self.src, self.peer, self._serve, self.timeout)
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+class SimHttp:
+    """HTTP entre peers sobre SimNetwork (la interfaz de PeerClientPool que usa RaftNode)."""
+
+    def __init__(self, network: SimNetwork, url: str, default_timeout: float = 3.0):
+        self.network = network
+        self.url = url
+        self.default_timeout = default_timeout
+
+    def get(self, peer: str, path: str, timeout: Optional[float] = None, params: Optional[dict] = None, **kwargs):
+        return _SimRequest(self.network, self.url, peer, path, params, timeout or self.default_timeout)
+
+    def post(self, peer: str, path: str, timeout: Optional[float] = None, params: Optional[dict] = None, **kwargs):
+        return _SimRequest(self.network, self.url, peer, path, params, timeout or self.default_timeout)
+
+    def stream(self, peer: str, path: str, read_timeout: Optional[float] = None,
+               params: Optional[dict] = None, **kwargs):
+        return _SimRequest(self.network, self.url, peer, path, params, 60.0)
+
+    async def reset(self, peers: Iterable[str]):
+        pass
+
+    async def close(self):
+        pass
+
+
+# ====================================================
+# Cluster simulado
+# ====================================================
+
+class SimCluster:
+    """N RaftNode sobre una SimNetwork; usar dentro de run_simulation.
+
+    Los nodos son http://sim1 .. http://simN (la prioridad Bully crece con el número)
+    y guardan su estado en `data_dir`. La máquina de estado de cada nodo es la lista
+    `applied[url]` de comandos aplicados, que sobrevive a crash/restart como una base
+    en disco. Las opciones extra se pasan a RaftNode.
+    """
+
+    def __init__(self, size: int = 3, network: Optional[SimNetwork] = None,
+                 data_dir: Optional[str] = None, **node_options):
+        self.network = network or SimNetwork()
+        self.urls = [f"http://sim{i}" for i in range(1, size + 1)]
+        self._own_dir = data_dir is None
+        self.data_dir = data_dir or tempfile.mkdtemp(prefix="raft_sim_")
+        self.node_options = {"heartbeat_interval": 1.0, "election_timeout_range": (2.0, 4.0),
+                             "durability": "relaxed", **node_options}
+        self.applied: Dict[str, List[str]] = {url: [] for url in self.urls}
+
+    @property
+    def nodes(self) -> Dict[str, RaftNode]:
+        return self.network.nodes
+
+    def now(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    def _make_node(self, url: str) -> RaftNode:
+        name = urlparse(url).hostname
+
+        async def apply_batch(entries: List[LogEntry]):
+            self.applied[url].extend(e.command for e in entries)
+
+        return RaftNode(
+            node_id=name,
+            peers=[peer for peer in self.urls if peer != url],
+            state_file=os.path.join(self.data_dir, f"{name}_state.json"),
+            self_url=url,
+            apply_batch_callback=apply_batch,
+            http_pool=SimHttp(self.network, url),
+            stream_client=SimStream(self.network, url),
+            **self.node_options,
+        )
+
+    async def start(self):
+        for url in self.urls:
+            await self.start_node(url)
+
+    async def start_node(self, url: str) -> RaftNode:
+        """Arranca (o reinicia tras un crash) un nodo con el estado que dejó en disco."""
+        context = contextvars.copy_context()
+        context.run(_current_node.set, url)
+        node = context.run(self._make_node, url)
+        self.network.contexts[url] = context
+        self.network.nodes[url] = node
+        self.network.down.discard(url)
+        await context.run(asyncio.create_task, node.start())
+        return node
+
+    async def crash(self, url: str):
+        """Detiene el nodo de golpe: cancela sus tareas y deja de recibir mensajes."""
+        self.network.down.add(url)
+        node = self.network.nodes.pop(url, None)
+        loop = asyncio.get_running_loop()
+        tasks = list(loop.node_tasks.get(url, ()))
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if node is not None:
+            node.log_store.close()
+
+    async def restart(self, url: str) -> RaftNode:
+        await self.crash(url)
+        return await self.start_node(url)
+
+    def leader(self) -> Optional[RaftNode]:
+        """Líder vivo de término más alto (None si no hay)."""
+        leaders = [node for node in self.nodes.values() if node.is_leader()]
+        return max(leaders, key=lambda node: node.current_term) if leaders else None
+
+    async def wait_until(self, predicate: Callable[[], bool], timeout: float = 30.0, step: float = 0.01) -> bool:
+        deadline = self.now() + timeout
+        while not predicate():
+            if self.now() >= deadline:
+                return False
+            await asyncio.sleep(step)
+        return True
+
+    async def wait_leader(self, timeout: float = 30.0) -> Optional[RaftNode]:
+        await self.wait_until(lambda: self.leader() is not None, timeout)
+        return self.leader()
+
+    async def propose(self, command: str) -> Optional[LogEntry]:
+        """Propone en el líder actual (None sin líder o si no alcanzó mayoría)."""
+        leader = self.leader()
+        if leader is None:
+            return None
+        return await self.run_on(leader.self_url, leader.propose(command))
+
+    async def run_on(self, url: str, coro: Awaitable[T]) -> T:
+        """Corre `coro` como tarea del nodo `url` (muere con él si se cae)."""
+        return await self.network.contexts[url].run(asyncio.create_task, coro)
+
+    def consistent(self) -> bool:
+        """¿Lo aplicado en cada nodo es prefijo de lo aplicado en el más avanzado?"""
+        longest = max(self.applied.values(), key=len)
+        return all(applied == longest[:len(applied)] for applied in self.applied.values())
+
+    async def close(self):
+        for url in list(self.nodes):
+            await self.crash(url)
+        if self._own_dir:
+            shutil.rmtree(self.data_dir, ignore_errors=True)
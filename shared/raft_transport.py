@@ -0,0 +1,281 @@
+import asyncio
+import itertools
+import logging
+import struct
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+
+logger = logging.getLogger("raft")
+
+# Stream entre peers: cada frame lleva longitud del cuerpo, tipo de mensaje, id de
+# correlación y el grupo RAFT destino (path del URL del peer, vacío en nodos de un
+# solo shard), así varias llamadas y grupos comparten la conexión y las respuestas
+# llegan en cualquier orden.
+STREAM_HEADER = struct.Struct(">IBIB")
+STREAM_MAX_FRAME = 64 * 1024 * 1024
+MSG_RESPONSE = 0
+MSG_APPEND_ENTRIES = 1
+MSG_REQUEST_VOTE = 2
+MSG_BULLY_CHALLENGE = 3
+MSG_BULLY_VICTORY = 4
+MSG_READ_INDEX = 5
+MSG_PRE_VOTE = 6
+MSG_TIMEOUT_NOW = 7
+MSG_TRANSFER_LEADERSHIP = 8
+MSG_HEARTBEAT_BATCH = 9
+MSG_ERROR = 255
+# Nombre de cada tipo de mensaje (etiqueta `rpc` de las métricas)
+MESSAGE_NAMES = {
+    MSG_APPEND_ENTRIES: "append_entries",
+    MSG_REQUEST_VOTE: "request_vote",
+    MSG_BULLY_CHALLENGE: "bully_challenge",
+    MSG_BULLY_VICTORY: "bully_victory",
+    MSG_READ_INDEX: "read_index",
+    MSG_PRE_VOTE: "pre_vote",
+    MSG_TIMEOUT_NOW: "timeout_now",
+    MSG_TRANSFER_LEADERSHIP: "transfer_leadership",
+    MSG_HEARTBEAT_BATCH: "heartbeat_batch",
+}
+
+
+class StreamUnavailable(ConnectionError):
+    """No hay stream con el peer: el llamador debe usar HTTP."""
+
+
+def _parse(peer: str):
+    return urlparse(peer if "://" in peer else f"http://{peer}")
+
+
+def stream_address(peer: str, port_offset: int) -> Tuple[str, int]:
+    """Host y puerto del stream de un peer, a `port_offset` de su puerto HTTP."""
+    parsed = _parse(peer)
+    return parsed.hostname or "localhost", (parsed.port or 80) + port_offset
+
+
+def peer_origin(peer: str) -> str:
+    """scheme://host:puerto de un peer: los grupos de un mismo proceso lo comparten."""
+    parsed = _parse(peer)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def group_key(url: str) -> str:
+    """Grupo RAFT de un URL de nodo: su path ('' en nodos de un solo shard)."""
+    return _parse(url).path.rstrip("/")
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Tuple[int, int, str, bytes]:
+    length, kind, call_id, group_len = STREAM_HEADER.unpack(await reader.readexactly(STREAM_HEADER.size))
+    if length > STREAM_MAX_FRAME:
+        raise ValueError(f"Frame demasiado grande: {length} bytes")
+    group = (await reader.readexactly(group_len)).decode("utf-8") if group_len else ""
+    return kind, call_id, group, await reader.readexactly(length)
+
+
+def _write_frame(writer: asyncio.StreamWriter, kind: int, call_id: int, body: bytes, group: str = ""):
+    group_bytes = group.encode("utf-8")
+    writer.write(STREAM_HEADER.pack(len(body), kind, call_id, len(group_bytes)) + group_bytes + body)
+
+
+class PeerClientPool:
+    """Sesiones HTTP persistentes por peer para los RPC de RAFT.
+
+    Cada peer tiene su propia `aiohttp.ClientSession` con keep-alive y un
+    límite de conexiones simultáneas, así los heartbeats y AppendEntries
+    reutilizan conexiones TCP en vez de abrir una por llamada.
+    """
+
+    def __init__(self, limit_per_peer: int = 8, keepalive_timeout: float = 30.0,
+                 connect_timeout: float = 1.0, default_timeout: float = 3.0):
+        self.limit_per_peer = limit_per_peer
+        self.keepalive_timeout = keepalive_timeout
+        self.connect_timeout = connect_timeout
+        self.default_timeout = default_timeout
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+
+    def session(self, peer: str) -> aiohttp.ClientSession:
+        """Devuelve (creándola si hace falta) la sesión del proceso del peer."""
+        origin = peer_origin(peer)
+        session = self._sessions.get(origin)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit_per_peer,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            session = aiohttp.ClientSession(connector=connector)
+            self._sessions[origin] = session
+        return session
+
+    def _timeout(self, total: Optional[float]) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(total=total or self.default_timeout, connect=self.connect_timeout)
+
+    def post(self, peer: str, path: str, timeout: Optional[float] = None, **kwargs):
+        return self.session(peer).post(f"{peer}{path}", timeout=self._timeout(timeout), **kwargs)
+
+    def get(self, peer: str, path: str, timeout: Optional[float] = None, **kwargs):
+        return self.session(peer).get(f"{peer}{path}", timeout=self._timeout(timeout), **kwargs)
+
+    def stream(self, peer: str, path: str, read_timeout: Optional[float] = None, **kwargs):
+        """GET de una respuesta larga (stream): sin tope total, solo entre lecturas."""
+        timeout = aiohttp.ClientTimeout(total=None, connect=self.connect_timeout,
+                                        sock_read=read_timeout or self.default_timeout)
+        return self.session(peer).get(f"{peer}{path}", timeout=timeout, **kwargs)
+
+    async def reset(self, peers: Iterable[str]):
+        """Cierra las sesiones de peers que ya no forman parte del cluster."""
+        keep = {peer_origin(peer) for peer in peers}
+        for origin in list(self._sessions):
+            if origin not in keep:
+                await self._sessions.pop(origin).close()
+
+    async def close(self):
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions.clear()
+
+
+class _PeerStream:
+    """Conexión TCP con un peer y las llamadas pendientes de respuesta."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.ids = itertools.count(1)
+        self.task = asyncio.create_task(self._read_loop())
+
+    @property
+    def closed(self) -> bool:
+        return self.task.done()
+
+    async def _read_loop(self):
+        error: Exception = ConnectionError("stream cerrado")
+        try:
+            while True:
+                kind, call_id, _, body = await _read_frame(self.reader)
+                future = self.pending.pop(call_id, None)
+                if future is None or future.done():
+                    continue
+                if kind == MSG_ERROR:
+                    future.set_exception(RuntimeError(body.decode("utf-8", "replace")))
+                else:
+                    future.set_result(body)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            error = ConnectionError(f"stream cerrado: {e}")
+        finally:
+            self.writer.close()
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self.pending.clear()
+
+    async def call(self, kind: int, group: str, body: bytes, timeout: float) -> bytes:
+        call_id = next(self.ids) & 0xFFFFFFFF
+        future = asyncio.get_running_loop().create_future()
+        self.pending[call_id] = future
+        try:
+            _write_frame(self.writer, kind, call_id, body, group)
+            await self.writer.drain()
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(call_id, None)
+
+    def close(self):
+        self.task.cancel()
+
+
+class PeerStreamClient:
+    """Un stream TCP persistente y multiplexado por proceso peer para los RPC de RAFT.
+
+    Los grupos RAFT alojados en un mismo proceso comparten la conexión; cada frame
+    indica el grupo destino. Si no se puede conectar, `call` lanza StreamUnavailable
+    y no vuelve a intentarlo hasta pasados `retry_after` segundos; mientras tanto el
+    llamador usa HTTP.
+    """
+
+    def __init__(self, port_offset: int, connect_timeout: float = 1.0, retry_after: float = 5.0):
+        self.port_offset = port_offset
+        self.connect_timeout = connect_timeout
+        self.retry_after = retry_after
+        self._streams: Dict[str, _PeerStream] = {}
+        self._connecting: Dict[str, asyncio.Lock] = {}
+        self._down_until: Dict[str, float] = {}
+
+    async def _stream(self, peer: str) -> _PeerStream:
+        origin = peer_origin(peer)
+        stream = self._streams.get(origin)
+        if stream is not None and not stream.closed:
+            return stream
+        lock = self._connecting.setdefault(origin, asyncio.Lock())
+        async with lock:
+            stream = self._streams.get(origin)
+            if stream is not None and not stream.closed:
+                return stream
+            loop = asyncio.get_running_loop()
+            if loop.time() < self._down_until.get(origin, 0.0):
+                raise StreamUnavailable(peer)
+            host, port = stream_address(peer, self.port_offset)
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port),
+                                                        self.connect_timeout)
+            except (OSError, asyncio.TimeoutError) as e:
+                self._down_until[origin] = loop.time() + self.retry_after
+                raise StreamUnavailable(f"{peer}: {e}") from e
+            stream = self._streams[origin] = _PeerStream(reader, writer)
+            return stream
+
+    async def call(self, peer: str, kind: int, body: bytes, timeout: float = 3.0,
+                   group: Optional[str] = None) -> bytes:
+        """Envía un mensaje al grupo del peer (o a `group`) y espera su respuesta."""
+        stream = await self._stream(peer)
+        return await stream.call(kind, group_key(peer) if group is None else group, body, timeout)
+
+    async def reset(self, peers: Iterable[str]):
+        """Cierra los streams de procesos que ya no tienen peers en el cluster."""
+        keep = {peer_origin(peer) for peer in peers}
+        for origin in list(self._streams):
+            if origin not in keep:
+                self._streams.pop(origin).close()
+
+    async def close(self):
+        for stream in self._streams.values():
+            stream.close()
+        self._streams.clear()
+
+
+async def serve_peer_stream(host: str, port: int,
+                            handler: Callable[[int, str, bytes], Awaitable[bytes]]) -> asyncio.AbstractServer:
+    """Servidor del stream entre peers: cada mensaje se atiende en su propia tarea.
+
+    `handler(kind, group, body)` recibe el grupo RAFT destino del mensaje.
+    """
+
+    async def respond(writer: asyncio.StreamWriter, kind: int, call_id: int, group: str, body: bytes):
+        try:
+            kind, reply = MSG_RESPONSE, await handler(kind, group, body)
+        except Exception as e:
+            logger.warning(f"Error atendiendo mensaje {kind} del stream: {e}")
+            kind, reply = MSG_ERROR, str(e).encode("utf-8")
+        if writer.is_closing():
+            return
+        try:
+            _write_frame(writer, kind, call_id, reply)
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def on_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        tasks = set()
+        try:
+            while True:
+                kind, call_id, group, body = await _read_frame(reader)
+                task = asyncio.create_task(respond(writer, kind, call_id, group, body))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(on_connection, host, port)
@@ -0,0 +1,117 @@
+import struct
+from typing import List, Tuple
+
+# Formato binario de AppendEntries: cabecera fija + leader_id + entradas
+# (término, longitud, comando en bytes crudos). El índice de cada entrada es
+# implícito: prev_log_index + 1 + posición.
+BINARY_CONTENT_TYPE = "application/x-raft-append-entries"
+# Cabecera con la que un nodo anuncia que entiende el frame binario; un nodo viejo
+# responde al binario con error (su ruta hace req.json()) y sin ella
+WIRE_HEADER = "X-Raft-Wire"
+WIRE_VERSION = 1
+_HEADER = struct.Struct(">BQQQQIH")  # versión, term, prev_index, prev_term, leader_commit, n, len(leader_id)
+_ENTRY = struct.Struct(">QI")        # término, longitud del comando
+
+
+def append_entries_json(data: dict) -> dict:
+    """Payload JSON (formato de depuración y compatibilidad)."""
+    return {**data, "entries": [e.to_dict() for e in data["entries"]]}
+
+
+def encode_append_entries(data: dict) -> bytes:
+    """Codifica un AppendEntries (entradas como LogEntry) en un único frame binario."""
+    leader = (data["leader_id"] or "").encode("utf-8")
+    entries = data["entries"]
+    parts = [_HEADER.pack(WIRE_VERSION, data["term"], data["prev_log_index"], data["prev_log_term"],
+                          data["leader_commit"], len(entries), len(leader)), leader]
+    for entry in entries:
+        command = entry.command.encode("utf-8")
+        parts.append(_ENTRY.pack(entry.term, len(command)))
+        parts.append(command)
+    return b"".join(parts)
+
+
+def decode_append_entries(body: bytes) -> dict:
+    """Decodifica un frame binario al mismo dict que el payload JSON."""
+    view = memoryview(body)
+    version, term, prev_index, prev_term, leader_commit, count, leader_len = _HEADER.unpack_from(view, 0)
+    if version != WIRE_VERSION:
+        raise ValueError(f"Versión de formato desconocida: {version}")
+    offset = _HEADER.size
+    leader_id = str(view[offset:offset + leader_len], "utf-8")
+    offset += leader_len
+    entries: List[dict] = []
+    for i in range(count):
+        entry_term, length = _ENTRY.unpack_from(view, offset)
+        offset += _ENTRY.size
+        entries.append({"term": entry_term, "command": str(view[offset:offset + length], "utf-8"),
+                        "index": prev_index + 1 + i})
+        offset += length
+    if offset != len(view):
+        raise ValueError("Frame AppendEntries con longitud inconsistente")
+    return {
+        "term": term,
+        "leader_id": leader_id,
+        "prev_log_index": prev_index,
+        "prev_log_term": prev_term,
+        "entries": entries,
+        "leader_commit": leader_commit,
+    }
+
+
+_BATCH_ITEM = struct.Struct(">BI")   # longitud del grupo, longitud del frame AppendEntries
+
+
+def encode_heartbeat_batch(items: List[Tuple[str, bytes]]) -> bytes:
+    """Junta heartbeats (frames AppendEntries) de varios grupos de un proceso en un mensaje."""
+    parts = []
+    for group, frame in items:
+        group_bytes = group.encode("utf-8")
+        parts.append(_BATCH_ITEM.pack(len(group_bytes), len(frame)))
+        parts.append(group_bytes)
+        parts.append(frame)
+    return b"".join(parts)
+
+
+def decode_heartbeat_batch(body: bytes) -> List[Tuple[str, dict]]:
+    """Inverso de encode_heartbeat_batch: [(grupo, AppendEntries decodificado)]."""
+    view = memoryview(body)
+    offset = 0
+    items = []
+    while offset < len(view):
+        group_len, frame_len = _BATCH_ITEM.unpack_from(view, offset)
+        offset += _BATCH_ITEM.size
+        group = str(view[offset:offset + group_len], "utf-8")
+        offset += group_len
+        items.append((group, decode_append_entries(bytes(view[offset:offset + frame_len]))))
+        offset += frame_len
+    return items
+
+
+# Stream de /raft/sync: una cabecera y luego las entradas desde from_index, cada una
+# con su índice explícito para que el cliente pueda reanudar tras un corte.
+SYNC_CONTENT_TYPE = "application/x-raft-log-stream"
+SYNC_HEADER = struct.Struct(">BQQQQ")  # versión, snapshot_index, snapshot_term, last_index, commit_index
+SYNC_ENTRY = struct.Struct(">QQI")     # índice, término, longitud del comando
+
+
+def encode_sync_header(snapshot_index: int, snapshot_term: int, last_index: int, commit_index: int) -> bytes:
+    return SYNC_HEADER.pack(WIRE_VERSION, snapshot_index, snapshot_term, last_index, commit_index)
+
+
+def decode_sync_header(body: bytes) -> dict:
+    version, snapshot_index, snapshot_term, last_index, commit_index = SYNC_HEADER.unpack(body)
+    if version != WIRE_VERSION:
+        raise ValueError(f"Versión de formato desconocida: {version}")
+    return {"snapshot_index": snapshot_index, "snapshot_term": snapshot_term,
+            "last_index": last_index, "commit_index": commit_index}
+
+
+def encode_sync_entries(entries) -> bytes:
+    """Codifica un trozo de entradas (LogEntry) del stream de sincronización."""
+    parts = []
+    for entry in entries:
+        command = entry.command.encode("utf-8")
+        parts.append(SYNC_ENTRY.pack(entry.index, entry.term, len(command)))
+        parts.append(command)
+    return b"".join(parts)
@@ -0,0 +1,68 @@
+"""Throughput del log RAFT según el modo de durabilidad (strict / group / relaxed).
+
+Escribe lotes de entradas en un SegmentedLogStore temporal con cada modo y reporta
+entradas/s, lotes/s y fsyncs realizados; sirve para elegir RAFT_DURABILITY por shard.
+
+Uso:
+    python tests/bench_durability.py [--batches 2000] [--batch-size 1,16] [--entry-bytes 256]
+                                     [--sync-interval-ms 50] [--dir /ruta/en/el/disco/real]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.raft_log import DURABILITY_MODES, SegmentedLogStore  # noqa: E402
+
+
+def run(mode: str, batches: int, batch_size: int, entry_bytes: int, sync_interval: float, base_dir: str):
+    directory = tempfile.mkdtemp(prefix=f"raft_bench_{mode}_", dir=base_dir)
+    store = SegmentedLogStore(directory, durability=mode, sync_interval=sync_interval)
+    fsyncs = 0
+    real_fsync = os.fsync
+
+    def counting_fsync(fd):
+        nonlocal fsyncs
+        fsyncs += 1
+        real_fsync(fd)
+
+    os.fsync = counting_fsync
+    command = "x" * entry_bytes
+    index = 1
+    try:
+        start = time.perf_counter()
+        for _ in range(batches):
+            store.append((i, 1, command) for i in range(index, index + batch_size))
+            index += batch_size
+        store.close()  # el fsync final cuenta: mide el costo completo
+        elapsed = time.perf_counter() - start
+    finally:
+        os.fsync = real_fsync
+        shutil.rmtree(directory, ignore_errors=True)
+    entries = batches * batch_size
+    return entries / elapsed, batches / elapsed, fsyncs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batches", type=int, default=2000)
+    parser.add_argument("--batch-size", default="1,16", help="tamaños de lote separados por coma")
+    parser.add_argument("--entry-bytes", type=int, default=256)
+    parser.add_argument("--sync-interval-ms", type=float, default=50.0)
+    parser.add_argument("--dir", default=None, help="directorio base (usar el disco de los nodos)")
+    args = parser.parse_args()
+
+    print(f"{'modo':<8} {'lote':>5} {'entradas/s':>12} {'lotes/s':>10} {'fsyncs':>7}")
+    for batch_size in (int(b) for b in args.batch_size.split(",")):
+        for mode in DURABILITY_MODES:
+            eps, bps, fsyncs = run(mode, args.batches, batch_size, args.entry_bytes,
+                                   args.sync_interval_ms / 1000.0, args.dir)
+            print(f"{mode:<8} {batch_size:>5} {eps:>12.0f} {bps:>10.0f} {fsyncs:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Benchmark del núcleo RAFT sobre el simulador en proceso (shared/raft_sim.py).
+
+Levanta N RaftNode en un solo proceso, con red en memoria y reloj virtual, y mide:
+- throughput: commits/s y latencia p50/p99 de commit según clientes concurrentes;
+- failover: desde que cae el líder hasta que el nuevo compromete una escritura;
+- catch-up: lo que tarda un seguidor caído en alcanzar al líder según el rezago.
+
+Los tiempos "sim" son del reloj virtual (protocolo: batching, pipeline, timeouts);
+los "cpu" son tiempo real del proceso, así que sirven para detectar regresiones de
+rendimiento del consenso sin Docker. Misma semilla, misma ejecución.
+
+Uso:
+    python tests/bench_raft.py [--nodes 3] [--writes 2000] [--clients 1,16,64]
+                               [--failovers 5] [--log-sizes 1000,10000]
+                               [--latency-ms 1] [--jitter-ms 0.5] [--loss 0] [--seed 0]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.raft_scheduler import Overloaded  # noqa: E402
+from shared.raft_sim import SimCluster, SimNetwork, run_simulation  # noqa: E402
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0.0
+
+
+def cluster(args) -> SimCluster:
+    network = SimNetwork(latency=args.latency_ms / 1000.0, jitter=args.jitter_ms / 1000.0,
+                         loss=args.loss, seed=args.seed)
+    return SimCluster(args.nodes, network)
+
+
+async def commit(sim: SimCluster, command: str):
+    """Propone hasta que se comprometa, reintentando como un cliente del coordinador."""
+    while True:
+        try:
+            if await sim.propose(command) is not None:
+                return
+        except Overloaded as e:
+            await asyncio.sleep(e.retry_after)
+            continue
+        except Exception:
+            await asyncio.sleep(0.01)  # el líder cambió entre elegirlo y proponer
+        await sim.wait_leader()
+
+
+async def write_many(sim: SimCluster, count: int, clients: int, payload: str) -> list:
+    """`count` escrituras repartidas en `clients` clientes secuenciales; latencias (sim)."""
+    latencies = []
+
+    async def client(n: int):
+        for _ in range(n):
+            started = sim.now()
+            await commit(sim, payload)
+            latencies.append(sim.now() - started)
+
+    share, extra = divmod(count, clients)
+    await asyncio.gather(*(client(share + (1 if c < extra else 0)) for c in range(clients)))
+    return latencies
+
+
+def bench_throughput(args, clients: int) -> tuple:
+    async def main():
+        sim = cluster(args)
+        await sim.start()
+        await sim.wait_leader()
+        started, cpu = sim.now(), time.perf_counter()
+        latencies = await write_many(sim, args.writes, clients, "x" * args.entry_bytes)
+        elapsed, cpu = sim.now() - started, time.perf_counter() - cpu
+        assert sim.consistent()
+        await sim.close()
+        return (args.writes / elapsed, args.writes / cpu,
+                percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000)
+    return run_simulation(main, seed=args.seed)
+
+
+def bench_failover(args) -> list:
+    async def main():
+        sim = cluster(args)
+        await sim.start()
+        await sim.wait_leader()
+        times = []
+        for _ in range(args.failovers):
+            await write_many(sim, 50, 4, "x" * args.entry_bytes)
+            victim = sim.leader().self_url
+            started = sim.now()
+            await sim.crash(victim)
+            await commit(sim, "failover")
+            times.append(sim.now() - started)
+            await sim.start_node(victim)
+            await sim.wait_until(lambda: sim.leader() is not None and all(
+                node.last_applied == sim.leader().commit_index for node in sim.nodes.values()))
+        assert sim.consistent()
+        await sim.close()
+        return times
+    return run_simulation(main, seed=args.seed)
+
+
+def bench_catch_up(args, log_size: int) -> tuple:
+    async def main():
+        sim = cluster(args)
+        await sim.start()
+        leader = await sim.wait_leader()
+        # El seguidor de menor prioridad: al volver no dispara una elección Bully
+        lagging = min((url for url in sim.urls if url != leader.self_url),
+                      key=lambda url: leader._priority_of_url(url))
+        await sim.crash(lagging)
+        await write_many(sim, log_size, 64, "x" * args.entry_bytes)
+        target = sim.leader().commit_index
+        started, cpu = sim.now(), time.perf_counter()
+        await sim.start_node(lagging)
+        caught_up = await sim.wait_until(lambda: sim.nodes[lagging].last_applied >= target, timeout=600)
+        elapsed, cpu = sim.now() - started, time.perf_counter() - cpu
+        assert caught_up and sim.consistent()
+        await sim.close()
+        return elapsed, cpu
+    return run_simulation(main, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--clients", default="1,16,64", help="clientes concurrentes separados por coma")
+    parser.add_argument("--entry-bytes", type=int, default=128)
+    parser.add_argument("--failovers", type=int, default=5)
+    parser.add_argument("--log-sizes", default="1000,10000", help="rezagos del catch-up separados por coma")
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="latencia de red por sentido")
+    parser.add_argument("--jitter-ms", type=float, default=0.5)
+    parser.add_argument("--loss", type=float, default=0.0, help="fracción de mensajes perdidos")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.getLogger("raft").setLevel(logging.ERROR)  # los nodos simulados loguean cada lote
+
+    print(f"{'clientes':>8} {'commits/s sim':>14} {'commits/s cpu':>14} {'p50 ms':>8} {'p99 ms':>8}")
+    for clients in (int(c) for c in args.clients.split(",")):
+        sim_rate, cpu_rate, p50, p99 = bench_throughput(args, clients)
+        print(f"{clients:>8} {sim_rate:>14.0f} {cpu_rate:>14.0f} {p50:>8.2f} {p99:>8.2f}")
+
+    if args.failovers:
+        times = bench_failover(args)
+        print(f"\nfailover ({len(times)}): p50 {percentile(times, 0.5):.2f} s, máx {max(times):.2f} s (sim)")
+
+    print(f"\n{'rezago':>8} {'catch-up sim s':>15} {'catch-up cpu s':>15}")
+    for log_size in (int(s) for s in args.log_sizes.split(",") if s):
+        elapsed, cpu = bench_catch_up(args, log_size)
+        print(f"{log_size:>8} {elapsed:>15.3f} {cpu:>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
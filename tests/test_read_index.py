@@ -0,0 +1,48 @@
+"""ReadIndex tras un cambio de líder, sobre el simulador en proceso (shared/raft_sim.py).
+
+El líder cae apenas compromete una escritura, antes de que los seguidores conozcan
+su commit_index. El nuevo líder no recibe escrituras: su ReadIndex igual debe cubrir
+lo que el anterior ya confirmó al cliente.
+
+Uso:
+    python -m pytest -q tests/test_read_index.py
+"""
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.raft import NOOP_COMMAND  # noqa: E402
+from shared.raft_sim import SimCluster, SimNetwork, run_simulation  # noqa: E402
+
+logging.getLogger("raft").setLevel(logging.ERROR)
+
+
+def test_read_index_after_leader_change_covers_acknowledged_writes():
+    async def main():
+        sim = SimCluster(3, SimNetwork(latency=0.001, jitter=0.0005, seed=3))
+        await sim.start()
+        old = await sim.wait_leader()
+        for i in range(5):
+            await sim.propose(f"w{i}")
+        entry = await sim.propose("acknowledged")
+        assert entry is not None
+        await sim.crash(old.self_url)
+        new = await sim.wait_until(lambda: sim.leader() is not None) and sim.leader()
+        assert new and new.self_url != old.self_url
+        index = await sim.run_on(new.self_url, new.read_index())
+        if index is not None:
+            await sim.run_on(new.self_url, new.wait_applied(index, 5.0))
+        applied = list(sim.applied[new.self_url])
+        await sim.close()
+        return entry.index, index, applied
+
+    acknowledged, index, applied = run_simulation(main, seed=3)
+    assert index is not None and index >= acknowledged
+    assert "acknowledged" in applied and NOOP_COMMAND not in applied
+
+
+if __name__ == "__main__":
+    test_read_index_after_leader_change_covers_acknowledged_writes()
+    print("ok")
@@ -0,0 +1,133 @@
+"""Negociación del formato de AppendEntries contra un nodo sin el frame binario.
+
+La ruta "vieja" es la de raft_node.py antes del formato binario (hace `req.json()`
+y responde 500 al frame); corre en uvicorn sobre un puerto local con un RaftNode
+real detrás, y el líder le habla con su PeerClientPool de siempre.
+
+Uso:
+    python -m pytest -q tests/test_wire_fallback.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+import aiohttp
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.raft import RaftNode  # noqa: E402
+from shared.raft_log import LogEntry  # noqa: E402
+from shared.raft_wire import WIRE_HEADER  # noqa: E402
+
+
+def legacy_app(raft: RaftNode) -> FastAPI:
+    """Ruta /raft/append_entries tal como estaba antes del formato binario."""
+    app = FastAPI()
+
+    @app.post("/raft/append_entries")
+    async def append_entries(req: Request):
+        data = await req.json()
+        return await raft.receive_append_entries(
+            data["term"],
+            data["leader_id"],
+            data.get("entries", []),
+            data.get("prev_log_index", 0),
+            data.get("prev_log_term", 0),
+            data.get("leader_commit", 0)
+        )
+
+    return app
+
+
+def failing_app() -> FastAPI:
+    """Nodo actual que falla (p.ej. reiniciando): error con WIRE_HEADER."""
+    app = FastAPI()
+
+    @app.post("/raft/append_entries")
+    async def append_entries(req: Request):
+        return JSONResponse({"error": "reiniciando"}, status_code=503, headers={WIRE_HEADER: "binary"})
+
+    return app
+
+
+async def serve(app: FastAPI):
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="error"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, task, f"http://127.0.0.1:{port}"
+
+
+def node(directory: str, name: str, peers) -> RaftNode:
+    return RaftNode(node_id=name, peers=list(peers), state_file=os.path.join(directory, f"{name}.json"),
+                    self_url=f"http://{name}", durability="relaxed")
+
+
+def append_request(leader: RaftNode, command: str) -> dict:
+    return {"term": 1, "leader_id": leader.self_url, "prev_log_index": 0, "prev_log_term": 0,
+            "leader_commit": 0, "entries": [LogEntry(1, command, 1)]}
+
+
+def run(app_for, check):
+    async def main():
+        with tempfile.TemporaryDirectory() as directory:
+            server, task, url = await serve(app_for(directory))
+            leader = node(directory, "leader", [url])
+            try:
+                await check(leader, url)
+            finally:
+                await leader.http.close()
+                server.should_exit = True
+                await task
+    asyncio.run(main())
+
+
+def test_legacy_peer_falls_back_to_json():
+    followers = {}
+
+    def app_for(directory):
+        followers["node"] = node(directory, "legacy", [])
+        return legacy_app(followers["node"])
+
+    async def check(leader, url):
+        data = append_request(leader, "SET x 1")
+        # El frame binario no es JSON: el nodo viejo responde 500 sin WIRE_HEADER
+        assert await leader._send_append_entries(url, data) is None
+        assert leader._peer_wire[url] == "json"
+        # Tras el 500 uvicorn cierra la conexión que el pool reutiliza: el primer envío
+        # puede fallar y el pipeline lo reintenta (aquí, lo mismo a mano)
+        for _ in range(3):
+            try:
+                result = await leader._send_append_entries(url, data)
+                break
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.05)
+        assert result["success"]
+        assert leader._peer_wire[url] == "json"
+        assert [e.command for e in followers["node"].log_range(1, 1)] == ["SET x 1"]
+
+    run(app_for, check)
+
+
+def test_error_from_upgraded_peer_keeps_binary():
+    async def check(leader, url):
+        try:
+            await leader._send_append_entries(url, append_request(leader, "SET x 1"))
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("un 503 con WIRE_HEADER debe reintentarse, no degradar el formato")
+        assert url not in leader._peer_wire
+
+    run(lambda directory: failing_app(), check)
+
+
+if __name__ == "__main__":
+    test_legacy_peer_falls_back_to_json()
+    test_error_from_upgraded_peer_keeps_binary()
+    print("ok")